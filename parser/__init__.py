@@ -1,5 +1,17 @@
+from collections.abc import Mapping
 from datetime import datetime, timedelta, tzinfo
+from functools import cached_property, lru_cache
+from operator import attrgetter
+from socket import AF_INET, AF_INET6, inet_ntop, inet_pton
+from time import perf_counter, sleep
+from types import MappingProxyType
+from urllib.parse import parse_qs, unquote
+import os
 import re
+import sys
+
+from .metrics import ParserMetrics, startMetricsServer
+from .sampling import sampleThreshold, hashSample, reservoirSample
 
 #
 # @Class
@@ -7,6 +19,9 @@ import re
 #
 # @Initialization Prototype
 #   Parser( format_str )
+#   Parser( format_str, 'latin-1', 'int', 'regex' )
+#   Parser( format_str, max_line_len = 65536, max_field_len = 8192,
+#       overflow_mode = 'truncate' )
 #
 # @Purpose
 #   Parser class for constructing an apache log
@@ -16,79 +31,1252 @@ import re
 #   Modified:
 #
 # @Internal variables
+#   format_str  : The format string, with encoding and ip_mode enough to
+#                 build the same Parser in another process
 #   delim_list  : List of delimiting characters that seperate log
 #                 variables
 #   parser_list : List of parser funtions and format bracket data
-#                 for the parser
+#                 for the parser, see parseFormatString for the layout
+#                 of each entry
+#   decode_pair : (decode function, unescape and decode function) used
+#                 for string fields of bytes log lines
+#   delim_code_list   : delim_list as byte values, None when a delimiter
+#                       is not a single byte in the chosen encoding
+#   bytes_parser_list : Bytes store function, attribute name, quote byte
+#                       string, slot, delimiter index and format
+#                       character of each parser_list entry
+#   ip_mode     : 'str' to keep %a and %A as strings only, 'int' to also
+#                 pack them into remote_ip_int and local_ip_int
+#   slot_cnt    : Number of %{name}i, C, e, n and o variables in the format
+#   slot_info   : (directive -> name key -> (slot, quoted, name),
+#                  decode_pair) shared by every ApacheLog of this format,
+#                  see FieldMapping
+#   engine      : Strategy splitting lines into variables, see
+#                 engine_reason_dict
+#   engine_reason : Why engine was chosen
+#   engine_list : Engines able to parse this format
+#   format_re   : Regex matching every variable of a line in one go, and
+#                 format_bytes_re its bytes version
+#   regex_plan  : How to store each group of format_re, see matchPlan
+#   split_plan  : How to store each space separated token for the split
+#                 engine, None when the format can't be split
+#   split_cnt   : Number of tokens the split engine cuts a line into
+#   split_time_list : Tokens holding the first half of a %t
+#   max_line_len  : Longest line parsed, None for no limit
+#   max_field_len : Longest value stored, None for no limit
+#   overflow_mode : 'reject' to raise ValueError for a line or value over
+#                   its limit, 'truncate' to cut it to the limit
 #
 # @Class Methods
 #   parse(log_str) : Method for parsing the given log_str and returning an
-#                    ApacheLog object with the data of the log_str
+#                    ApacheLog object with the data of the log_str.  The
+#                    log_str may also be bytes, bytearray or memoryview
+#   parseBytes(log_bytes) : parse for undecoded log lines, string fields
+#                           are kept as bytes until they are read
+#   fieldList() : List of (name, type, get function) describing the
+#                 values the format produces, for sinks and writers
+#   constructorArgs() : Arguments building the same Parser, with the
+#                       engine in use, for rebuilding it in a worker
+#   calibrate(line_list) : Time every engine of engine_list on sample
+#                          lines and switch to the fastest one giving the
+#                          same fields as the generic engine
+#   calibrateFile(file_path, line_cnt) : calibrate on the first lines of
+#                                        a log file
+#   parseBatch(line_list, metrics, weight, observer_list) : Parse a list
+#                                                           of lines,
+#                                                           skipping and
+#                                                           counting the
+#                                                           ones that fail
+#   parseLines(line_iter, metrics, batch_size, sample_rate, sample_size,
+#              seed, observer_list) : Generator of ApacheLog objects for an
+#                                     iterable of lines
+#   parseFile(file_path, follow, metrics, batch_size, sample_rate,
+#             sample_size, seed, observer_list) : Generator of ApacheLog
+#                                                 objects for a log file
+#
+#   Every object of observer_list has its observe(log) method called with
+#   each parsed ApacheLog, this is how streaming summaries such as the ones
+#   in parser.sketch plug into the parse loop.
+#
+#   sample_rate keeps that fraction of the lines by hashing the raw line,
+#   sample_size keeps a reservoir sample of that many lines and yields it
+#   once the input is exhausted.  Unsampled lines are never parsed and
+#   sampled ApacheLog objects carry the number of lines they stand for in
+#   sample_weight.
 #
 # @Notes
+#   Nothing is written to a Parser after construction, or calibrate when
+#   it is used, so one instance can be shared by threads, see
+#   parser.executor.
+#
+#   The split and regex engines hand every line they can't match to the
+#   generic engine, so all engines give the same ApacheLog for any line.
+#   python -m parser.fuzz checks they do.
+#
+#   Every engine is linear in the length of the line, the generic one
+#   scans each variable once and copies only its value.  max_line_len
+#   bounds the work a hostile line can cost and max_field_len the size of
+#   what it stores, python -m parser.fuzz --adversarial times crafted
+#   lines of growing length.  Lengths are in
+#   characters for str lines and bytes for bytes lines.  A value is what a
+#   variable is stored as, a quoted variable between its quotes, a %t with
+#   its brackets and each of the three parts of an unquoted %r.  Only
+#   string values are truncated, numbers and times over max_field_len are
+#   always rejected.
+#
 #   Input
-#       method_str
-#       request_URI_str
-#       http_vers_str
+#       format_str : Apache LogFormat string
+#       encoding   : 'utf-8' (with surrogateescape) or 'latin-1' for
+#                    decoding string fields of bytes log lines
+#       ip_mode    : 'str' or 'int', see packIP for the integer layout
+#       engine     : 'auto' to pick from the format, or a name of
+#                    engine_reason_dict
+#       max_line_len, max_field_len, overflow_mode : See above
 #
 class Parser:
 
-    def __init__( self, format_str ):
+    def __init__( self, format_str, encoding = 'utf-8', ip_mode = 'str',
+            engine = 'auto', max_line_len = None, max_field_len = None,
+            overflow_mode = 'reject' ):
         (self.delim_list, self.parser_list) = parseFormatString(format_str)
 
+        self.format_str = format_str
+        self.encoding = encoding
+
+        if ip_mode not in ('str', 'int'):
+            raise ValueError("ip_mode must be 'str' or 'int', got %r" % ip_mode)
+
+        self.ip_mode = ip_mode
+
+        if overflow_mode not in ('reject', 'truncate'):
+            raise ValueError("overflow_mode must be 'reject' or 'truncate', "
+                "got %r" % overflow_mode)
+
+        for limit in (max_line_len, max_field_len):
+            if limit is not None and limit < 1:
+                raise ValueError('Length limits must be positive, got %r'
+                    % limit)
+
+        self.max_line_len = max_line_len
+        self.max_field_len = max_field_len
+        self.overflow_mode = overflow_mode
+
+        self.decode_pair = decode_func_dict[encoding]
+
+        delim_bytes = ''.join(self.delim_list).encode(encoding)
+
+        if len(delim_bytes) == len(self.delim_list):
+            self.delim_code_list = list(delim_bytes)
+        else:
+            self.delim_code_list = None
+
+        self.bytes_parser_list = []
+
+        for parser in self.parser_list:
+            (attr_str, field_type) = directive_field_dict[parser[2]]
+            store_func = bytes_store_dict[field_type]
+
+            if ip_mode == 'int' and parser[2] in ip_store_dict:
+                parser[0] = ip_store_dict[parser[2]]
+                store_func = storeBytesIP
+
+            self.bytes_parser_list.append( [store_func, attr_str,
+                parser[4].encode(encoding), parser[5], parser[3], parser[2]] )
+
+        # Name lookup of the slotted variables, built once per format
+        slot_name_dict = {}
+
+        for parser in self.parser_list:
+            if parser[5] is not None:
+                slot_name_dict.setdefault(parser[2], {})[slotKey(parser[2],
+                    parser[1])] = (parser[5], bool(parser[4]), parser[1])
+
+        self.slot_cnt = sum(parser[5] is not None for parser in self.parser_list)
+        self.slot_info = (slot_name_dict, self.decode_pair)
+
+        (pattern_str, group_list) = formatPattern(self.delim_list,
+            self.parser_list)
+        self.format_re = re.compile(pattern_str, re.S)
+        self.format_bytes_re = re.compile(pattern_str.encode(encoding), re.S)
+        self.regex_plan = matchPlan(self.parser_list, self.bytes_parser_list,
+            group_list, ip_mode)
+
+        token_list = splitTokens(self.delim_list, self.parser_list)
+
+        if token_list is None:
+            self.split_plan = None
+            self.split_cnt = 0
+            self.split_time_list = []
+        else:
+            self.split_plan = matchPlan(self.parser_list,
+                self.bytes_parser_list, token_list, ip_mode)
+            self.split_cnt = token_list[-1] + (2 if
+                self.parser_list[-1][2] == 't' else 1)
+            self.split_time_list = [j for (j, parser) in zip(token_list,
+                self.parser_list) if parser[2] == 't']
+
+        self.engine_list = ['regex', 'generic']
+
+        if self.split_plan is not None:
+            self.engine_list.insert(0, 'split')
+
+        # Joining the halves of a %t costs split its lead over the regex
+        if engine == 'auto':
+            if self.split_plan is not None and not self.split_time_list:
+                self.engine = 'split'
+            else:
+                self.engine = 'regex'
+
+            self.engine_reason = engine_reason_dict[self.engine]
+
+        elif engine in self.engine_list:
+            self.engine = engine
+            self.engine_reason = 'requested'
+
+        elif engine in engine_reason_dict:
+            raise ValueError('engine %r can not parse %r, use one of %s'
+                % (engine, format_str, ', '.join(self.engine_list)))
+        else:
+            raise ValueError('engine must be auto or one of %s, got %r'
+                % (', '.join(engine_reason_dict), engine))
+
     def parse(self, log_str ):
+        if type(log_str) is not str:
+            return self.parseBytes(log_str)
+
+        if self.max_line_len is not None and len(log_str) > self.max_line_len:
+            log_str = self.limitLine(log_str)
+
+        if self.engine == 'split':
+            return self.parseSplit(log_str)
+
+        if self.engine == 'regex':
+            return self.parseRegex(log_str)
+
+        return self.parseGeneric(log_str)
+
+    def parseGeneric(self, log_str):
         i = 0
         d = 0
 
+        max_field_len = self.max_field_len
+
         log = ApacheLog()
 
+        if self.slot_cnt:
+            log.slot_list = [None] * self.slot_cnt
+            log.slot_info = self.slot_info
+
         for parser in self.parser_list:
-            while d < len(self.delim_list) and self.delim_list[d] == log_str[i] :
+            # Only the delimiters before this variable, an empty quoted
+            # value must not lose its closing quote
+            while d < parser[3] and self.delim_list[d] == log_str[i] :
                 i += 1
                 d += 1
 
-            if parser[1] == '':
-                i += parser[0](log_str[i:], log)
+            # Find where the variable ends first so only its value is
+            # copied, quoted fields run up to their closing quote, spaces
+            # and all
+            if parser[4]:
+                end = findQuoteEnd(log_str, i, parser[4])
+
+            elif parser[0] is storeHTTPLine:
+                end = storeHTTPLine(log_str, log, i)
+
+                if max_field_len is not None:
+                    self.limitHTTPLine(log, log_str, i, end)
+
+                i = end
+                continue
+
+            elif parser[0] is storeTime:
+                end = findTimeEnd(log_str, i, max_field_len, ']')
+            else:
+                end = str_stop_re.match(log_str, i).end()
+
+            stop = end
+
+            if max_field_len is not None and end - i > max_field_len:
+                stop = self.limitField(parser[2], i, end)
+
+            if parser[5] is not None:
+                storeSlot(log_str[i:stop], log, parser)
+
+            elif parser[4]:
+                storeQuotedField(log_str[i:stop], log, parser[2], parser[0])
+
+            elif parser[1] == '':
+                parser[0](log_str[i:stop], log)
+            else:
+                parser[0](log_str[i:stop], log, parser[1])
+
+            i = end
+
+        return log
+
+    def parseBytes(self, log_bytes):
+        if type(log_bytes) is not bytes:
+            log_bytes = bytes(log_bytes)
+
+        if (self.max_line_len is not None
+                and len(log_bytes) > self.max_line_len):
+            log_bytes = self.limitLine(log_bytes)
+
+        # Multibyte delimiters can't be matched byte by byte
+        if self.delim_code_list is None:
+            return self.parse(self.decode_pair[0](log_bytes))
+
+        if self.engine == 'split':
+            return self.parseBytesSplit(log_bytes)
+
+        if self.engine == 'regex':
+            return self.parseBytesRegex(log_bytes)
+
+        return self.parseBytesGeneric(log_bytes)
+
+    def parseBytesGeneric(self, log_bytes):
+        i = 0
+        d = 0
+
+        delim_code_list = self.delim_code_list
+        decode_pair = self.decode_pair
+        max_field_len = self.max_field_len
+
+        log = ApacheLog()
+
+        if self.slot_cnt:
+            log.slot_list = [None] * self.slot_cnt
+            log.slot_info = self.slot_info
+
+        for parser in self.bytes_parser_list:
+            while d < parser[4] and delim_code_list[d] == log_bytes[i]:
+                i += 1
+                d += 1
+
+            # The bytes store functions find the end of unquoted variables
+            # themselves, a value over the limit is stored again cut short
+            if parser[2] or parser[3] is not None:
+                if parser[2]:
+                    end = findQuoteEnd(log_bytes, i, parser[2], 92)
+                else:
+                    end = bytes_stop_re.match(log_bytes, i).end()
+
+                stop = end
+
+                if max_field_len is not None and end - i > max_field_len:
+                    stop = self.limitField(parser[5], i, end)
+
+                if parser[3] is not None:
+                    storeBytesSlot(log_bytes[i:stop], log, parser, decode_pair)
+                else:
+                    storeQuotedBytes(log_bytes[i:stop], log, parser[0],
+                        parser[1], decode_pair)
+
+            elif parser[0] is storeBytesHTTPLine:
+                end = parser[0](log_bytes, i, log, parser[1], decode_pair)
+
+                if max_field_len is not None:
+                    self.limitHTTPLine(log, log_bytes, i, end)
+
+            elif parser[0] is storeBytesTime:
+                end = findTimeEnd(log_bytes, i, max_field_len, b']')
+                log.time = parseBytesTime(log_bytes[i:end - 1])
+            else:
+                end = parser[0](log_bytes, i, log, parser[1], decode_pair)
+
+                if max_field_len is not None and end - i > max_field_len:
+                    stop = self.limitField(parser[5], i, end)
+                    parser[0](log_bytes[i:stop], 0, log, parser[1],
+                        decode_pair)
+
+            i = end
+
+        return log
+
+    def parseSplit(self, log_str):
+        token_list = splitLine(log_str, self.split_cnt, self.split_time_list,
+            ' ', ']', '\n')
+
+        if token_list is None or (self.max_field_len is not None
+                and self.overLimit(log_str, token_list[:self.split_cnt])):
+            return self.parseGeneric(log_str)
+
+        return self.storeValues(token_list, self.split_plan)
+
+    def parseRegex(self, log_str):
+        match = self.format_re.match(log_str)
+
+        if match is None or (self.max_field_len is not None
+                and self.overLimit(log_str, match.groups())):
+            return self.parseGeneric(log_str)
+
+        return self.storeValues(match.groups(), self.regex_plan)
+
+    def parseBytesSplit(self, log_bytes):
+        token_list = splitLine(log_bytes, self.split_cnt, self.split_time_list,
+            b' ', b']', b'\n')
+
+        if token_list is None or (self.max_field_len is not None
+                and self.overLimit(log_bytes, token_list[:self.split_cnt])):
+            return self.parseBytesGeneric(log_bytes)
+
+        return self.storeBytesValues(token_list, self.split_plan)
+
+    def parseBytesRegex(self, log_bytes):
+        match = self.format_bytes_re.match(log_bytes)
+
+        if match is None or (self.max_field_len is not None
+                and self.overLimit(log_bytes, match.groups())):
+            return self.parseBytesGeneric(log_bytes)
+
+        return self.storeBytesValues(match.groups(), self.regex_plan)
+
+    # The split and regex engines leave lines with a value over
+    # max_field_len to the generic one, which applies overflow_mode
+    def overLimit(self, line, value_list):
+        return len(line) > self.max_field_len and max(map(len, value_list),
+            default = 0) > self.max_field_len
+
+    def limitLine(self, line):
+        if self.overflow_mode == 'reject':
+            raise ValueError('Log line of %d is over max_line_len %d'
+                % (len(line), self.max_line_len))
+
+        return line[:self.max_line_len]
+
+    def limitField(self, format_chr, i, end):
+        if (self.overflow_mode == 'reject' or directive_field_dict[
+                format_chr][1] not in (str, HTTPLine)):
+            raise ValueError('Value of %%%s at %d is %d long, over '
+                'max_field_len %d' % (format_chr, i, end - i,
+                self.max_field_len))
+
+        return i + self.max_field_len
+
+    def limitHTTPLine(self, log, line, i, end):
+        if end - i <= self.max_field_len:
+            return
+
+        # The parts hold no space or newline, what separates them does
+        if type(line) is str:
+            part_list = field_sep_re.split(line[i:end], 2)
+        else:
+            part_list = bytes_field_sep_re.split(line[i:end], 2)
+
+        if max(map(len, part_list)) <= self.max_field_len:
+            return
+
+        self.limitField('r', i, end)
+
+        part_list = [part[:self.max_field_len] for part in part_list]
+        part_list += [line[:0]] * (3 - len(part_list))
+
+        if type(line) is str:
+            log.http_line = HTTPLine( *part_list )
+            return
+
+        http_line = HTTPLine( None, None, None )
+
+        for (http_attr_str, part_bytes) in zip(http_attr_list, part_list):
+            storeLazy(http_line, http_attr_str, part_bytes,
+                self.decode_pair[0])
+
+        log.http_line = http_line
+
+    def storeValues(self, value_list, plan):
+        log = ApacheLog()
+
+        if self.slot_cnt:
+            log.slot_list = [None] * self.slot_cnt
+            log.slot_info = self.slot_info
+
+        log_dict = log.__dict__
+
+        for (kind, j, attr_str, parser, bytes_parser) in plan:
+            value = value_list[j]
+
+            if kind == match_str:
+                log_dict[attr_str] = value
+
+            elif kind == match_int:
+                log_dict[attr_str] = None if value == '-' else int(value)
+
+            elif kind == match_time:
+                log_dict['time'] = parseTime(value[:-1])
+
+            elif kind == match_slot:
+                log.slot_list[parser[5]] = value
+
+                if parser[4] and '\\' in value:
+                    storeLazy(log, attr_str, value, unescapeField)
+                else:
+                    log_dict[attr_str] = value
+
+            elif kind == match_quoted:
+                storeQuotedField(value, log, parser[2], parser[0])
+
+            elif kind == match_http:
+                log_dict['http_line'] = HTTPLine( value, value_list[j + 1],
+                    value_list[j + 2] )
+            else:
+                log_dict[attr_str] = value
+                log_dict[attr_str[:-4] + '_int'] = packIP(value)
+
+        return log
+
+    def storeBytesValues(self, value_list, plan):
+        log = ApacheLog()
+
+        if self.slot_cnt:
+            log.slot_list = [None] * self.slot_cnt
+            log.slot_info = self.slot_info
+
+        log_dict = log.__dict__
+        decode_pair = self.decode_pair
+        decode_func = decode_pair[0]
+
+        # String fields of bytes lines are never stored eagerly, so there
+        # is nothing for storeLazy to pop from the instance dict
+        raw_dict = log.raw_dict = {}
+
+        for (kind, j, attr_str, parser, bytes_parser) in plan:
+            value = value_list[j]
+
+            if kind == match_str:
+                raw_dict[attr_str] = (value, decode_func)
+
+            elif kind == match_int:
+                log_dict[attr_str] = None if value == b'-' else int(value)
+
+            elif kind == match_time:
+                log_dict['time'] = parseBytesTime(value[:-1])
+
+            elif kind == match_slot:
+                log.slot_list[parser[5]] = value
+
+                if parser[4] and b'\\' in value:
+                    raw_dict[attr_str] = (value, decode_pair[1])
+                else:
+                    raw_dict[attr_str] = (value, decode_func)
+
+            elif kind == match_quoted:
+                storeQuotedBytes(value, log, bytes_parser[0], bytes_parser[1],
+                    decode_pair)
+
+            elif kind == match_http:
+                http_line = HTTPLine( None, None, None )
+
+                for (k, http_attr_str) in enumerate(http_attr_list):
+                    storeLazy(http_line, http_attr_str, value_list[j + k],
+                        decode_func)
+
+                log_dict['http_line'] = http_line
+            else:
+                raw_dict[attr_str] = (value, decode_func)
+                log_dict[attr_str[:-4] + '_int'] = packIP(value)
+
+        return log
+
+    def calibrate(self, line_list, repeat_cnt = 3):
+        if not line_list:
+            return {}
+
+        if type(line_list[0]) is str:
+            func_dict = { 'split' : self.parseSplit, 'regex' : self.parseRegex,
+                'generic' : self.parseGeneric }
+        else:
+            line_list = [bytes(line) for line in line_list]
+            func_dict = { 'split' : self.parseBytesSplit,
+                'regex' : self.parseBytesRegex,
+                'generic' : self.parseBytesGeneric }
+
+            # Multibyte delimiters can't be matched byte by byte
+            if self.delim_code_list is None:
+                return self.calibrate([self.decode_pair[0](line)
+                    for line in line_list], repeat_cnt)
+
+        get_list = [entry[2] for entry in self.fieldList()]
+        reference_list = [logValues(func_dict['generic'], line, get_list)
+            for line in line_list]
+        time_dict = {}
+
+        for engine in self.engine_list:
+            parse_func = func_dict[engine]
+
+            if engine != 'generic' and any(logValues(parse_func, line,
+                    get_list) != reference for (line, reference)
+                    in zip(line_list, reference_list)):
+                time_dict[engine] = None
+                continue
+
+            best = None
+
+            for k in range(repeat_cnt):
+                start = perf_counter()
+
+                for line in line_list:
+                    try:
+                        parse_func(line)
+                    except (IndexError, KeyError, ValueError):
+                        pass
+
+                seconds = perf_counter() - start
+
+                if best is None or seconds < best:
+                    best = seconds
+
+            time_dict[engine] = best / len(line_list)
+
+        self.engine = min((engine for engine in time_dict
+            if time_dict[engine] is not None), key = time_dict.get)
+        self.engine_reason = 'fastest on %d sampled lines, %s' % (
+            len(line_list), ', '.join('%s %.2f us/line' % (engine,
+            seconds * 1e6) if seconds is not None else
+            '%s disagreed with generic' % engine
+            for (engine, seconds) in time_dict.items()))
+
+        return time_dict
+
+    def calibrateFile(self, file_path, line_cnt = 1000):
+        batch_iter = readLogBatches(file_path, batch_size = line_cnt)
+        line_list = next(batch_iter, [])
+        batch_iter.close()
+
+        return self.calibrate(line_list)
+
+    def constructorArgs(self):
+        return (self.format_str, self.encoding, self.ip_mode, self.engine,
+            self.max_line_len, self.max_field_len, self.overflow_mode)
+
+    def fieldList(self):
+        field_list = []
+        name_set = set()
+
+        for parser in self.parser_list:
+            (attr_str, field_type) = directive_field_dict[parser[2]]
+
+            if parser[5] is not None:
+                mapping_str = slot_directive_dict[parser[2]][0]
+                name_str = mapping_str + '_' + re.sub(r'\W+', '_',
+                    parser[1]).strip('_').lower()
+                entry_list = [(name_str, str, slotGetter(mapping_str,
+                    parser[1]))]
+
+            elif field_type is HTTPLine:
+                entry_list = [(http_attr_str, str,
+                    fieldGetter('http_line.' + http_attr_str))
+                    for http_attr_str in http_attr_list]
+
+            else:
+                entry_list = [(attr_str, field_type, attrgetter(attr_str))]
+
+            if self.ip_mode == 'int' and parser[2] in ip_store_dict:
+                int_attr_str = attr_str[:-4] + '_int'
+                entry_list.append( (int_attr_str, int, attrgetter(int_attr_str)) )
+
+            # A variable repeated in the format only shows up once
+            for entry in entry_list:
+                if entry[0] not in name_set:
+                    name_set.add(entry[0])
+                    field_list.append(entry)
+
+        return field_list
+
+    def parseBatch(self, line_list, metrics = None, weight = 1,
+            observer_list = None):
+        log_list = []
+        error_cnt = 0
+        start = perf_counter()
+
+        for line in line_list:
+            try:
+                log_list.append(self.parse(line))
+            except (IndexError, KeyError, ValueError):
+                error_cnt += 1
+
+        if metrics is not None:
+            metrics.recordBatch(len(log_list), error_cnt,
+                perf_counter() - start)
+
+        if weight != 1:
+            for log in log_list:
+                log.sample_weight = weight
+
+        if observer_list:
+            for observer in observer_list:
+                for log in log_list:
+                    observer.observe(log)
+
+        return log_list
+
+    def parseLines(self, line_iter, metrics = None, batch_size = 1024,
+            sample_rate = None, sample_size = None, seed = None,
+            observer_list = None):
+        if sample_size is not None:
+            yield from self.parseReservoir(line_iter, sample_size, seed,
+                metrics, batch_size, observer_list)
+            return
+
+        line_list = []
+
+        for line in line_iter:
+            line_list.append(line)
+
+            if len(line_list) >= batch_size:
+                yield from self.parseSampledBatch(line_list, metrics,
+                    sample_rate, observer_list)
+                line_list = []
+
+        if line_list:
+            yield from self.parseSampledBatch(line_list, metrics, sample_rate,
+                observer_list)
+
+    def parseFile(self, file_path, follow = False, metrics = None,
+            batch_size = 1024, sample_rate = None, sample_size = None,
+            seed = None, observer_list = None):
+        batch_iter = readLogBatches(file_path, follow, batch_size,
+            metrics = metrics)
+
+        if sample_size is not None:
+            if follow:
+                raise ValueError('sample_size needs an input that ends, '
+                    'use sample_rate in follow mode')
+
+            line_iter = (line for line_list in batch_iter for line in line_list)
+
+            yield from self.parseReservoir(line_iter, sample_size, seed,
+                metrics, batch_size, observer_list)
+            return
+
+        for line_list in batch_iter:
+            if metrics is None:
+                yield from self.parseSampledBatch(line_list, metrics,
+                    sample_rate, observer_list)
+                continue
+
+            # The batch is pending until the consumer took all its logs
+            metrics.addQueueDepth(len(line_list))
+
+            try:
+                yield from self.parseSampledBatch(line_list, metrics,
+                    sample_rate, observer_list)
+            finally:
+                metrics.addQueueDepth(-len(line_list))
+
+    def parseSampledBatch(self, line_list, metrics, sample_rate,
+            observer_list = None):
+        if sample_rate is None or sample_rate == 1:
+            return self.parseBatch(line_list, metrics, 1.0, observer_list)
+
+        line_list = hashSample(line_list, sampleThreshold(sample_rate))
+
+        return self.parseBatch(line_list, metrics, 1.0 / sample_rate,
+            observer_list)
+
+    def parseReservoir(self, line_iter, sample_size, seed, metrics,
+            batch_size, observer_list = None):
+        (sample_list, weight) = reservoirSample(line_iter, sample_size, seed)
+
+        for j in range(0, len(sample_list), batch_size):
+            yield from self.parseBatch(sample_list[j:j + batch_size], metrics,
+                weight, observer_list)
+
+
+#
+# @Class
+#   MultiParser
+#
+# @Initialization Prototype
+#   MultiParser( format_list )
+#   MultiParser( [ old_format_str, new_format_str ], 'latin-1', 'int' )
+#   MultiParser( format_list, max_line_len = 65536, max_field_len = 8192 )
+#
+# @Purpose
+#   Parser for files mixing several log formats, such as the old and new
+#   LogFormat around a config change.  Each line is handed to the format
+#   it matches.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   format_list        : The format strings, in the order given
+#   format_parser_list : Parser of each format
+#   encoding, ip_mode  : Shared by every format
+#   max_line_len, max_field_len, overflow_mode : As for Parser, shared by
+#                                                every format
+#   line_re_list       : Regex matching a whole line of each format, and
+#                        line_bytes_re_list its bytes version
+#   prefix_trie        : Trie of the literal text in front of the first
+#                        variable of each format, the None key of a node
+#                        holds the formats ending there.  prefix_bytes_trie
+#                        is keyed by byte values
+#   space_range_list   : (fewest, most) spaces a line of each format can
+#                        hold, most is None when a variable may hold spaces
+#   last_index         : Index of the format that matched most recently
+#   engine, engine_reason : 'dispatch' and the formats, like Parser
+#
+# @Class Methods
+#   parse(log_str) : Parse a str or bytes line with the format it matches,
+#                    raises ValueError when it matches none, or the error
+#                    of the last format whose values failed to store
+#   parseBytes(log_bytes) : parse for undecoded log lines
+#   fieldList() : Fields of every format, the first format giving a name
+#                 decides its type
+#   constructorArgs() : Arguments building the same MultiParser
+#   parseBatch, parseLines, parseFile : As for Parser
+#
+# @Notes
+#   The format of the last line is tried first with a single match of its
+#   whole line regex, so a run of lines of one format costs one parse
+#   attempt each.  Other lines walk prefix_trie, drop the formats whose
+#   space_range_list their space count is outside of and try the rest, the
+#   most recent first.  A line matching no format whole is given to the
+#   first of them whose variables all match, trailing text ignored the
+#   way Parser reads it.  A format whose values fail to store, such as a
+#   %t that is not a time, counts as not matching.
+#
+#   last_index is the only thing written after construction, a thread
+#   reading a stale value only costs it an extra match.
+#
+class MultiParser:
+
+    def __init__( self, format_list, encoding = 'utf-8', ip_mode = 'str',
+            max_line_len = None, max_field_len = None,
+            overflow_mode = 'reject' ):
+        if not format_list:
+            raise ValueError('MultiParser needs at least one format')
+
+        self.format_list = list(format_list)
+        self.format_parser_list = [Parser(format_str, encoding, ip_mode,
+            max_line_len = max_line_len, max_field_len = max_field_len,
+            overflow_mode = overflow_mode) for format_str in self.format_list]
+        self.encoding = encoding
+        self.ip_mode = ip_mode
+        self.max_line_len = max_line_len
+        self.max_field_len = max_field_len
+        self.overflow_mode = overflow_mode
+        self.decode_pair = decode_func_dict[encoding]
+
+        self.line_re_list = []
+        self.line_bytes_re_list = []
+        self.prefix_trie = {}
+        self.prefix_bytes_trie = {}
+        self.space_range_list = []
+
+        for (k, parser) in enumerate(self.format_parser_list):
+            delim_list = parser.delim_list
+            d = parser.parser_list[-1][3] if parser.parser_list else 0
+
+            pattern_str = (formatPattern(delim_list, parser.parser_list)[0]
+                + re.escape(''.join(delim_list[d:])) + r'\n?\Z')
+            self.line_re_list.append(re.compile(pattern_str, re.S))
+            self.line_bytes_re_list.append(re.compile(
+                pattern_str.encode(encoding), re.S))
+
+            prefix_str = ''.join(delim_list[:parser.parser_list[0][3]]
+                if parser.parser_list else delim_list)
+
+            for (trie, key_list) in ((self.prefix_trie, prefix_str),
+                    (self.prefix_bytes_trie, prefix_str.encode(encoding))):
+                for key in key_list:
+                    trie = trie.setdefault(key, {})
+
+                trie.setdefault(None, []).append(k)
+
+            # Unquoted variables other than %t and %r stop at a space
+            space_cnt = delim_list.count(' ')
+
+            if any(entry[4] or entry[2] == 't' or directive_field_dict[
+                    entry[2]][1] is HTTPLine for entry in parser.parser_list):
+                self.space_range_list.append( (space_cnt, None) )
             else:
-                i += parser[0](log_str[i:], log, parser[1])
+                self.space_range_list.append( (space_cnt, space_cnt) )
+
+        self.last_index = 0
+        self.engine = 'dispatch'
+        self.engine_reason = '%d formats, the last one matched is tried ' \
+            'first' % len(self.format_list)
+
+    def parse(self, log_str):
+        if type(log_str) is not str:
+            return self.parseBytes(log_str)
+
+        if self.max_line_len is not None and len(log_str) > self.max_line_len:
+            log_str = self.limitLine(log_str)
+
+        k = self.last_index
+        match = self.line_re_list[k].match(log_str)
+
+        if match is not None:
+            try:
+                return self.storeMatch(k, log_str, match, False)
+            except (IndexError, KeyError, ValueError):
+                pass
+
+        return self.dispatch(log_str, self.prefix_trie, self.line_re_list,
+            ' ', False)
+
+    def parseBytes(self, log_bytes):
+        if type(log_bytes) is not bytes:
+            log_bytes = bytes(log_bytes)
+
+        if (self.max_line_len is not None
+                and len(log_bytes) > self.max_line_len):
+            log_bytes = self.limitLine(log_bytes)
+
+        # Multibyte delimiters can't be matched byte by byte
+        if any(parser.delim_code_list is None
+                for parser in self.format_parser_list):
+            return self.parse(self.decode_pair[0](log_bytes))
+
+        k = self.last_index
+        match = self.line_bytes_re_list[k].match(log_bytes)
+
+        if match is not None:
+            try:
+                return self.storeMatch(k, log_bytes, match, True)
+            except (IndexError, KeyError, ValueError):
+                pass
+
+        return self.dispatch(log_bytes, self.prefix_bytes_trie,
+            self.line_bytes_re_list, b' ', True)
+
+    def dispatch(self, line, trie, line_re_list, space, bytes_mode):
+        # Formats with the longest matching prefix first
+        found_list = []
+
+        for key in line:
+            if None in trie:
+                found_list.append(trie[None])
+
+            trie = trie.get(key)
+
+            if trie is None:
+                break
+        else:
+            if None in trie:
+                found_list.append(trie[None])
+
+        index_list = [k for index_group in reversed(found_list)
+            for k in index_group]
+
+        if self.last_index in index_list:
+            index_list.remove(self.last_index)
+            index_list.insert(0, self.last_index)
+
+        space_cnt = line.count(space)
+        error = ValueError('log line matches none of the %d formats'
+            % len(self.format_list))
+
+        for (whole, k) in [(True, k) for k in index_list] \
+                + [(False, k) for k in index_list]:
+            parser = self.format_parser_list[k]
+
+            if whole:
+                (fewest, most) = self.space_range_list[k]
+
+                if space_cnt < fewest or (most is not None
+                        and space_cnt != most):
+                    continue
+
+                match = line_re_list[k].match(line)
+
+            elif bytes_mode:
+                match = parser.format_bytes_re.match(line)
+            else:
+                match = parser.format_re.match(line)
+
+            if match is None:
+                continue
+
+            # A line can match the layout of a format and still hold a
+            # value it can't store, such as a %t of another format
+            try:
+                log = self.storeMatch(k, line, match, bytes_mode)
+            except (IndexError, KeyError, ValueError) as store_error:
+                error = store_error
+                continue
+
+            self.last_index = k
+
+            return log
+
+        raise error
+
+    def storeMatch(self, k, line, match, bytes_mode):
+        parser = self.format_parser_list[k]
+        value_list = match.groups()
+
+        # The generic engine applies overflow_mode to long values
+        if self.max_field_len is not None and parser.overLimit(line,
+                value_list):
+            if bytes_mode:
+                return parser.parseBytesGeneric(line)
+
+            return parser.parseGeneric(line)
+
+        if bytes_mode:
+            return parser.storeBytesValues(value_list, parser.regex_plan)
+
+        return parser.storeValues(value_list, parser.regex_plan)
+
+    def constructorArgs(self):
+        return (self.format_list, self.encoding, self.ip_mode,
+            self.max_line_len, self.max_field_len, self.overflow_mode)
+
+    def fieldList(self):
+        field_list = []
+        name_set = set()
+
+        for parser in self.format_parser_list:
+            for entry in parser.fieldList():
+                if entry[0] not in name_set:
+                    name_set.add(entry[0])
+                    field_list.append(entry)
+
+        return field_list
+
+    parseBatch = Parser.parseBatch
+    parseLines = Parser.parseLines
+    parseFile = Parser.parseFile
+    parseSampledBatch = Parser.parseSampledBatch
+    parseReservoir = Parser.parseReservoir
+    limitLine = Parser.limitLine
+
+
+
+#
+# @Class
+#   LazyAttribute
+#
+# @Initialization Prototype
+#   LazyAttribute(name_str)
+#
+# @Purpose
+#   Class level default for the fields of HTTPLine and ApacheLog.  Fields
+#   stored eagerly live in the instance dict and never reach this object.
+#   Fields stored with storeLazy keep their raw value and decode function
+#   in raw_dict, and are decoded here on first read and then cached in the
+#   instance dict.  Fields that were never stored read as None.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   name_str : Attribute name this object stands in for
+#
+# @Class Methods
+#   __get__(obj, owner) : Decode and cache a pending raw value
+#
+# @Notes
+#   This is a non-data descriptor on purpose so reading a stored field is a
+#   plain instance dict lookup.
+#
+class LazyAttribute:
+    def __init__(self, name_str):
+        self.name_str = name_str
+
+    def __get__(self, obj, owner = None):
+        if obj is None:
+            return self
+
+        raw_dict = obj.raw_dict
+
+        if raw_dict is None or self.name_str not in raw_dict:
+            return None
+
+        (raw, decode_func) = raw_dict.pop(self.name_str)
+        value = decode_func(raw)
+        obj.__dict__[self.name_str] = value
+
+        return value
+
+
+#
+# @Prototype
+#   Function: storeLazy()
+#   Example:  storeLazy( log, 'header_line_str', raw_str, unescapeField )
+#
+# @Purpose
+#   This function stores a raw field value on an HTTPLine or ApacheLog
+#   object to be passed through decode_func when the field is first read
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       obj         : HTTPLine or ApacheLog object
+#       attr_str    : Name of the field
+#       raw         : Raw value as found in the log line
+#       decode_func : Function turning raw into the field value
+#
+def storeLazy(obj, attr_str, raw, decode_func):
+    if obj.raw_dict is None:
+        obj.raw_dict = {}
+
+    obj.raw_dict[attr_str] = (raw, decode_func)
+    obj.__dict__.pop(attr_str, None)
+
+
+#
+# @Class
+#   HTTPLine
+#
+# @Initialization Prototype
+#   HTTPLine(method_str, request_URI_str, http_vers_str)
+#
+# @Purpose
+#   Class for storing httpline components to easily use each
+#   portion of the http request line
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   method_str
+#   request_URI_str
+#   http_vers_str
+#   raw_dict : Pending raw values of lazily stored fields
+#
+#   Computed from request_URI_str on first access
+#   path_str         : URI up to the '?'
+#   query_str        : URI after the '?', None without one
+#   query_dict       : Read only mapping of query parameter name to a tuple
+#                      of its values
+#   decoded_path_str : path_str with %xx escapes decoded
+#
+# @Class Methods
+#
+# @Notes
+#   Input
+#       method_str
+#       request_URI_str
+#       http_vers_str
+#
+class HTTPLine:
+    raw_dict = None
+
+    method_str = LazyAttribute('method_str')
+
+    request_URI_str = LazyAttribute('request_URI_str')
+
+    http_version_str = LazyAttribute('http_version_str')
+
+    def __init__(self, method_str, request_URI_str, http_version_str):
+        self.method_str = method_str
+        self.request_URI_str = request_URI_str
+        self.http_version_str = http_version_str
+
+    @cached_property
+    def path_str(self):
+        return splitURI(self.request_URI_str)[0]
+
+    @cached_property
+    def query_str(self):
+        return splitURI(self.request_URI_str)[1]
+
+    @cached_property
+    def query_dict(self):
+        return parseQuery(self.query_str)
+
+    @cached_property
+    def decoded_path_str(self):
+        return decodePath(self.path_str)
+
+
+#
+# Bounded caches for the request URI helpers, a few hot URIs make up most
+# of the traffic so the same results are asked for over and over
+#
+uri_cache_size = 4096
+
+#
+# @Prototype
+#   Function: splitURI()
+#   Example:  splitURI( '/index.php?page=2' )
+#
+# @Purpose
+#   This function splits a request URI into its path and query string
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       uri_str : Request URI, may be None
+#   Output:
+#       (path_str, query_str) : query_str is None without a '?'
+#
+@lru_cache(maxsize = uri_cache_size)
+def splitURI(uri_str):
+    if uri_str is None:
+        return (None, None)
+
+    (path_str, sep_str, query_str) = uri_str.partition('?')
 
-        return log
+    # Fragments are never sent by clients but keep them out of the query
+    query_str = query_str.partition('#')[0]
 
+    return (path_str, query_str if sep_str else None)
 
 
 #
-# @Class
-#   HTTPLine
-#
-# @Initialization Prototype
-#   HTTPLine(method_str, request_URI_str, http_vers_str)
+# @Prototype
+#   Function: parseQuery()
+#   Example:  parseQuery( 'page=2&tag=a&tag=b' )
 #
 # @Purpose
-#   Class for storing httpline components to easily use each
-#   portion of the http request line
+#   This function parses a query string, with or without its leading '?',
+#   into a read only mapping of parameter name to a tuple of values
 #
 # @Revision
 #   Author: Christopher L. Ranc
 #   Modified:
 #
-# @Internal variables
-#   method_str
-#   request_URI_str
-#   http_vers_str
+# @Notes:
+#   The result is shared by every caller asking for the same query string,
+#   which is why it can't be modified
 #
-# @Class Methods
+@lru_cache(maxsize = uri_cache_size)
+def parseQuery(query_str):
+    if not query_str:
+        return MappingProxyType({})
+
+    if query_str[0] == '?':
+        query_str = query_str[1:]
+
+    query_dict = parse_qs(query_str, keep_blank_values = True,
+        errors = 'surrogateescape')
+
+    return MappingProxyType({ name : tuple(value_list)
+        for (name, value_list) in query_dict.items() })
+
+
 #
-# @Notes
-#   Input
-#       method_str
-#       request_URI_str
-#       http_vers_str
+# @Prototype
+#   Function: decodePath()
+#   Example:  decodePath( '/a%20b' )
 #
-class HTTPLine:
-    def __init__(self, method_str, request_URI_str, http_version_str):
-        self.method_str = method_str
-        self.request_URI_str = request_URI_str
-        self.http_version_str = http_version_str
+# @Purpose
+#   This function decodes the %xx escapes of a URL path
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+@lru_cache(maxsize = uri_cache_size)
+def decodePath(path_str):
+    if path_str is None or '%' not in path_str:
+        return path_str
+
+    return unquote(path_str, errors = 'surrogateescape')
 
 #
 # @Class
@@ -106,7 +1294,9 @@ class HTTPLine:
 #
 # @Internal variables
 #    self.remote_ip_str
+#    self.remote_ip_int : Packed remote_ip_str in ip_mode 'int'
 #    self.local_ip_str
+#    self.local_ip_int  : Packed local_ip_str in ip_mode 'int'
 #    self.byte_count_nh_int
 #    self.byte_count_nhclf_int
 #    self.cookie_str
@@ -130,7 +1320,7 @@ class HTTPLine:
 #    self.time
 #    self.unit_str
 #    self.remote_user_str
-#    self.url_path
+#    self.url_path_str
 #    self.request_server_name_str
 #    self.server_name_str
 #    self.connection_status_str
@@ -138,78 +1328,329 @@ class HTTPLine:
 #    self.bytes_sent_int
 #    self.request_str
 #    self.response_str
+#    self.raw_dict : Pending raw values of lazily stored fields
+#    self.sample_weight : Number of log lines this object stands for when
+#                         it was picked by sampling, otherwise 1 so
+#                         unsampled counts stay integers
+#
+#    self.slot_list : Raw values of the %{name} variables in format order
+#    self.slot_info : Slot names of the format, see Parser
+#
+#    Computed on first access
+#    self.query_dict           : parseQuery of query_str
+#    self.decoded_url_path_str : decodePath of url_path_str
+#    self.headers       : FieldMapping of the %{name}i request headers
+#    self.reply_headers : FieldMapping of the %{name}o reply headers
+#    self.cookies       : FieldMapping of the %{name}C cookies
+#    self.environ       : FieldMapping of the %{name}e environment variables
+#    self.notes         : FieldMapping of the %{name}n notes
+#
+#    header_line_str, reply_str, cookie_str, environment_var_str and
+#    note_str hold the value of the last variable of their kind.
 #
 # @Class Methods
 #
 # @Notes
+#   Every field defaults to None through its LazyAttribute, only the
+#   fields found in the log line are set on the instance.
 #
 class ApacheLog:
-    def __init__(self):
-        self.remote_ip_str = None
+    raw_dict = None
+
+    slot_list = None
+
+    slot_info = None
+
+    sample_weight = 1
+
+    remote_ip_str = LazyAttribute('remote_ip_str')
+
+    remote_ip_int = LazyAttribute('remote_ip_int')
+
+    local_ip_str = LazyAttribute('local_ip_str')
+
+    local_ip_int = LazyAttribute('local_ip_int')
+
+    byte_count_nh_int = LazyAttribute('byte_count_nh_int')
+
+    byte_count_nhclf_int = LazyAttribute('byte_count_nhclf_int')
+
+    cookie_str = LazyAttribute('cookie_str')
+
+    request_time_int = LazyAttribute('request_time_int')
+
+    environment_var_str = LazyAttribute('environment_var_str')
+
+    filename_str = LazyAttribute('filename_str')
+
+    remote_host_str = LazyAttribute('remote_host_str')
+
+    request_protocol_str = LazyAttribute('request_protocol_str')
+
+    header_line_str = LazyAttribute('header_line_str')
+
+    keep_alive_cnt_int = LazyAttribute('keep_alive_cnt_int')
+
+    remote_log_str = LazyAttribute('remote_log_str')
+
+    request_method_str = LazyAttribute('request_method_str')
+
+    note_str = LazyAttribute('note_str')
+
+    reply_str = LazyAttribute('reply_str')
+
+    port_str = LazyAttribute('port_str')
+
+    proc_id_str = LazyAttribute('proc_id_str')
+
+    query_str = LazyAttribute('query_str')
+
+    http_line = LazyAttribute('http_line')
+
+    handler_str = LazyAttribute('handler_str')
 
-        self.local_ip_str = None
+    last_request_time_int = LazyAttribute('last_request_time_int')
 
-        self.byte_count_nh_int = None
+    time = LazyAttribute('time')
 
-        self.byte_count_nhclf_int = None
+    unit_str = LazyAttribute('unit_str')
 
-        self.cookie_str = None
+    remote_user_str = LazyAttribute('remote_user_str')
 
-        self.request_time_int = None
+    url_path_str = LazyAttribute('url_path_str')
 
-        self.environment_var_str = None
+    request_server_name_str = LazyAttribute('request_server_name_str')
 
-        self.filename_str = None
+    server_name_str = LazyAttribute('server_name_str')
 
-        self.remote_host_str = None
+    connection_status_str = LazyAttribute('connection_status_str')
 
-        self.request_protocol_str = None
+    bytes_recieved_int = LazyAttribute('bytes_recieved_int')
 
-        self.header_line_str = None
+    bytes_sent_int = LazyAttribute('bytes_sent_int')
 
-        self.keep_alive_cnt_int = None
+    request_str = LazyAttribute('request_str')
 
-        self.remote_log_str = None
+    response_str = LazyAttribute('response_str')
 
-        self.request_method_str = None
+    @cached_property
+    def query_dict(self):
+        return parseQuery(self.query_str)
 
-        self.note_str = None
+    @cached_property
+    def decoded_url_path_str(self):
+        return decodePath(self.url_path_str)
 
-        self.reply_str = None
+    @cached_property
+    def headers(self):
+        return FieldMapping(self, 'i')
 
-        self.port_str = None
+    @cached_property
+    def reply_headers(self):
+        return FieldMapping(self, 'o')
 
-        self.proc_id_str = None
+    @cached_property
+    def cookies(self):
+        return FieldMapping(self, 'C')
 
-        self.query_str = None
+    @cached_property
+    def environ(self):
+        return FieldMapping(self, 'e')
 
-        self.http_line = None
+    @cached_property
+    def notes(self):
+        return FieldMapping(self, 'n')
 
-        self.handler_str = None
 
-        self.last_request_time_int = None
+#
+# @Class
+#   FieldMapping : subclass of Mapping
+#
+# @Initialization Prototype
+#   FieldMapping(log, directive_str)
+#
+# @Purpose
+#   Read only mapping from the names of the %{name} variables of one kind
+#   to their values in one ApacheLog, so a format with several %{X}i
+#   variables can be read as log.headers['User-Agent'].  The values stay
+#   raw in log.slot_list until they are read.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   slot_list   : The raw slot values of the log
+#   name_dict   : Name key -> (slot, quoted, name) for this kind
+#   decode_pair : decode functions of the Parser
+#   key_func    : Turns a name into its key, lower case for headers
+#
+# @Notes
+#   Names of the format that are missing from the mapping raise KeyError
+#   like a dict, use get() for optional ones.
+#
+class FieldMapping(Mapping):
+    def __init__(self, log, directive_str):
+        self.slot_list = log.slot_list
+        self.directive_str = directive_str
+
+        if log.slot_info is None:
+            self.name_dict = {}
+            self.decode_pair = None
+        else:
+            self.name_dict = log.slot_info[0].get(directive_str, {})
+            self.decode_pair = log.slot_info[1]
+
+    def __getitem__(self, name_str):
+        (slot, quoted, orig_str) = self.name_dict[slotKey(self.directive_str,
+            name_str)]
+
+        raw = self.slot_list[slot]
+
+        if raw is None:
+            return None
+
+        return decodeSlot(raw, quoted, self.decode_pair)
+
+    def __iter__(self):
+        return (entry[2] for entry in self.name_dict.values())
+
+    def __len__(self):
+        return len(self.name_dict)
+
+    def __repr__(self):
+        return 'FieldMapping(%r)' % dict(self)
+
+
+#
+# Mapping property, legacy single value attribute and whether names are
+# case insensitive, for each directive whose %{name} variables get a slot
+#
+slot_directive_dict = {
+    'i' : ('headers', 'header_line_str', True),
+    'o' : ('reply_headers', 'reply_str', True),
+    'C' : ('cookies', 'cookie_str', False),
+    'e' : ('environ', 'environment_var_str', False),
+    'n' : ('notes', 'note_str', False)
+}
+
+#
+# @Prototype
+#   Function: slotKey()
+#   Example:  slotKey( 'i', 'User-Agent' )
+#
+# @Purpose
+#   This function returns the name_dict key of a %{name} variable, header
+#   names are matched case insensitively
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def slotKey(directive_str, name_str):
+    if slot_directive_dict[directive_str][2]:
+        return name_str.lower()
+
+    return name_str
+
+
+#
+# @Prototype
+#   Function: decodeSlot()
+#   Example:  decodeSlot( raw, True, decode_pair )
+#
+# @Purpose
+#   This function turns a raw slot value into its str value.  Results are
+#   cached since header values such as common User-Agents repeat on line
+#   after line.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       raw         : str or bytes value as found in the log line
+#       quoted      : True when the variable was quoted and may hold
+#                     escapes
+#       decode_pair : decode functions of the Parser
+#
+@lru_cache(maxsize = 4096)
+def decodeSlot(raw, quoted, decode_pair):
+    if type(raw) is str:
+        return unescapeField(raw) if quoted else raw
+
+    if quoted and b'\\' in raw:
+        return decode_pair[1](raw)
 
-        self.time = None
+    return decode_pair[0](raw)
 
-        self.unit_str = None
 
-        self.remote_user_str = None
+#
+# Regex of an unquoted str field, it ends at a space or the newline
+#
+str_stop_re = re.compile(r'[^ \n]*')
 
-        self.url_path_str = None
+#
+# Regex for the spaces and newlines between the parts of an unquoted %r
+#
+field_sep_re = re.compile(r'[ \n]')
 
-        self.request_server_name_str = None
+#
+# @Prototype
+#   Function: storeSlot()
+#   Example:  storeSlot( raw_str, log, parser )
+#
+# @Purpose
+#   This function stores the raw value of a %{name} variable into its
+#   slot and keeps the legacy single value attribute of its kind pointing
+#   at it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       raw_str : Variable text as logged, between its quotes if quoted
+#       log     : Apache log object for storing
+#       parser  : parser_list entry of the variable
+#
+def storeSlot(raw_str, log, parser):
+    log.slot_list[parser[5]] = raw_str
 
-        self.server_name_str = None
+    attr_str = slot_directive_dict[parser[2]][1]
 
-        self.connection_status_str = None
+    if parser[4] and '\\' in raw_str:
+        storeLazy(log, attr_str, raw_str, unescapeField)
+    else:
+        setattr(log, attr_str, raw_str)
 
-        self.bytes_recieved_int = None
 
-        self.bytes_sent_int = None
+#
+# @Prototype
+#   Function: storeBytesSlot()
+#   Example:  storeBytesSlot( raw_bytes, log, parser, decode_pair )
+#
+# @Purpose
+#   This function is storeSlot for bytes log lines
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       parser : bytes_parser_list entry of the variable
+#
+def storeBytesSlot(raw_bytes, log, parser, decode_pair):
+    log.slot_list[parser[3]] = raw_bytes
 
-        self.request_str = None
+    if parser[2] and b'\\' in raw_bytes:
+        storeLazy(log, parser[1], raw_bytes, decode_pair[1])
+    else:
+        storeLazy(log, parser[1], raw_bytes, decode_pair[0])
 
-        self.response_str = None
 
 
 
@@ -237,6 +1678,7 @@ class ApacheLog:
 #   tzname(dt)    : required method for tzinfo subclasses
 #   dst(dt)       : required method for tzinfo subclasses
 #   __repr__()    : required method for tzinfo subclasses
+#   __getinitargs__() : lets tzinfo pickle the object
 #
 # @Notes
 #   Input
@@ -252,24 +1694,256 @@ class FixedOffset(tzinfo):
         else:
             direction = +1
 
-        ## Calculating offset from time offset_str
-        offset = int(offset_str[2:4]) * 60 + int(offset_str[4:6])
+        ## Calculating offset from time offset_str
+        offset = int(offset_str[1:3]) * 60 + int(offset_str[3:5])
+
+        self.__offset = timedelta(minutes = direction * offset)
+
+        self.__name = offset_str
+
+    def utcoffset(self, dt):
+        return self.__offset
+
+    def tzname(self, dt):
+        return self.__name
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def __repr__(self):
+        return repr(self.__name)
+
+    def __getinitargs__(self):
+        return (self.__name,)
+
+
+#
+# @Prototype
+#   Function: readLogBatches()
+#   Example:  readLogBatches( file_path )
+#             readLogBatches( file_path, True, 512, 0.5, metrics )
+#
+# @Purpose
+#   This generator reads a log file and yields lists of at most
+#   batch_size lines.  In follow mode it keeps reading what is appended to
+#   the file, yields whatever it holds whenever it reaches the end of the
+#   file, and reopens the path when the file is rotated or truncated.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#      file_path     : Path of the log file
+#      follow        : Keep waiting for appended lines when True
+#      batch_size    : Largest number of lines per yielded list
+#      poll_interval : Seconds to wait at the end of a followed file
+#      metrics       : Optional ParserMetrics for bytes read and lag
+#   Output:
+#      Lists of undecoded lines as bytes, Parser.parse takes them as is
+#
+#   In follow mode a trailing line without a newline is held back until
+#   the rest of it is written.
+#
+def readLogBatches(file_path, follow = False, batch_size = 1024,
+        poll_interval = 1.0, metrics = None):
+    log_file = open(file_path, 'rb')
+    pending = b''
+
+    try:
+        while True:
+            line_list = []
+            byte_cnt = 0
+
+            for line in log_file:
+                byte_cnt += len(line)
+
+                if pending:
+                    line = pending + line
+                    pending = b''
+
+                if follow and not line.endswith(b'\n'):
+                    pending = line
+                    break
+
+                line_list.append(line)
+
+                if len(line_list) >= batch_size:
+                    break
+
+            if metrics is not None:
+                stat = os.fstat(log_file.fileno())
+                metrics.recordRead(byte_cnt, stat.st_size - log_file.tell())
+
+            if line_list:
+                yield line_list
+                continue
+
+            if not follow:
+                return
+
+            sleep(poll_interval)
+
+            # Reopen the path if the file was rotated away or truncated
+            try:
+                stat = os.stat(file_path)
+            except FileNotFoundError:
+                continue
+
+            if (stat.st_ino != os.fstat(log_file.fileno()).st_ino
+                    or stat.st_size < log_file.tell()):
+                log_file.close()
+                log_file = open(file_path, 'rb')
+                pending = b''
+    finally:
+        log_file.close()
+
+
+#
+# @Prototype
+#   Function: readRange()
+#   Example:  readRange( 'access.log', 0, 1 << 20, 4096 )
+#
+# @Purpose
+#   This generator yields lists of at most batch_size lines of a file,
+#   from the line starting at offset up to the line holding end
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def readRange(file_path, offset, end, batch_size):
+    with open(file_path, 'rb', 1 << 20) as log_file:
+        log_file.seek(offset)
+        line_list = []
+
+        for line in log_file:
+            line_list.append(line)
+            offset += len(line)
+
+            if len(line_list) >= batch_size or offset >= end:
+                yield line_list
+                line_list = []
+
+            if offset >= end:
+                return
+
+        if line_list:
+            yield line_list
+
+
+#
+# @Prototype
+#   Function: fieldGetter()
+#   Example:  fieldGetter( 'remote_ip_str' )
+#             fieldGetter( 'http_line.request_URI_str' )
+#
+# @Purpose
+#   This function returns a function reading the named field from an
+#   ApacheLog object.  Dotted names reach into HTTPLine and read as None
+#   when a part along the way is None.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#      field_str : ApacheLog attribute name, optionally dotted
+#   Output:
+#      get_func : Function of an ApacheLog returning the field value
+#
+def fieldGetter(field_str):
+    attr_list = field_str.split('.')
+
+    if len(attr_list) == 1:
+        return attrgetter(field_str)
+
+    def getField(obj):
+        for attr_str in attr_list:
+            obj = getattr(obj, attr_str)
+
+            if obj is None:
+                return None
+
+        return obj
+
+    return getField
+
+
+#
+# @Prototype
+#   Function: slotGetter()
+#   Example:  slotGetter( 'headers', 'User-Agent' )
+#
+# @Purpose
+#   This function returns a function reading one name of a FieldMapping
+#   property such as log.headers from an ApacheLog object
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def slotGetter(mapping_str, name_str):
+    def getSlot(log):
+        return getattr(log, mapping_str).get(name_str)
+
+    return getSlot
+
+
+#
+# @Prototype
+#   Function: fieldBytesGetter()
+#   Example:  fieldBytesGetter( 'remote_ip_str' )
+#
+# @Purpose
+#   This function returns a function reading the named field from an
+#   ApacheLog object as UTF-8 bytes, for hashing.  Fields of bytes log lines
+#   that were not read yet are returned as their raw bytes without decoding
+#   them.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#      field_str : ApacheLog attribute name, optionally dotted
+#   Output:
+#      get_func : Function of an ApacheLog returning bytes or None
+#
+#   The bytes are always value.encode('utf-8', 'surrogateescape') so raw
+#   and already decoded fields hash the same.
+#
+def fieldBytesGetter(field_str):
+    attr_list = field_str.split('.')
+    last_attr_str = attr_list.pop()
+
+    def getFieldBytes(obj):
+        for attr_str in attr_list:
+            obj = getattr(obj, attr_str)
 
-        self.__offset = timedelta(minutes = direction * offset)
+            if obj is None:
+                return None
 
-        self.__name = offset_str
+        if obj.raw_dict is not None:
+            pending = obj.raw_dict.get(last_attr_str)
 
-    def utcoffset(self, dt):
-        return self.__offset
+            if pending is not None and pending[1] is decodeUTF8:
+                return pending[0]
 
-    def tzname(self, dt):
-        return self.__name
+        value = getattr(obj, last_attr_str)
 
-    def dst(self, dt):
-        return timedelta(0)
+        if value is None:
+            return None
 
-    def __repr__(self):
-        return repr(self.__name)
+        if type(value) is not str:
+            value = str(value)
+
+        return value.encode('utf-8', 'surrogateescape')
+
+    return getFieldBytes
 
 
 #
@@ -300,7 +1974,14 @@ isNEqualSPNL = lambda x : x != ' ' and x != '\n'
 #      (parsed_string, i) : Parsed out string and the end
 #                           index of it from the input string
 #
+#   The default stop condition is matched with str_stop_re instead of
+#   calling isValidChar on every character
+#
 def getString(input_str, isValidChar=isNEqualSPNL):
+    if isValidChar is isNEqualSPNL:
+        i = str_stop_re.match(input_str).end()
+        return (input_str[:i], i)
+
     i = 0
 
     for char in input_str:
@@ -339,6 +2020,168 @@ def getInt(input_string):
     return (int(num_string), i)
 
 
+# Delimiter characters that open and close a quoted variable
+quote_set = {'"', "'"}
+
+#
+# @Prototype
+#   Function: findQuoteEnd()
+#   Example:  findQuoteEnd( log_str, i, '"' )
+#
+# @Purpose
+#   This function returns the index of the quote closing the quoted
+#   variable that starts at index i, skipping quotes escaped with a
+#   backslash.  Only the variable itself is scanned.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#      log_str   : Whole log string
+#      i         : Index of the first character after the opening quote
+#      quote_chr : Quote character to look for
+#      esc_chr   : Escape character, 92 when log_str is bytes
+#   Output:
+#      end : Index of the closing quote
+#
+#   A ValueError is raised when the closing quote is missing
+#
+#   Once a quote turns out escaped the rest is left to quote_end_re_dict,
+#   a value packed with escaped quotes costs one regex pass instead of a
+#   find per quote
+#
+def findQuoteEnd(log_str, i, quote_chr, esc_chr = '\\'):
+    end = log_str.find(quote_chr, i)
+
+    if end > i and log_str[end - 1] == esc_chr:
+        match = quote_end_re_dict[quote_chr].match(log_str, i)
+        end = match.end() - 1 if match else -1
+
+    if end < 0:
+        raise ValueError('Missing closing quote for field at %d' % i)
+
+    return end
+
+
+#
+# Possessive quantifiers are only in re from Python 3.11, older versions
+# get the same matches from a lookahead and a backreference
+#
+atomic_groups = sys.version_info >= (3, 11)
+
+possessive_re = re.compile(r'([*+?}])\+')
+
+#
+# @Prototype
+#   Function: atomicPattern()
+#   Example:  atomicPattern( r'[^ \n]*+', 'g1' )
+#
+# @Purpose
+#   This function returns a regex capturing body_str in one group that is
+#   never given back to let what follows it match.  body_str is written
+#   with possessive quantifiers only, such that they make all of it
+#   atomic.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Without possessive quantifiers they are dropped and body_str goes in
+#   a lookahead, which matches it once, followed by a backreference taking
+#   what it matched.  The regex engine never backtracks into a lookahead
+#   that succeeded.  name_str must be unique in the whole regex.
+#
+#   Possessive quantifiers are used when re has them, an atomic group
+#   around greedy ones costs a backtracking entry per repetition and is
+#   superlinear on long quoted values.
+#
+def atomicPattern(body_str, name_str):
+    if atomic_groups:
+        return '(%s)' % body_str
+
+    return '(?=(?P<%s>%s))(?P=%s)' % (name_str, possessive_re.sub(r'\1',
+        body_str), name_str)
+
+
+#
+# Regex of a quoted variable without its closing quote, the loop unrolled
+# so there is one way to match any value
+#
+quoted_pattern = r'[^%s\\]*+(?:\\.[^%s\\]*+)*+'
+
+#
+# @Prototype
+#   Function: quoteEndPattern()
+#   Example:  quoteEndPattern( '"' )
+#
+# @Purpose
+#   This function returns the regex of a quoted variable up to its closing
+#   quote, a backslash always takes the next character with it so a quote
+#   is escaped by an odd number of backslashes
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def quoteEndPattern(quote_chr):
+    return atomicPattern(quoted_pattern % ((quote_chr,) * 2), 'q') + quote_chr
+
+
+#
+# quoteEndPattern of each quote character, str and bytes
+#
+quote_end_re_dict = { key : re.compile(pattern, re.S)
+    for (quote_chr, pattern) in ((quote_chr, quoteEndPattern(quote_chr))
+        for quote_chr in quote_set)
+    for (key, pattern) in ((quote_chr, pattern),
+        (quote_chr.encode(), pattern.encode())) }
+
+
+#
+# Apache escape sequences, runs of \xhh are decoded together so multibyte
+# UTF-8 characters come back whole
+#
+escape_re = re.compile(r'((?:\\x[0-9a-fA-F]{2})+)|\\(.)', re.S)
+
+esc_chr_dict = { 'n' : '\n', 't' : '\t', 'r' : '\r', 'b' : '\b', 'v' : '\v',
+    'f' : '\f', 'a' : '\a' }
+
+def replaceEscape(match):
+    if match.group(1):
+        hex_str = match.group(1).replace('\\x', '')
+        return bytes.fromhex(hex_str).decode('utf-8', 'surrogateescape')
+
+    return esc_chr_dict.get(match.group(2), match.group(2))
+
+#
+# @Prototype
+#   Function: unescapeField()
+#   Example:  unescapeField( raw_str )
+#
+# @Purpose
+#   This function undoes the escaping Apache applies to logged values,
+#   \" \\ \n \t and friends plus \xhh for other bytes
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#      raw_str : Field as written in the log
+#   Output:
+#      Unescaped field value
+#
+def unescapeField(raw_str):
+    if '\\' not in raw_str:
+        return raw_str
+
+    return escape_re.sub(replaceEscape, raw_str)
+
+
 #
 # @Prototype
 #   Function: getEscDelim
@@ -424,6 +2267,13 @@ def getEscDelim( delim_chr ):
 #                                  functions applicable to the variables of
 #                                  the format string.
 #
+#   Each parser_list entry is
+#      [ store function, format bracket string, format character,
+#        index into delim_list where the variable starts, quote character
+#        when the variable is wrapped in quotes otherwise '',
+#        slot index for %{name} variables of slot_directive_dict
+#        otherwise None ]
+#
 def parseFormatString( format_string ):
     delim_list = []
     parser_list = []
@@ -441,6 +2291,7 @@ def parseFormatString( format_string ):
                 i += 1
             else:
                 i = appendParserList( format_string, parser_list, i )
+                parser_list[-1].append( len(delim_list) )
 
         # Check for back slashes to identify escaped characters
         elif format_string[i] == '\\':
@@ -456,6 +2307,27 @@ def parseFormatString( format_string ):
             delim_list.append( format_string[i] )
             i += 1
 
+    # Mark variables directly wrapped in a pair of quote characters and
+    # number the named variables that get a slot
+    prev_d = 0
+    slot_cnt = 0
+
+    for parser in parser_list:
+        d = parser[3]
+        quote_chr = ''
+
+        if (prev_d < d < len(delim_list) and delim_list[d - 1] in quote_set
+                and delim_list[d] == delim_list[d - 1]):
+            quote_chr = delim_list[d]
+
+        parser.append( quote_chr )
+        prev_d = d
+
+        if parser[1] and parser[2] in slot_directive_dict:
+            parser.append( slot_cnt )
+            slot_cnt += 1
+        else:
+            parser.append( None )
 
     return (delim_list, parser_list)
 
@@ -532,7 +2404,8 @@ def appendParserList( input_str, parser_list, index ):
         format_str = input_str[index]
         index += 1
 
-    parser_list.append( [parse_func_dict[format_str], format_bracket_str] )
+    parser_list.append( [parse_func_dict[format_str], format_bracket_str,
+        format_str] )
 
     return index
 
@@ -556,7 +2429,7 @@ def appendParserList( input_str, parser_list, index ):
 #       rip_str : String for parsing
 #   Output:
 #       i : ending index of parsed string value
-def storeRemoteIP(rip_str, log) :
+def storeRemoteIP(rip_str, log, fb_str = None) :
     (log.remote_ip_str, i) = getString(rip_str)
 
     return i
@@ -587,6 +2460,126 @@ def storeLocalIP(lip_str, log) :
     return i
 
 
+#
+# @Prototype
+#   Function: packIP()
+#   Example:  packIP( '203.0.113.7' )
+#
+# @Purpose
+#   This function packs an IPv4 or IPv6 address string into an integer,
+#   the 128 bit value of the IPv6 address.  IPv4 addresses are packed as
+#   their IPv4 mapped IPv6 address ::ffff:a.b.c.d.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       ip_str : Address as str or bytes
+#   Output:
+#       ip_int : Packed address, None for '-' or anything not an address
+#
+#   An IPv4 address and its IPv4 mapped IPv6 form pack to the same value,
+#   every other IPv6 address, ::1 included, packs apart from all IPv4
+#   ones.  Packed IPv4 addresses fit a signed 64 bit integer.
+#
+def packIP(ip_str):
+    if type(ip_str) is not str:
+        ip_str = ip_str.decode('latin-1')
+
+    try:
+        if ':' in ip_str:
+            return int.from_bytes(inet_pton(AF_INET6, ip_str), 'big')
+
+        return ipv4_mapped_int | int.from_bytes(inet_pton(AF_INET, ip_str),
+            'big')
+    except OSError:
+        return None
+
+
+#
+# Packed value of ::ffff:0.0.0.0, the IPv4 mapped block is
+# ipv4_mapped_int to ipv4_mapped_int + 2 ** 32 - 1
+#
+ipv4_mapped_int = 0xffff << 32
+
+#
+# @Prototype
+#   Function: isPackedIPv4()
+#   Example:  isPackedIPv4( packIP('203.0.113.7') )
+#
+# @Purpose
+#   This function tells whether a packIP integer is an IPv4 address
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def isPackedIPv4(ip_int):
+    return ip_int >> 32 == 0xffff
+
+
+#
+# @Prototype
+#   Function: unpackIP()
+#   Example:  unpackIP( 281474180570887 )
+#
+# @Purpose
+#   This function turns an integer from packIP back into its address
+#   string, IPv4 mapped addresses in dotted IPv4 form
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def unpackIP(ip_int):
+    if isPackedIPv4(ip_int):
+        return inet_ntop(AF_INET, (ip_int & 0xffffffff).to_bytes(4, 'big'))
+
+    return inet_ntop(AF_INET6, ip_int.to_bytes(16, 'big'))
+
+
+#
+# @Prototype
+#   Function: storeRemoteIPInt()
+#   Example:  storeRemoteIPInt( rip_str, log )
+#
+# @Purpose
+#   storeRemoteIP for ip_mode 'int', also stores the packed address as
+#   remote_ip_int
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeRemoteIPInt(rip_str, log, fb_str = None) :
+    i = storeRemoteIP(rip_str, log)
+    log.remote_ip_int = packIP(log.remote_ip_str)
+
+    return i
+
+
+#
+# @Prototype
+#   Function: storeLocalIPInt()
+#   Example:  storeLocalIPInt( lip_str, log )
+#
+# @Purpose
+#   storeLocalIP for ip_mode 'int', also stores the packed address as
+#   local_ip_int
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeLocalIPInt(lip_str, log) :
+    i = storeLocalIP(lip_str, log)
+    log.local_ip_int = packIP(log.local_ip_str)
+
+    return i
+
+
 #
 # @Prototype
 #   Function: storeByteCountNH()
@@ -683,7 +2676,7 @@ def storeCookie(cookie_str, log, fb_str = None):
 #       i : ending index of parsed string value
 #
 def storeRequestTime( rt_str, log):
-    (log.request_time, i) = getInt( rt_str )
+    (log.request_time_int, i) = getInt( rt_str )
 
     return i
 
@@ -731,7 +2724,7 @@ def storeEnvironVar(ev_str, log, fb_str = None):
 #       i : ending index of parsed string value
 #
 def storeFilename( fn_str, log):
-    (log.filename_str, i) = getString( filename_str )
+    (log.filename_str, i) = getString( fn_str )
 
     return i
 
@@ -754,8 +2747,8 @@ def storeFilename( fn_str, log):
 #   Output:
 #       i : ending index of parsed string value
 #
-def storeRemoteHost( rh_str, log ):
-    (log.remote_host, i) = getString(rh_str)
+def storeRemoteHost( rh_str, log, fb_str = None ):
+    (log.remote_host_str, i) = getString(rh_str)
 
     return i
 
@@ -853,7 +2846,7 @@ def storeKeepAliveCount( kac_str, log) :
 #       i : ending index of parsed string value
 #
 def storeRemoteLog( rl_str, log ):
-    (log.remote_log, i) = getString(rl_str)
+    (log.remote_log_str, i) = getString(rl_str)
 
     return i
 
@@ -1012,6 +3005,7 @@ isHTTPChar = lambda x : x == 'H' or x == 'T' or x == 'P' or (x > '-' and x < ':'
 # @Prototype
 #   Function: storeHTTPLine()
 #   Example:  storeHTTPLine( http_str, log )
+#             storeHTTPLine( log_str, log, i )
 #
 # @Purpose
 #   This function stores the http request string as a HTTPLine object into the
@@ -1024,20 +3018,122 @@ isHTTPChar = lambda x : x == 'H' or x == 'T' or x == 'P' or (x > '-' and x < ':'
 # @Notes:
 #   Input:
 #       http_str : String for parsing
+#       i        : Index the request starts at, the generic engine passes
+#                  the whole line so the rest of it is never copied
 #   Output:
 #       i : ending index of parsed string value
 #
-def storeHTTPLine( http_str, log ) :
-    (method_str, i) = getString(http_str)
-    i += 1
-    (request_URI_str, ii) = getString(http_str[i:])
-    i += ii + 1
-    (http_vers_str, ii) = getString(http_str[i:], isHTTPChar)
-    i += ii
+#   Past the end of http_str the parts are empty and the index keeps
+#   counting the separators, as with getString on the empty rest
+#
+def storeHTTPLine( http_str, log, i = 0 ) :
+    end = str_stop_re.match(http_str, i).end()
+    method_str = http_str[i:end]
 
-    log.http_line = HTTPLine( method_str, request_URI_str, http_vers_str )
+    i = end + 1
+    end = max(str_stop_re.match(http_str, i).end(), i)
+    request_URI_str = http_str[i:end]
 
-    return i
+    i = end + 1
+    end = max(http_vers_re.match(http_str, i).end(), i)
+
+    log.http_line = HTTPLine( method_str, request_URI_str, http_str[i:end] )
+
+    return end
+
+
+#
+# Regex for the http version string, what isHTTPChar accepts
+#
+http_vers_re = re.compile(r'[HTP./0-9]*')
+
+
+#
+# @Prototype
+#   Function: storeQuotedHTTPLine()
+#   Example:  storeQuotedHTTPLine( http_str, log )
+#
+# @Purpose
+#   This function stores a quoted http request string as a HTTPLine object
+#   into the given apache log object.  The request URI is everything
+#   between the first and the last space so URIs holding spaces survive.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       http_str : Whole quoted request line without its quotes
+#
+def storeQuotedHTTPLine( http_str, log ) :
+    first = http_str.find(' ')
+    last = http_str.rfind(' ')
+
+    if first < 0:
+        part_list = [http_str, '', '']
+    elif first == last:
+        part_list = [http_str[:first], http_str[first + 1:], '']
+    else:
+        part_list = [http_str[:first], http_str[first + 1:last],
+            http_str[last + 1:]]
+
+    if '\\' not in http_str:
+        log.http_line = HTTPLine( *part_list )
+        return
+
+    http_line = HTTPLine( None, None, None )
+
+    for (attr_str, part_str) in zip(http_attr_list, part_list):
+        storeLazy(http_line, attr_str, part_str, unescapeField)
+
+    log.http_line = http_line
+
+http_attr_list = ['method_str', 'request_URI_str', 'http_version_str']
+
+
+#
+# @Prototype
+#   Function: storeQuotedField()
+#   Example:  storeQuotedField( field_str, log, 'i', store_func )
+#
+# @Purpose
+#   This function stores the value of a quoted variable found by
+#   findQuoteEnd into the given apache log object.  String values holding
+#   escape sequences are only unescaped when the field is read.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       field_str : Variable text between its quotes
+#       log       : Apache log object for storing
+#       format_str: Format character of the variable
+#       store_func: Store function of the parser_list entry, with the
+#                   ip_mode 'int' ones the address is also packed
+#
+def storeQuotedField( field_str, log, format_str, store_func = None ):
+    (attr_str, field_type) = directive_field_dict[format_str]
+
+    if field_type is str:
+        if '\\' in field_str:
+            storeLazy(log, attr_str, field_str, unescapeField)
+        else:
+            setattr(log, attr_str, field_str)
+
+        if store_func is not None and store_func is ip_store_dict.get(format_str):
+            setattr(log, attr_str[:-4] + '_int', packIP(field_str))
+
+    elif field_type is int:
+        setattr(log, attr_str, getInt(field_str)[0])
+
+    elif field_type is HTTPLine:
+        storeQuotedHTTPLine(field_str, log)
+
+    else:
+        parse_func_dict[format_str](field_str, log)
 
 
 #
@@ -1085,7 +3181,7 @@ def storeHandler( h_str, log ) :
 #       i : ending index of parsed string value
 #
 def storeLastRequestTime( lrt_str, log ):
-    (log.last_request_time, i) = getInt( lrt_str )
+    (log.last_request_time_int, i) = getInt( lrt_str )
 
     return i
 
@@ -1121,33 +3217,111 @@ def storeLastRequestTime( lrt_str, log ):
 #
 #
 def storeTime( time_str, log, fb_str = None ):
-    i = 0
-
     # Meant for finding the length of the time string
     # this is added for the case for handling different
     # time string formats specified for the %{format}t
     # version of apache log time data
-    while time_str[i] != ']':
-        i += 1
+    i = findTimeEnd(time_str, 0, None, ']')
+
+    log.time = parseTime(time_str[:i - 1])
+
+    return i
+
+
+#
+# @Prototype
+#   Function: findTimeEnd()
+#   Example:  findTimeEnd( log_str, i, 8192, ']' )
+#
+# @Purpose
+#   This function returns the index after the ] closing the time that
+#   starts at index i, looking no further than max_len characters
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       log_str : Whole log string or bytes
+#       i       : Index the time starts at
+#       max_len : Longest time with its ], None for the rest of the line
+#       bracket : ']' or b']' for the type of log_str
+#   Output:
+#       end : Index after the ]
+#
+#   A ValueError is raised when no ] is found
+#
+def findTimeEnd(log_str, i, max_len, bracket):
+    if max_len is None:
+        end = log_str.find(bracket, i)
+    else:
+        end = log_str.find(bracket, i, i + max_len)
+
+    if end < 0:
+        raise ValueError('No ] closing the time at %d within %s' % (i,
+            'the line' if max_len is None else '%d' % max_len))
+
+    return end + 1
+
 
-    month_dict = { 'Jan' : 1, 'Feb': 2, 'Mar' : 3, 'Apr' : 4, 'May' : 5, 'Jun' : 6,
-        'Jul' : 6, 'Aug' : 8, 'Sep' : 9, 'Oct' : 10, 'Nov' : 11, 'Dec' : 12 }
+#
+# Bounded cache of parsed times, every line logged in the same second has
+# the same time string so they share one datetime object
+#
+time_cache_size = 4096
 
-    time = datetime(year=int(time_str[8:12]), month=month_dict[time_str[4:7]],
+#
+# @Prototype
+#   Function: parseTime()
+#   Example:  parseTime( '[00/Sep/2012:06:05:11 +0000' )
+#
+# @Purpose
+#   This function returns the datetime of an Apache time string, from
+#   its opening bracket on
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+@lru_cache(maxsize = time_cache_size)
+def parseTime(time_str):
+    return datetime(year=int(time_str[8:12]), month=month_dict[time_str[4:7]],
         day=int(time_str[1:3]), hour=int(time_str[13:15]),
         minute=int(time_str[16:18]), second=int(time_str[19:21]),
         tzinfo=FixedOffset(time_str[22:27]))
 
-    log.time = time
-
-    i += 1
 
-    return i
+month_dict = { 'Jan' : 1, 'Feb': 2, 'Mar' : 3, 'Apr' : 4, 'May' : 5, 'Jun' : 6,
+    'Jul' : 7, 'Aug' : 8, 'Sep' : 9, 'Oct' : 10, 'Nov' : 11, 'Dec' : 12 }
 
+month_bytes_dict = { month_str.encode() : month_int
+    for (month_str, month_int) in month_dict.items() }
 
 
-def storeUnit( u_str, log) :
-    (log.unit_str, log) = getString(u_str)
+#
+# @Prototype
+#   Function: storeUnit()
+#   Example:  storeUnit( u_str, log, fb_str )
+#
+# @Purpose
+#   This function stores the time taken to serve the request string, %T or
+#   %{UNIT}T, into the given apache log object and returns the ending index
+#   of the parsed string
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       u_str  : String for parsing
+#       fb_str : Format bracket string holding the unit if it exists
+#   Output:
+#       i : ending index of parsed string value
+#
+def storeUnit( u_str, log, fb_str = None ) :
+    (log.unit_str, i) = getString(u_str)
 
     return i
 
@@ -1173,7 +3347,7 @@ def storeUnit( u_str, log) :
 #       i : ending index of parsed string value
 #
 def storeRemoteUser( ru_str, log ):
-    (log.remote_user, i) = getString(ru_str)
+    (log.remote_user_str, i) = getString(ru_str)
 
     return i
 
@@ -1245,7 +3419,7 @@ def storeRequestServerName(rsn_str, log) :
 #       i : ending index of parsed string value
 #
 def storeServerName(sn_str, log) :
-    (log.server_name_str, log) = getString(sn_str)
+    (log.server_name_str, i) = getString(sn_str)
 
     return i
 
@@ -1340,8 +3514,8 @@ def storeBytesSent(bs_str, log) :
 #   Output:
 #       i : ending index of parsed string value
 #
-def storeRequest(req_str, log) :
-    (log.request_str, i) = getString(req_str, log)
+def storeRequest(req_str, log, fb_str = None) :
+    (log.request_str, i) = getString(req_str)
 
     return i
 
@@ -1364,8 +3538,8 @@ def storeRequest(req_str, log) :
 #   Output:
 #       i : ending index of parsed string value
 #
-def storeResponse(resp_str, log) :
-    (log.response_str, i) = getString(resp_str, log)
+def storeResponse(resp_str, log, fb_str = None) :
+    (log.response_str, i) = getString(resp_str)
 
     return i
 
@@ -1408,3 +3582,568 @@ parse_func_dict = {
     'ti' : storeRequest,
     'to' : storeResponse
 }
+
+
+#
+# Field decode functions for bytes log lines, the unescape versions are used
+# for quoted fields holding a backslash
+#
+def decodeUTF8(raw_bytes):
+    return raw_bytes.decode('utf-8', 'surrogateescape')
+
+def decodeLatin1(raw_bytes):
+    return raw_bytes.decode('latin-1')
+
+def unescapeUTF8(raw_bytes):
+    return unescapeField(raw_bytes.decode('utf-8', 'surrogateescape'))
+
+def unescapeLatin1(raw_bytes):
+    return unescapeField(raw_bytes.decode('latin-1'))
+
+decode_func_dict = {
+    'utf-8'   : (decodeUTF8, unescapeUTF8),
+    'utf8'    : (decodeUTF8, unescapeUTF8),
+    'latin-1' : (decodeLatin1, unescapeLatin1),
+    'latin1'  : (decodeLatin1, unescapeLatin1)
+}
+
+#
+# Regex of an unquoted bytes field, it ends at a space or the newline
+#
+bytes_stop_re = re.compile(rb'[^ \n]*')
+
+#
+# Regex for the http version string, the bytes version of isHTTPChar
+#
+bytes_http_vers_re = re.compile(rb'[HTP./0-9]*')
+
+#
+# Bytes version of field_sep_re
+#
+bytes_field_sep_re = re.compile(rb'[ \n]')
+
+
+#
+# @Prototype
+#   Function: storeBytesString()
+#   Example:  storeBytesString( log_bytes, i, log, 'remote_ip_str', decode_pair )
+#
+# @Purpose
+#   This function stores the bytes of the unquoted field starting at index i
+#   into the given apache log object, to be decoded when the field is read,
+#   and returns the ending index of the field
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       log_bytes   : Whole log line
+#       i           : Index the field starts at
+#       log         : Apache log object for storing
+#       attr_str    : Name of the field
+#       decode_pair : The decode functions of the Parser
+#   Output:
+#       end : ending index of the field
+#
+#   The bytes store functions take the whole line and a start index so no
+#   copy of the rest of the line is made per field
+#
+def storeBytesString(log_bytes, i, log, attr_str, decode_pair):
+    end = bytes_stop_re.match(log_bytes, i).end()
+
+    storeLazy(log, attr_str, log_bytes[i:end], decode_pair[0])
+
+    return end
+
+
+#
+# @Prototype
+#   Function: storeBytesIP()
+#   Example:  storeBytesIP( log_bytes, i, log, 'remote_ip_str', decode_pair )
+#
+# @Purpose
+#   This function is storeBytesString for %a and %A in ip_mode 'int', the
+#   packed address is stored right away in the matching _int field
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeBytesIP(log_bytes, i, log, attr_str, decode_pair):
+    end = bytes_stop_re.match(log_bytes, i).end()
+    ip_bytes = log_bytes[i:end]
+
+    storeLazy(log, attr_str, ip_bytes, decode_pair[0])
+    setattr(log, attr_str[:-4] + '_int', packIP(ip_bytes))
+
+    return end
+
+
+#
+# @Prototype
+#   Function: storeBytesInt()
+#   Example:  storeBytesInt( log_bytes, i, log, 'bytes_sent_int', decode_pair )
+#
+# @Purpose
+#   This function stores the unquoted number starting at index i as an
+#   integer, or None for '-', into the given apache log object and returns
+#   the ending index of the field
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeBytesInt(log_bytes, i, log, attr_str, decode_pair):
+    end = bytes_stop_re.match(log_bytes, i).end()
+    num_bytes = log_bytes[i:end]
+
+    if num_bytes == b'-':
+        setattr(log, attr_str, None)
+    else:
+        setattr(log, attr_str, int(num_bytes))
+
+    return end
+
+
+#
+# @Prototype
+#   Function: storeBytesTime()
+#   Example:  storeBytesTime( log_bytes, i, log, 'time', decode_pair )
+#
+# @Purpose
+#   This function is storeTime for bytes log lines
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeBytesTime(log_bytes, i, log, attr_str, decode_pair):
+    end = findTimeEnd(log_bytes, i, None, b']')
+
+    log.time = parseBytesTime(log_bytes[i:end - 1])
+
+    return end
+
+
+@lru_cache(maxsize = time_cache_size)
+def parseBytesTime(time_bytes):
+    return datetime(year=int(time_bytes[8:12]),
+        month=month_bytes_dict[time_bytes[4:7]],
+        day=int(time_bytes[1:3]), hour=int(time_bytes[13:15]),
+        minute=int(time_bytes[16:18]), second=int(time_bytes[19:21]),
+        tzinfo=FixedOffset(time_bytes[22:27].decode('latin-1')))
+
+
+#
+# @Prototype
+#   Function: storeBytesHTTPLine()
+#   Example:  storeBytesHTTPLine( log_bytes, i, log, 'http_line', decode_pair )
+#
+# @Purpose
+#   This function is storeHTTPLine for bytes log lines, the three parts are
+#   decoded when they are read
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def storeBytesHTTPLine(log_bytes, i, log, attr_str, decode_pair):
+    http_line = HTTPLine( None, None, None )
+
+    end = bytes_stop_re.match(log_bytes, i).end()
+    storeLazy(http_line, 'method_str', log_bytes[i:end], decode_pair[0])
+
+    i = end + 1
+    end = bytes_stop_re.match(log_bytes, i).end()
+    storeLazy(http_line, 'request_URI_str', log_bytes[i:end], decode_pair[0])
+
+    i = end + 1
+    end = bytes_http_vers_re.match(log_bytes, i).end()
+    storeLazy(http_line, 'http_version_str', log_bytes[i:end], decode_pair[0])
+
+    log.http_line = http_line
+
+    return end
+
+
+#
+# @Prototype
+#   Function: storeQuotedBytes()
+#   Example:  storeQuotedBytes( field_bytes, log, store_func, attr_str,
+#                               decode_pair )
+#
+# @Purpose
+#   This function is storeQuotedField for bytes log lines
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       field_bytes : Variable bytes between its quotes
+#       log         : Apache log object for storing
+#       store_func  : Bytes store function of the variable
+#       attr_str    : Name of the field
+#       decode_pair : The decode functions of the Parser
+#
+def storeQuotedBytes(field_bytes, log, store_func, attr_str, decode_pair):
+    decode_func = decode_pair[1] if b'\\' in field_bytes else decode_pair[0]
+
+    if store_func is storeBytesString:
+        storeLazy(log, attr_str, field_bytes, decode_func)
+
+    elif store_func is storeBytesIP:
+        storeLazy(log, attr_str, field_bytes, decode_func)
+        setattr(log, attr_str[:-4] + '_int', packIP(field_bytes))
+
+    elif store_func is storeBytesHTTPLine:
+        first = field_bytes.find(b' ')
+        last = field_bytes.rfind(b' ')
+
+        if first < 0:
+            part_list = [field_bytes, b'', b'']
+        elif first == last:
+            part_list = [field_bytes[:first], field_bytes[first + 1:], b'']
+        else:
+            part_list = [field_bytes[:first], field_bytes[first + 1:last],
+                field_bytes[last + 1:]]
+
+        http_line = HTTPLine( None, None, None )
+
+        for (http_attr_str, part_bytes) in zip(http_attr_list, part_list):
+            storeLazy(http_line, http_attr_str, part_bytes, decode_func)
+
+        log.http_line = http_line
+
+    else:
+        store_func(field_bytes, 0, log, attr_str, decode_pair)
+
+
+#
+# ApacheLog attribute and value type of each format character, used by
+# code that handles variables generically such as the quoted field path
+#
+directive_field_dict = {
+    'a'  : ('remote_ip_str', str),
+    'A'  : ('local_ip_str', str),
+    'B'  : ('byte_count_nh_int', int),
+    'b'  : ('byte_count_nhclf_int', int),
+    'C'  : ('cookie_str', str),
+    'D'  : ('request_time_int', int),
+    'e'  : ('environment_var_str', str),
+    'f'  : ('filename_str', str),
+    'h'  : ('remote_host_str', str),
+    'H'  : ('request_protocol_str', str),
+    'i'  : ('header_line_str', str),
+    'k'  : ('keep_alive_cnt_int', int),
+    'l'  : ('remote_log_str', str),
+    'm'  : ('request_method_str', str),
+    'n'  : ('note_str', str),
+    'o'  : ('reply_str', str),
+    'p'  : ('port_str', str),
+    'P'  : ('proc_id_str', str),
+    'q'  : ('query_str', str),
+    'r'  : ('http_line', HTTPLine),
+    'R'  : ('handler_str', str),
+    's'  : ('last_request_time_int', int),
+    't'  : ('time', datetime),
+    'T'  : ('unit_str', str),
+    'u'  : ('remote_user_str', str),
+    'U'  : ('url_path_str', str),
+    'v'  : ('request_server_name_str', str),
+    'V'  : ('server_name_str', str),
+    'X'  : ('connection_status_str', str),
+    'I'  : ('bytes_recieved_int', int),
+    'O'  : ('bytes_sent_int', int),
+    'ti' : ('request_str', str),
+    'to' : ('response_str', str)
+}
+
+
+#
+# Bytes store function for each field type of directive_field_dict
+#
+bytes_store_dict = {
+    str      : storeBytesString,
+    int      : storeBytesInt,
+    datetime : storeBytesTime,
+    HTTPLine : storeBytesHTTPLine
+}
+
+
+#
+# Store functions replacing the ones of parse_func_dict in ip_mode 'int'
+#
+ip_store_dict = {
+    'a' : storeRemoteIPInt,
+    'A' : storeLocalIPInt
+}
+
+
+#
+# Named LogFormat strings of the stock Apache configuration
+#
+format_dict = {
+    'common'       : '%h %l %u %t \\"%r\\" %>s %b',
+    'combined'     : '%h %l %u %t \\"%r\\" %>s %b \\"%{Referer}i\\" '
+                     '\\"%{User-Agent}i\\"',
+    'vhost_common' : '%v %h %l %u %t \\"%r\\" %>s %b'
+}
+
+#
+# Why each engine is picked for a format when Parser is left to choose
+#
+engine_reason_dict = {
+    'split'   : 'only unquoted variables separated by single spaces and no '
+                '%t, a line is cut up with one split',
+    'regex'   : 'quoted variables, %t or delimiters other than single '
+                'spaces, a line is cut up with one compiled regex match',
+    'generic' : 'walks the line variable by variable, the reference the '
+                'other engines hand unusual lines to'
+}
+
+#
+# Kinds of value in a matchPlan
+#
+(match_str, match_int, match_time, match_slot, match_quoted, match_http,
+    match_ip) = range(7)
+
+#
+# Regex of an unquoted variable, it ends at a space or the newline
+#
+unquoted_pattern = r'[^ \n]*+'
+
+#
+# Regexes of the three parts of an unquoted %r, what storeHTTPLine reads,
+# with any one character between them
+#
+http_line_pattern_list = [r'[^ \n]*+', r'[^ \n]*+', r'[HTP./0-9]*+']
+
+#
+# Regex of an unquoted %t up to and with the first ]
+#
+time_pattern = r'[^\]]*+\]'
+
+
+#
+# @Prototype
+#   Function: formatPattern()
+#   Example:  formatPattern( delim_list, parser_list )
+#
+# @Purpose
+#   This function returns a regex matching a whole log line of a format
+#   the way the generic engine reads it, with one group per variable, and
+#   the index of the first group of each parser_list entry
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Output:
+#       (pattern_str, group_list) : Compile pattern_str with re.S
+#
+#   Every variable is an atomicPattern named g and its group number, so
+#   it takes as much as the generic engine would and is never given back
+#   to let a delimiter match.  A line matches only if its delimiters are all where the
+#   generic engine expects them, the trailing ones are not checked
+#   except for the quote closing a quoted variable.
+#
+def formatPattern(delim_list, parser_list):
+    pattern_list = []
+    group_list = []
+    group_cnt = 0
+    d = 0
+
+    for parser in parser_list:
+        pattern_list.append(re.escape(''.join(delim_list[d:parser[3]])))
+        group_list.append(group_cnt)
+        d = parser[3]
+
+        if parser[4]:
+            pattern_list.append(atomicPattern(quoted_pattern % ((parser[4],)
+                * 2), 'g%d' % (group_cnt + 1)) + '(?=%s)' % parser[4])
+            group_cnt += 1
+
+        elif parser[2] == 't':
+            pattern_list.append(atomicPattern(time_pattern,
+                'g%d' % (group_cnt + 1)))
+            group_cnt += 1
+
+        elif directive_field_dict[parser[2]][1] is HTTPLine:
+            pattern_list.append('.'.join(atomicPattern(part_pattern,
+                'g%d' % (group_cnt + j + 1)) for (j, part_pattern)
+                in enumerate(http_line_pattern_list)))
+            group_cnt += 3
+        else:
+            pattern_list.append(atomicPattern(unquoted_pattern,
+                'g%d' % (group_cnt + 1)))
+            group_cnt += 1
+
+    return (''.join(pattern_list), group_list)
+
+
+#
+# @Prototype
+#   Function: splitTokens()
+#   Example:  splitTokens( delim_list, parser_list )
+#
+# @Purpose
+#   This function returns the index of the first space separated token of
+#   each variable when a format can be cut up with split, None otherwise
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   The format must be unquoted variables separated by single spaces with
+#   nothing in front.  %t takes two tokens, the date and the offset.
+#
+def splitTokens(delim_list, parser_list):
+    if not parser_list:
+        return None
+
+    token_list = []
+    token_cnt = 0
+    d = 0
+
+    for parser in parser_list:
+        if parser[4] or directive_field_dict[parser[2]][1] is HTTPLine:
+            return None
+
+        if delim_list[d:parser[3]] != ([' '] if token_list else []):
+            return None
+
+        token_list.append(token_cnt)
+        token_cnt += 2 if parser[2] == 't' else 1
+        d = parser[3]
+
+    return token_list
+
+
+#
+# @Prototype
+#   Function: splitLine()
+#   Example:  splitLine( log_str, 7, [3], ' ', ']', '\n' )
+#
+# @Purpose
+#   This function cuts a str or bytes log line into split_cnt tokens for
+#   the split engine, joining the two halves of each %t, and returns None
+#   when the generic engine would read the line some other way
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       line      : str or bytes log line
+#       split_cnt : Number of tokens of the format
+#       time_list : Index of the first token of each %t
+#       space, bracket, newline : ' ', ']' and '\n' of the type of line
+#   Output:
+#       token_list : List of at least split_cnt tokens, or None
+#
+def splitLine(line, split_cnt, time_list, space, bracket, newline):
+    if line[-1:] == newline:
+        line = line[:-1]
+
+    if newline in line:
+        return None
+
+    token_list = line.split(space, split_cnt)
+
+    if len(token_list) < split_cnt:
+        return None
+
+    for j in time_list:
+        time = token_list[j] + space + token_list[j + 1]
+
+        if time.find(bracket) != len(time) - 1:
+            return None
+
+        token_list[j] = time
+
+    return token_list
+
+
+#
+# @Prototype
+#   Function: matchPlan()
+#   Example:  matchPlan( parser_list, bytes_parser_list, group_list, 'str' )
+#
+# @Purpose
+#   This function returns how Parser.storeValues and storeBytesValues
+#   store the values the split and regex engines cut a line into
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       index_list : Index of the value of each parser_list entry
+#   Output:
+#       plan : List of (kind, index, attribute name, parser_list entry,
+#              bytes_parser_list entry), kind being one of the match_
+#              constants
+#
+def matchPlan(parser_list, bytes_parser_list, index_list, ip_mode):
+    plan = []
+
+    for (parser, bytes_parser, j) in zip(parser_list, bytes_parser_list,
+            index_list):
+        (attr_str, field_type) = directive_field_dict[parser[2]]
+
+        if parser[5] is not None:
+            kind = match_slot
+            attr_str = slot_directive_dict[parser[2]][1]
+
+        elif parser[4]:
+            kind = match_quoted
+
+        elif field_type is HTTPLine:
+            kind = match_http
+
+        elif field_type is datetime:
+            kind = match_time
+
+        elif field_type is int:
+            kind = match_int
+
+        elif ip_mode == 'int' and parser[2] in ip_store_dict:
+            kind = match_ip
+        else:
+            kind = match_str
+
+        plan.append( (kind, j, attr_str, parser, bytes_parser) )
+
+    return plan
+
+
+#
+# @Prototype
+#   Function: logValues()
+#   Example:  logValues( parser.parseRegex, line, get_list )
+#
+# @Purpose
+#   This function returns every field value parse_func gives for a line,
+#   times as ISO strings so their offsets are compared too, or the
+#   exception class when the line fails, for Parser.calibrate
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def logValues(parse_func, line, get_list):
+    try:
+        log = parse_func(line)
+    except (IndexError, KeyError, ValueError) as error:
+        return type(error)
+
+    return [value.isoformat() if type(value) is datetime else value
+        for value in (get_func(log) for get_func in get_list)]
@@ -0,0 +1,3 @@
+from .query import main
+
+main()
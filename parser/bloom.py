@@ -0,0 +1,458 @@
+from base64 import b64decode, b64encode
+from hashlib import blake2b
+from struct import unpack
+import argparse
+import json
+import math
+import os
+import sys
+
+from . import Parser, fieldGetter, readRange
+from .manifest import fingerprint_size, hashRange, identityKey
+
+#
+# @Class
+#   BloomFilter
+#
+# @Initialization Prototype
+#   BloomFilter( bit_cnt, hash_cnt )
+#   BloomFilter.forCapacity( 5000, 0.01 )
+#
+# @Purpose
+#   Set membership test that may answer yes for a value never added, with
+#   a false positive rate set by its size, but never answers no for a
+#   value that was added
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   bit_cnt   : Number of bits
+#   hash_cnt  : Bits set per value
+#   bit_array : bytearray of the bits
+#
+# @Class Methods
+#   forCapacity(item_cnt, fp_rate) : Filter sized for item_cnt values
+#   add(value_bytes)          : Add a value
+#   mayContain(value_bytes)   : False when value_bytes was surely not added
+#   toBytes() / fromBytes()   : Serialization
+#
+# @Notes
+#   The bit positions of a value come from one 128 bit blake2b hash split
+#   in two and combined by double hashing.
+#
+class BloomFilter:
+    def __init__(self, bit_cnt, hash_cnt, bit_array = None):
+        self.bit_cnt = bit_cnt
+        self.hash_cnt = hash_cnt
+        self.bit_array = bit_array or bytearray((bit_cnt + 7) // 8)
+
+    @staticmethod
+    def forCapacity(item_cnt, fp_rate):
+        item_cnt = max(item_cnt, 1)
+        bit_cnt = max(64, int(math.ceil(-item_cnt * math.log(fp_rate)
+            / math.log(2) ** 2)))
+        hash_cnt = max(1, int(round(bit_cnt / item_cnt * math.log(2))))
+
+        return BloomFilter(bit_cnt, hash_cnt)
+
+    def positions(self, value_bytes):
+        (hash_a, hash_b) = unpack('<QQ', blake2b(value_bytes,
+            digest_size = 16).digest())
+
+        return [(hash_a + j * hash_b) % self.bit_cnt
+            for j in range(self.hash_cnt)]
+
+    def add(self, value_bytes):
+        for position in self.positions(value_bytes):
+            self.bit_array[position >> 3] |= 1 << (position & 7)
+
+    def mayContain(self, value_bytes):
+        for position in self.positions(value_bytes):
+            if not self.bit_array[position >> 3] & 1 << (position & 7):
+                return False
+
+        return True
+
+    def toBytes(self):
+        return self.bit_cnt.to_bytes(8, 'little') + bytes((self.hash_cnt,)) \
+            + bytes(self.bit_array)
+
+    @staticmethod
+    def fromBytes(raw_bytes):
+        return BloomFilter(int.from_bytes(raw_bytes[:8], 'little'),
+            raw_bytes[8], bytearray(raw_bytes[9:]))
+
+
+#
+# @Prototype
+#   Function: valueBytes()
+#   Example:  valueBytes( '203.0.113.7' )
+#
+# @Purpose
+#   This function returns the bytes a field value is hashed as
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def valueBytes(value):
+    return str(value).encode('utf-8', 'surrogateescape')
+
+
+#
+# @Class
+#   BloomIndex
+#
+# @Initialization Prototype
+#   BloomIndex( index_path )
+#
+# @Purpose
+#   Index of log files cut into chunks of about chunk_size bytes, holding
+#   for each chunk its time range and a Bloom filter of the values of each
+#   indexed field.  indexFile() builds it while parsing a file, and
+#   search() only reads and parses the chunks whose filters and time
+#   range may match.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   index_path : JSON file holding the index
+#   file_dict  : File path -> { size, identity, head_len, head, tail,
+#                field_list, chunk_list }, each chunk being { offset, end,
+#                line_cnt, min_epoch, max_epoch, filter_dict }
+#   stat_dict  : Counters of the last search, reset by newStats()
+#
+# @Class Methods
+#   indexFile(parser, file_path, field_list, chunk_size, fp_rate,
+#             observer_list) : Generator of the logs of file_path,
+#                              indexing it on the way
+#   candidateRanges(file_path, field_str, value, start_epoch, end_epoch) :
+#                              (offset, end, tested) of the byte ranges of
+#                              file_path that may hold matching lines,
+#                              tested being True for a chunk whose filter
+#                              was asked about the value, no filter is
+#                              used when field_str is None
+#   search(parser, field_str, value, start_epoch, end_epoch) : Generator
+#                              of the logs whose field equals value
+#   newStats()               : Reset the search counters
+#   searchSummary()          : Counters of the last search with its false
+#                              positive rate
+#   save()                   : Write the index atomically
+#
+# @Notes
+#   A file that grew since it was indexed has its new bytes searched in
+#   full.  A file that shrank, has another device and inode, or whose
+#   first bytes or bytes before the indexed size hash differently, was
+#   rotated or rewritten and is searched in full, its index ignored.  The
+#   identity and hashes are those of manifest.Manifest.
+#
+#   Chunks end on the first line boundary at or after chunk_size bytes.
+#   search() reads the ranges a batch of lines at a time, so memory does
+#   not grow with chunk_size.
+#
+class BloomIndex:
+    def __init__(self, index_path):
+        self.index_path = index_path
+        self.file_dict = {}
+        self.stat_dict = {}
+
+        try:
+            with open(index_path) as index_file:
+                self.file_dict = json.load(index_file)
+        except FileNotFoundError:
+            pass
+
+    def indexFile(self, parser, file_path, field_list = ('remote_host_str',),
+            chunk_size = 64 << 20, fp_rate = 0.01, observer_list = None):
+        get_list = [fieldGetter(field_str) for field_str in field_list]
+        chunk_list = []
+
+        chunk_start = 0
+        end_offset = 0
+        line_cnt = 0
+        epoch_list = []
+        value_set_list = [set() for field_str in field_list]
+
+        def closeChunk(end):
+            filter_dict = {}
+
+            for (field_str, value_set) in zip(field_list, value_set_list):
+                bloom = BloomFilter.forCapacity(len(value_set), fp_rate)
+
+                for value in value_set:
+                    bloom.add(valueBytes(value))
+
+                filter_dict[field_str] = b64encode(bloom.toBytes()).decode()
+                value_set.clear()
+
+            chunk_list.append({
+                'offset'      : chunk_start,
+                'end'         : end,
+                'line_cnt'    : line_cnt,
+                'min_epoch'   : min(epoch_list) if epoch_list else None,
+                'max_epoch'   : max(epoch_list) if epoch_list else None,
+                'filter_dict' : filter_dict
+            })
+
+        def addBatch(line_list):
+            log_list = parser.parseBatch(line_list,
+                observer_list = observer_list)
+
+            for log in log_list:
+                if log.time is not None:
+                    epoch_list.append(int(log.time.timestamp()))
+
+                for (get_func, value_set) in zip(get_list, value_set_list):
+                    value = get_func(log)
+
+                    if value is not None:
+                        value_set.add(value)
+
+            # Keep only the range of the times seen so far
+            if epoch_list:
+                epoch_list[:] = [min(epoch_list), max(epoch_list)]
+
+            return log_list
+
+        with open(file_path, 'rb', 1 << 20) as log_file:
+            line_list = []
+
+            for line in log_file:
+                line_list.append(line)
+                end_offset += len(line)
+                line_cnt += 1
+
+                chunk_full = end_offset - chunk_start >= chunk_size
+
+                if len(line_list) >= 4096 or chunk_full:
+                    yield from addBatch(line_list)
+                    line_list = []
+
+                if chunk_full:
+                    closeChunk(end_offset)
+                    chunk_start = end_offset
+                    line_cnt = 0
+                    epoch_list = []
+
+            if line_list:
+                yield from addBatch(line_list)
+
+            if line_cnt:
+                closeChunk(end_offset)
+
+            # Fingerprints of the bytes indexed, from the file just read
+            head_len = min(end_offset, fingerprint_size)
+
+            self.file_dict[file_path] = {
+                'size'       : end_offset,
+                'identity'   : identityKey(os.fstat(log_file.fileno())),
+                'head_len'   : head_len,
+                'head'       : hashRange(log_file, 0, head_len),
+                'tail'       : hashRange(log_file, max(0, end_offset
+                    - fingerprint_size), end_offset),
+                'field_list' : list(field_list),
+                'chunk_list' : chunk_list
+            }
+
+        self.save()
+
+    def save(self):
+        tmp_path = self.index_path + '.tmp'
+
+        with open(tmp_path, 'w') as tmp_file:
+            json.dump(self.file_dict, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        os.replace(tmp_path, self.index_path)
+
+    def newStats(self):
+        self.stat_dict = {
+            'chunk_cnt'          : 0,
+            'tested_cnt'         : 0,
+            'candidate_cnt'      : 0,
+            'false_positive_cnt' : 0,
+            'byte_cnt'           : 0,
+            'skipped_byte_cnt'   : 0
+        }
+
+        return self.stat_dict
+
+    def candidateRanges(self, file_path, field_str, value, start_epoch = None,
+            end_epoch = None):
+        entry = self.file_dict[file_path]
+        stat_dict = self.stat_dict
+
+        if field_str is not None and field_str not in entry['field_list']:
+            raise ValueError('%s is not indexed on %r' % (file_path,
+                field_str))
+
+        with open(file_path, 'rb') as log_file:
+            stat = os.fstat(log_file.fileno())
+            size = stat.st_size
+            end = entry['size']
+
+            same_file = size >= end and entry.get('identity') \
+                == identityKey(stat) and hashRange(log_file, 0,
+                entry['head_len']) == entry['head'] and hashRange(log_file,
+                max(0, end - fingerprint_size), end) == entry['tail']
+
+        stat_dict['byte_cnt'] += size
+
+        # Unindexed or changed bytes are scanned in full
+        if same_file:
+            chunk_list = entry['chunk_list']
+            tail_range = (end, size, False)
+        else:
+            chunk_list = []
+            tail_range = (0, size, False)
+
+        range_list = []
+
+        for chunk in chunk_list:
+            stat_dict['chunk_cnt'] += 1
+            chunk_size = chunk['end'] - chunk['offset']
+
+            if chunk['min_epoch'] is not None and ((start_epoch is not None
+                    and chunk['max_epoch'] < start_epoch) or
+                    (end_epoch is not None
+                    and chunk['min_epoch'] > end_epoch)):
+                stat_dict['skipped_byte_cnt'] += chunk_size
+                continue
+
+            if field_str is not None:
+                bloom = BloomFilter.fromBytes(b64decode(
+                    chunk['filter_dict'][field_str]))
+                stat_dict['tested_cnt'] += 1
+
+                if not bloom.mayContain(valueBytes(value)):
+                    stat_dict['skipped_byte_cnt'] += chunk_size
+                    continue
+
+            stat_dict['candidate_cnt'] += 1
+            range_list.append( (chunk['offset'], chunk['end'],
+                field_str is not None) )
+
+        if tail_range[1] > tail_range[0]:
+            range_list.append(tail_range)
+
+        return range_list
+
+    def search(self, parser, field_str, value, start_epoch = None,
+            end_epoch = None):
+        get_func = fieldGetter(field_str)
+        value_str = str(value)
+        stat_dict = self.newStats()
+
+        for file_path in list(self.file_dict):
+            for (offset, end, tested) in self.candidateRanges(file_path,
+                    field_str, value, start_epoch, end_epoch):
+                value_cnt = 0
+
+                for line_list in readRange(file_path, offset, end, 4096):
+                    for log in parser.parseBatch(line_list):
+                        found = get_func(log)
+
+                        if found is None or str(found) != value_str:
+                            continue
+
+                        value_cnt += 1
+
+                        if log.time is not None and ((start_epoch is not None
+                                and log.time.timestamp() < start_epoch) or
+                                (end_epoch is not None
+                                and log.time.timestamp() > end_epoch)):
+                            continue
+
+                        yield log
+
+                # Only the filter's own answer counts, a chunk holding the
+                # value at other times was a true positive
+                if tested and value_cnt == 0:
+                    stat_dict['false_positive_cnt'] += 1
+
+    def searchSummary(self):
+        stat_dict = dict(self.stat_dict)
+
+        # Chunks the filters were asked about that did not hold the value
+        negative_cnt = stat_dict['tested_cnt'] - stat_dict['candidate_cnt'] \
+            + stat_dict['false_positive_cnt']
+
+        stat_dict['false_positive_rate'] = stat_dict['false_positive_cnt'] \
+            / negative_cnt if negative_cnt else 0.0
+
+        return stat_dict
+
+
+#
+# @Prototype
+#   Function: main()
+#   Example:  python -m parser.bloom build -f FORMAT index.json access.log
+#             python -m parser.bloom lookup -f FORMAT index.json \
+#                 remote_host_str 203.0.113.7
+#
+# @Purpose
+#   Command line tool to build a BloomIndex of log files and to print the
+#   lines matching a value, with the search counters on stderr
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def main(arg_list = None):
+    arg_parser = argparse.ArgumentParser(prog = 'python -m parser.bloom')
+    sub_parser = arg_parser.add_subparsers(dest = 'command', required = True)
+
+    build_parser = sub_parser.add_parser('build', help = 'Index log files')
+    build_parser.add_argument('-f', '--format', required = True)
+    build_parser.add_argument('--field', action = 'append')
+    build_parser.add_argument('--chunk-size', type = int, default = 64 << 20)
+    build_parser.add_argument('--fp-rate', type = float, default = 0.01)
+    build_parser.add_argument('index_path')
+    build_parser.add_argument('file_path', nargs = '+')
+
+    lookup_parser = sub_parser.add_parser('lookup', help = 'Search log files')
+    lookup_parser.add_argument('-f', '--format', required = True)
+    lookup_parser.add_argument('--start', type = int)
+    lookup_parser.add_argument('--end', type = int)
+    lookup_parser.add_argument('index_path')
+    lookup_parser.add_argument('field')
+    lookup_parser.add_argument('value')
+
+    args = arg_parser.parse_args(arg_list)
+    parser = Parser(args.format)
+    index = BloomIndex(args.index_path)
+
+    if args.command == 'build':
+        for file_path in args.file_path:
+            line_cnt = sum(1 for log in index.indexFile(parser, file_path,
+                args.field or ['remote_host_str'], args.chunk_size,
+                args.fp_rate))
+
+            print('%s: %d logs, %d chunks' % (file_path, line_cnt,
+                len(index.file_dict[file_path]['chunk_list'])),
+                file = sys.stderr)
+        return
+
+    get_list = [entry[2] for entry in parser.fieldList()]
+
+    for log in index.search(parser, args.field, args.value, args.start,
+            args.end):
+        print(' '.join('-' if value is None else str(value)
+            for value in (get_func(log) for get_func in get_list)))
+
+    summary_dict = index.searchSummary()
+
+    print('chunks: %d, parsed: %d, false positives: %d (rate %.4f), '
+        'bytes skipped: %d of %d' % (summary_dict['chunk_cnt'],
+        summary_dict['candidate_cnt'], summary_dict['false_positive_cnt'],
+        summary_dict['false_positive_rate'], summary_dict['skipped_byte_cnt'],
+        summary_dict['byte_cnt']), file = sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
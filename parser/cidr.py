@@ -0,0 +1,199 @@
+from bisect import bisect_right
+import ipaddress
+
+from . import fieldGetter, ipv4_mapped_int, isPackedIPv4, packIP
+
+#
+# @Class
+#   CIDRIndex
+#
+# @Initialization Prototype
+#   CIDRIndex( cidr_list )
+#   CIDRIndex( cidr_list, 'remote_ip_int', 'remote_network_str' )
+#
+# @Purpose
+#   Longest prefix match of packed addresses against a set of labelled
+#   networks.  Nested networks are flattened into sorted, non overlapping
+#   intervals once, so a lookup is one bisect, O(log n).
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   field_str       : ApacheLog field holding the address, packed or not
+#   label_attr_str  : ApacheLog attribute observe stores the label into
+#   table_dict      : IP version -> (start_list, end_list, label_list)
+#
+# @Class Methods
+#   lookup(ip)           : Label of the most specific network holding ip,
+#                          or None
+#   lookupMany(ip_list)  : lookup for a whole column of addresses
+#   observe(log)         : Store the label of the log address as the
+#                          label_attr_str field, for Parser observer_list
+#   load(file_path, ...) : Static method building an index from a file
+#
+# @Notes
+#   Input
+#       cidr_list : Iterable of (network string, label) pairs
+#
+#   Addresses may be given as packIP integers or as strings.  IPv4
+#   networks only hold IPv4 addresses, an IPv6 network such as ::/0 never
+#   labels an IPv4 client.
+#
+class CIDRIndex:
+    def __init__(self, cidr_list, field_str = 'remote_ip_str',
+            label_attr_str = 'remote_network_str'):
+        self.field_str = field_str
+        self.label_attr_str = label_attr_str
+        self.get_func = None
+
+        network_dict = { 4 : [], 6 : [] }
+
+        # IPv4 networks are kept in packIP's IPv4 mapped form
+        for (cidr_str, label) in cidr_list:
+            network = ipaddress.ip_network(cidr_str, strict = False)
+            offset = ipv4_mapped_int if network.version == 4 else 0
+            network_dict[network.version].append( (offset
+                + int(network.network_address), offset
+                + int(network.broadcast_address), label) )
+
+        self.table_dict = { version : flattenNetworks(network_list)
+            for (version, network_list) in network_dict.items() }
+
+    def __getstate__(self):
+        state_dict = self.__dict__.copy()
+        state_dict['get_func'] = None
+
+        return state_dict
+
+    def lookup(self, ip):
+        if type(ip) is not int:
+            ip = packIP(ip)
+
+            if ip is None:
+                return None
+
+        (start_list, end_list, label_list) = self.table_dict[
+            4 if isPackedIPv4(ip) else 6]
+
+        j = bisect_right(start_list, ip) - 1
+
+        if j >= 0 and ip <= end_list[j]:
+            return label_list[j]
+
+        return None
+
+    def lookupMany(self, ip_list):
+        # Hot addresses repeat a lot, look each distinct one up once
+        label_dict = {}
+        lookup = self.lookup
+
+        for ip in set(ip_list):
+            label_dict[ip] = None if ip is None else lookup(ip)
+
+        return [label_dict[ip] for ip in ip_list]
+
+    def observe(self, log):
+        if self.get_func is None:
+            self.get_func = fieldGetter(self.field_str)
+
+        ip = self.get_func(log)
+
+        setattr(log, self.label_attr_str, None if ip is None else self.lookup(ip))
+
+    @staticmethod
+    def load(file_path, field_str = 'remote_ip_str',
+            label_attr_str = 'remote_network_str'):
+        return CIDRIndex(readCIDRFile(file_path), field_str, label_attr_str)
+
+
+#
+# @Prototype
+#   Function: flattenNetworks()
+#   Example:  flattenNetworks( network_list )
+#
+# @Purpose
+#   This function turns possibly nested (start, end, label) networks into
+#   sorted, non overlapping intervals where every address keeps the label
+#   of the most specific network holding it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       network_list : List of (start int, end int, label)
+#   Output:
+#       (start_list, end_list, label_list) : Parallel interval lists
+#
+#   Networks are either nested or disjoint so a stack of the open
+#   networks is enough.  A repeated network keeps its last label.
+#
+def flattenNetworks(network_list):
+    start_list = []
+    end_list = []
+    label_list = []
+
+    def emit(start, end, label):
+        if start <= end:
+            start_list.append(start)
+            end_list.append(end)
+            label_list.append(label)
+
+    network_list = sorted(network_list, key = lambda x : (x[0], -x[1]))
+    stack_list = []
+    pos = 0
+
+    for (start, end, label) in network_list + [(None, None, None)]:
+        # Close every open network ending before this one starts
+        while stack_list and (start is None or stack_list[-1][1] < start):
+            (top_start, top_end, top_label) = stack_list.pop()
+            emit(pos, top_end, top_label)
+            pos = top_end + 1
+
+        if start is None:
+            break
+
+        if stack_list:
+            emit(pos, start - 1, stack_list[-1][2])
+
+        stack_list.append( (start, end, label) )
+        pos = start
+
+    return (start_list, end_list, label_list)
+
+
+#
+# @Prototype
+#   Function: readCIDRFile()
+#   Example:  readCIDRFile( 'networks.txt' )
+#
+# @Purpose
+#   This generator reads a CIDR file with one network per line, followed
+#   by an optional label that defaults to the network itself.  Blank lines
+#   and lines starting with # are skipped.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Example file
+#       10.0.0.0/8       internal
+#       10.20.0.0/16     datacenter-2
+#       2001:db8::/32    documentation
+#
+def readCIDRFile(file_path):
+    with open(file_path) as cidr_file:
+        for line in cidr_file:
+            line = line.strip()
+
+            if not line or line.startswith('#'):
+                continue
+
+            part_list = line.split(None, 1)
+
+            yield (part_list[0], part_list[1] if len(part_list) > 1
+                else part_list[0])
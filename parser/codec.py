@@ -0,0 +1,478 @@
+from datetime import datetime, timezone
+import json
+import struct
+
+from . import FixedOffset
+
+#
+# First bytes of a record file
+#
+record_magic = b'ALRC\x02'
+
+#
+# Fixed width encoding of datetime fields, its epoch seconds and its UTC
+# offset in minutes
+#
+time_struct = struct.Struct('<qh')
+
+#
+# UTC offset written for a naive datetime
+#
+naive_offset = -32768
+
+#
+# Name of each field type in the header of a record file
+#
+type_name_dict = {
+    str      : 'str',
+    int      : 'int',
+    datetime : 'datetime'
+}
+
+name_type_dict = dict((name_str, field_type) for (field_type, name_str)
+    in type_name_dict.items())
+
+#
+# @Prototype
+#   Function: encodeVarint()
+#   Example:  encodeVarint( 300 )
+#
+# @Purpose
+#   This function returns the LEB128 encoding of a non negative int
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def encodeVarint(value):
+    if value < 0x80:
+        return bytes((value,))
+
+    byte_list = []
+
+    while value >= 0x80:
+        byte_list.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    byte_list.append(value)
+
+    return bytes(byte_list)
+
+
+#
+# @Prototype
+#   Function: decodeVarint()
+#   Example:  decodeVarint( buf, i )
+#
+# @Purpose
+#   This function reads the varint starting at buf[i] and returns it with
+#   the index just past it.  Raises IndexError if buf ends inside it.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def decodeVarint(buf, i):
+    byte = buf[i]
+
+    if byte < 0x80:
+        return (byte, i + 1)
+
+    value = byte & 0x7F
+    shift = 7
+
+    while True:
+        i += 1
+        byte = buf[i]
+        value |= (byte & 0x7F) << shift
+
+        if byte < 0x80:
+            return (value, i + 1)
+
+        shift += 7
+
+
+#
+# @Prototype
+#   Function: encodeZigzag()
+#   Example:  encodeZigzag( -1 )
+#
+# @Purpose
+#   This function returns the varint of any int, negative ones included,
+#   mapping 0, -1, 1, -2 ... to 0, 1, 2, 3 ...
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def encodeZigzag(value):
+    return encodeVarint(value << 1 if value >= 0 else (-value << 1) - 1)
+
+
+#
+# @Prototype
+#   Function: decodeZigzag()
+#   Example:  decodeZigzag( buf, i )
+#
+# @Purpose
+#   This function reads the int written by encodeZigzag at buf[i] and
+#   returns it with the index just past it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def decodeZigzag(buf, i):
+    (value, i) = decodeVarint(buf, i)
+
+    return (-((value + 1) >> 1) if value & 1 else value >> 1, i)
+
+
+#
+# @Class
+#   RecordCodec
+#
+# @Initialization Prototype
+#   RecordCodec( parser.fieldList() )
+#   RecordCodec( [('remote_host_str', str), ('time', datetime)], 1024 )
+#
+# @Purpose
+#   Compact binary encoding of the fields of ApacheLog objects.  A record
+#   is a presence bitmap followed by the fields that are not None, ints as
+#   zigzag varints, times as epoch seconds and UTC offset, and strings as
+#   a code in a string table that the encoder and decoder build up in the
+#   same order.  Only present fields take any space and ints and times are
+#   skipped without building their values, so decodeFields() only pays for
+#   the fields asked for.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   field_list  : (name, type) or (name, type, getter) of each field
+#   name_list   : Field names
+#   type_list   : Field types, str, int or datetime
+#   bitmap_size : Bytes of the presence bitmap
+#   table_limit : Largest number of strings in the table, strings past it
+#                 are written inline every time
+#   code_dict   : Encoder string -> code
+#   table_list  : Decoder table of raw strings
+#   str_list    : Decoder table of decoded strings, None until needed
+#   tz_dict     : UTC offset in minutes -> tzinfo
+#
+# @Class Methods
+#   encode(log)            : Record bytes of an ApacheLog
+#   decode(buf, i)         : Dict of every field of the record at buf[i:]
+#   decodeFields(buf, i, index_list) : Tuple of the fields at index_list
+#                                      of the record at buf[i:]
+#
+# @Notes
+#   Ints have no size limit, so an IPv6 address of ip_mode 'int' or an
+#   oversized %b round trip like any other value.
+#
+#   String codes are 0 for an inline string, 1 for a string added to the
+#   table and code + 2 for a string already in it.  Records therefore have
+#   to be decoded in the order they were encoded, by one codec each side.
+#
+class RecordCodec:
+    def __init__(self, field_list, table_limit = 65536):
+        self.field_list = field_list
+        self.name_list = [entry[0] for entry in field_list]
+        self.type_list = [entry[1] for entry in field_list]
+        self.bitmap_size = (len(field_list) + 7) // 8
+        self.table_limit = table_limit
+
+        for (name_str, field_type) in zip(self.name_list, self.type_list):
+            if field_type not in type_name_dict:
+                raise ValueError('Field %r of type %r can not be encoded'
+                    % (name_str, field_type))
+
+        self.code_dict = {}
+        self.table_list = []
+        self.str_list = []
+        self.tz_dict = {}
+
+    def encode(self, log):
+        bitmap = 0
+        part_list = []
+
+        for (j, entry) in enumerate(self.field_list):
+            value = entry[2](log)
+
+            if value is None:
+                continue
+
+            bitmap |= 1 << j
+            field_type = entry[1]
+
+            if field_type is str:
+                part_list.append(self.encodeString(value))
+
+            elif field_type is int:
+                part_list.append(encodeZigzag(value))
+
+            else:
+                offset = value.utcoffset()
+
+                if offset is None:
+                    part_list.append(time_struct.pack(int(value.replace(
+                        tzinfo = timezone.utc).timestamp()), naive_offset))
+                else:
+                    part_list.append(time_struct.pack(int(value.timestamp()),
+                        int(offset.total_seconds()) // 60))
+
+        part_list.insert(0, bitmap.to_bytes(self.bitmap_size, 'little'))
+
+        return b''.join(part_list)
+
+    def encodeString(self, value):
+        code = self.code_dict.get(value)
+
+        if code is not None:
+            return encodeVarint(code + 2)
+
+        raw_bytes = value.encode('utf-8', 'surrogateescape')
+
+        if len(self.code_dict) < self.table_limit:
+            self.code_dict[value] = len(self.code_dict)
+            return b'\x01' + encodeVarint(len(raw_bytes)) + raw_bytes
+
+        return b'\x00' + encodeVarint(len(raw_bytes)) + raw_bytes
+
+    def decode(self, buf, i = 0):
+        return dict(zip(self.name_list,
+            self.decodeFields(buf, i, range(len(self.field_list)))))
+
+    def decodeFields(self, buf, i, index_list):
+        want_set = set(index_list)
+        value_list = [None] * len(self.field_list)
+
+        bitmap = int.from_bytes(buf[i : i + self.bitmap_size], 'little')
+        i += self.bitmap_size
+
+        for (j, field_type) in enumerate(self.type_list):
+            if not bitmap >> j & 1:
+                continue
+
+            if field_type is int:
+                if j in want_set:
+                    (value_list[j], i) = decodeZigzag(buf, i)
+                else:
+                    while buf[i] >= 0x80:
+                        i += 1
+
+                    i += 1
+
+            elif field_type is datetime:
+                if j in want_set:
+                    value_list[j] = self.decodeTime(buf, i)
+
+                i += 10
+
+            else:
+                (code, i) = decodeVarint(buf, i)
+
+                if code < 2:
+                    (length, i) = decodeVarint(buf, i)
+                    raw_bytes = buf[i : i + length]
+                    i += length
+
+                    if code == 1:
+                        self.table_list.append(bytes(raw_bytes))
+                        self.str_list.append(None)
+                        code = len(self.table_list) + 1
+
+                    elif j in want_set:
+                        value_list[j] = bytes(raw_bytes).decode('utf-8',
+                            'surrogateescape')
+                        continue
+
+                if j in want_set:
+                    value = self.str_list[code - 2]
+
+                    if value is None:
+                        value = self.table_list[code - 2].decode('utf-8',
+                            'surrogateescape')
+                        self.str_list[code - 2] = value
+
+                    value_list[j] = value
+
+        return tuple(value_list[j] for j in index_list)
+
+    def decodeTime(self, buf, i):
+        (epoch, minutes) = time_struct.unpack_from(buf, i)
+
+        if minutes == naive_offset:
+            return datetime.fromtimestamp(epoch, timezone.utc).replace(
+                tzinfo = None)
+
+        tz = self.tz_dict.get(minutes)
+
+        if tz is None:
+            tz = FixedOffset('%s%02d%02d' % ('-' if minutes < 0 else '+',
+                abs(minutes) // 60, abs(minutes) % 60))
+            self.tz_dict[minutes] = tz
+
+        return datetime.fromtimestamp(epoch, tz)
+
+
+#
+# @Class
+#   RecordWriter
+#
+# @Initialization Prototype
+#   RecordWriter( file_path, parser )
+#
+# @Purpose
+#   Streams ApacheLog objects into a record file, a header naming the
+#   fields of Parser.fieldList() followed by length prefixed RecordCodec
+#   records
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   record_file : Open binary file
+#   codec       : RecordCodec of the fields
+#   record_cnt  : Records written so far
+#
+# @Class Methods
+#   write(log)          : Add one ApacheLog
+#   writeLogs(log_iter) : Add every ApacheLog of an iterable
+#   close()             : Flush and close the file
+#
+# @Notes
+#   Usable as a context manager, closing on exit.
+#
+class RecordWriter:
+    def __init__(self, file_path, parser, table_limit = 65536,
+            buffer_size = 1 << 20):
+        self.codec = RecordCodec(parser.fieldList(), table_limit)
+        self.record_cnt = 0
+
+        header_bytes = json.dumps({
+            'field_list'  : [(name_str, type_name_dict[field_type])
+                for (name_str, field_type) in zip(self.codec.name_list,
+                    self.codec.type_list)],
+            'table_limit' : table_limit
+        }).encode()
+
+        self.record_file = open(file_path, 'wb', buffer_size)
+        self.record_file.write(record_magic + encodeVarint(len(header_bytes))
+            + header_bytes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, log):
+        record_bytes = self.codec.encode(log)
+
+        self.record_file.write(encodeVarint(len(record_bytes)) + record_bytes)
+        self.record_cnt += 1
+
+    def writeLogs(self, log_iter):
+        for log in log_iter:
+            self.write(log)
+
+    def close(self):
+        if self.record_file is None:
+            return
+
+        self.record_file.close()
+        self.record_file = None
+
+
+#
+# @Prototype
+#   Function: readRecords()
+#   Example:  readRecords( 'logs.rec' )
+#             readRecords( 'logs.rec', ['time', 'remote_host_str'] )
+#
+# @Purpose
+#   This generator streams the records of a file written by RecordWriter,
+#   as dicts of every field or as tuples of the named fields only
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       file_path  : Record file
+#       name_list  : Field names to decode, all of them as a dict if None
+#       chunk_size : Bytes read at a time
+#   Output:
+#       Generator of dicts or tuples, one per record
+#
+#   Raises ValueError for a file that is not a record file, names a field
+#   it does not have or ends in the middle of a record.
+#
+def readRecords(file_path, name_list = None, chunk_size = 1 << 20):
+    with open(file_path, 'rb') as record_file:
+        buf = record_file.read(max(chunk_size, 4096))
+
+        if not buf.startswith(record_magic):
+            raise ValueError('%s is not a record file' % file_path)
+
+        (length, i) = decodeVarint(buf, len(record_magic))
+
+        while len(buf) < i + length:
+            chunk = record_file.read(chunk_size)
+
+            if not chunk:
+                raise ValueError('%s ends inside its header' % file_path)
+
+            buf += chunk
+
+        header_dict = json.loads(buf[i : i + length])
+        i += length
+
+        codec = RecordCodec([(name_str, name_type_dict[type_str])
+            for (name_str, type_str) in header_dict['field_list']],
+            header_dict['table_limit'])
+
+        if name_list is None:
+            decode_func = codec.decode
+        else:
+            for name_str in name_list:
+                if name_str not in codec.name_list:
+                    raise ValueError('%s has no field %r' % (file_path,
+                        name_str))
+
+            index_list = [codec.name_list.index(name_str)
+                for name_str in name_list]
+
+            def decode_func(buf, i):
+                return codec.decodeFields(buf, i, index_list)
+
+        while True:
+            view = memoryview(buf)
+            end = len(buf)
+
+            while i < end:
+                try:
+                    (length, j) = decodeVarint(buf, i)
+                except IndexError:
+                    break
+
+                if j + length > end:
+                    break
+
+                yield decode_func(view, j)
+                i = j + length
+
+            chunk = record_file.read(chunk_size)
+
+            if not chunk:
+                if i < end:
+                    raise ValueError('%s ends inside a record' % file_path)
+
+                return
+
+            buf = buf[i:] + chunk
+            i = 0
@@ -0,0 +1,244 @@
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from time import perf_counter
+import os
+import sys
+
+#
+# @Prototype
+#   Function: gilDisabled()
+#   Example:  gilDisabled()
+#
+# @Purpose
+#   This function returns True when running on a free-threaded CPython
+#   build with the GIL actually disabled
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def gilDisabled():
+    is_gil_enabled = getattr(sys, '_is_gil_enabled', None)
+
+    return is_gil_enabled is not None and not is_gil_enabled()
+
+
+#
+# @Prototype
+#   Function: pickBackend()
+#   Example:  pickBackend( 'auto' )
+#
+# @Purpose
+#   This function resolves the 'auto' backend, threads when the GIL is
+#   disabled and processes otherwise
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def pickBackend(backend_str):
+    if backend_str == 'auto':
+        return 'thread' if gilDisabled() else 'process'
+
+    if backend_str not in ('thread', 'process', 'serial'):
+        raise ValueError("backend must be 'auto', 'thread', 'process' or "
+            "'serial', got %r" % backend_str)
+
+    return backend_str
+
+
+#
+# Batch function of a process pool worker, installed once by initWorker
+# so it is not pickled with every batch
+#
+worker_func = None
+
+def initWorker(batch_func):
+    global worker_func
+
+    worker_func = batch_func
+
+def runWorkerBatch(batch):
+    return worker_func(batch)
+
+
+#
+# @Prototype
+#   Function: mapBatches()
+#   Example:  mapBatches( parser.parseBatch, batch_iter )
+#             mapBatches( batch_func, batch_iter, 'process', 8, metrics )
+#
+# @Purpose
+#   This generator calls batch_func on every batch of batch_iter on a pool
+#   of workers and yields (batch, result, seconds) in input order, seconds
+#   being the time from submitting the batch to its result being collected
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       batch_func  : Function of a batch, picklable for the process backend
+#       batch_iter  : Iterable of batches
+#       backend_str : 'auto', 'thread', 'process' or 'serial'
+#       worker_cnt  : Pool size, the number of CPUs by default
+#       metrics     : Optional ParserMetrics, the lines of every batch
+#                     submitted count in its queue depth until the
+#                     consumer is done with the batch
+#   Output:
+#       Generator of (batch, result, seconds) tuples
+#
+#   At most two batches per worker are in flight so memory stays bounded
+#   however long batch_iter is.
+#
+def mapBatches(batch_func, batch_iter, backend_str = 'auto', worker_cnt = None,
+        metrics = None):
+    backend_str = pickBackend(backend_str)
+
+    if backend_str == 'serial':
+        for batch in batch_iter:
+            if metrics is not None:
+                metrics.addQueueDepth(len(batch))
+
+            try:
+                start = perf_counter()
+                result = batch_func(batch)
+                yield (batch, result, perf_counter() - start)
+            finally:
+                if metrics is not None:
+                    metrics.addQueueDepth(-len(batch))
+        return
+
+    worker_cnt = worker_cnt or os.cpu_count() or 1
+
+    if backend_str == 'thread':
+        pool = ThreadPoolExecutor(worker_cnt)
+        submit_func = batch_func
+    else:
+        pool = ProcessPoolExecutor(worker_cnt, initializer = initWorker,
+            initargs = (batch_func,))
+        submit_func = runWorkerBatch
+
+    pending_deque = deque()
+
+    try:
+        for batch in batch_iter:
+            if metrics is not None:
+                metrics.addQueueDepth(len(batch))
+
+            pending_deque.append( (batch, pool.submit(submit_func, batch),
+                perf_counter()) )
+
+            if len(pending_deque) >= 2 * worker_cnt:
+                yield from handOnBatch(pending_deque, metrics)
+
+        while pending_deque:
+            yield from handOnBatch(pending_deque, metrics)
+    finally:
+        pool.shutdown(cancel_futures = True)
+
+        if metrics is not None:
+            metrics.addQueueDepth(-sum(len(entry[0])
+                for entry in pending_deque))
+
+
+#
+# @Prototype
+#   Function: handOnBatch()
+#   Example:  yield from handOnBatch( pending_deque, metrics )
+#
+# @Purpose
+#   This generator waits for the oldest batch of pending_deque, yields its
+#   (batch, result, seconds) and takes its lines off the queue depth of
+#   metrics once the consumer is done with it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def handOnBatch(pending_deque, metrics):
+    (batch, future, start) = pending_deque[0]
+    result = future.result()
+    pending_deque.popleft()
+
+    try:
+        yield (batch, result, perf_counter() - start)
+    finally:
+        if metrics is not None:
+            metrics.addQueueDepth(-len(batch))
+
+
+#
+# @Prototype
+#   Function: batchLines()
+#   Example:  batchLines( line_iter, 4096 )
+#
+# @Purpose
+#   This generator groups the lines of line_iter into lists of at most
+#   batch_size lines
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def batchLines(line_iter, batch_size):
+    line_list = []
+
+    for line in line_iter:
+        line_list.append(line)
+
+        if len(line_list) >= batch_size:
+            yield line_list
+            line_list = []
+
+    if line_list:
+        yield line_list
+
+
+#
+# @Prototype
+#   Function: parseParallel()
+#   Example:  parseParallel( parser, line_iter )
+#             parseParallel( parser, line_iter, 'thread', 8, 4096, metrics )
+#
+# @Purpose
+#   This generator parses the lines of line_iter in batches on a pool of
+#   workers and yields the ApacheLog objects in input order.  The thread
+#   backend shares the given Parser between its threads and only pays
+#   off on free-threaded builds, the process backend gets a copy of the
+#   Parser in each worker and pickles the results back.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       parser        : Parser to use
+#       line_iter     : Iterable of str or bytes lines
+#       backend_str   : 'auto', 'thread', 'process' or 'serial'
+#       worker_cnt    : Pool size, the number of CPUs by default
+#       batch_size    : Lines per task
+#       metrics       : Optional ParserMetrics
+#       observer_list : Observers, called in the calling thread so they
+#                       need no locking of their own
+#   Output:
+#       Generator of ApacheLog objects, lines that fail to parse are
+#       skipped and counted like Parser.parseBatch does
+#
+def parseParallel(parser, line_iter, backend_str = 'auto', worker_cnt = None,
+        batch_size = 4096, metrics = None, observer_list = None):
+    for (line_list, log_list, seconds) in mapBatches(parser.parseBatch,
+            batchLines(line_iter, batch_size), backend_str, worker_cnt,
+            metrics):
+        if metrics is not None:
+            metrics.recordBatch(len(log_list), len(line_list) - len(log_list),
+                seconds)
+
+        if observer_list:
+            for observer in observer_list:
+                for log in log_list:
+                    observer.observe(log)
+
+        yield from log_list
@@ -0,0 +1,331 @@
+from datetime import datetime
+from json.encoder import encode_basestring_ascii
+import csv
+import sys
+
+#
+# @Prototype
+#   Function: openOutput()
+#   Example:  openOutput( 'out.jsonl' )
+#             openOutput( '-' )
+#
+# @Purpose
+#   This function opens a text file for writing, '-' being standard
+#   output.  Undecodable bytes kept as surrogates by the parser are written
+#   back as the original bytes.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def openOutput(file_path, newline_str = None, buffer_size = 1 << 20):
+    if file_path == '-':
+        return sys.stdout
+
+    return open(file_path, 'w', buffer_size, encoding = 'utf-8',
+        errors = 'surrogateescape', newline = newline_str)
+
+
+#
+# @Class
+#   TimeCache
+#
+# @Initialization Prototype
+#   TimeCache()
+#   TimeCache( 4096 )
+#
+# @Purpose
+#   ISO 8601 formatting of log times, cached per datetime object.  The
+#   parser hands every line of the same second the same datetime object,
+#   so this formats each second once.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   cache_size : Entries kept before the cache is emptied
+#   cache_dict : id of a datetime -> (datetime, ISO string)
+#
+# @Class Methods
+#   format(value) : ISO string of a datetime
+#
+# @Notes
+#   Keyed on identity, hashing an aware datetime costs more than
+#   isoformat() itself.  The cache holds on to the datetime so its id
+#   can't be reused while cached.
+#
+class TimeCache:
+    def __init__(self, cache_size = 4096):
+        self.cache_size = cache_size
+        self.cache_dict = {}
+
+    def format(self, value):
+        entry = self.cache_dict.get(id(value))
+
+        if entry is not None and entry[0] is value:
+            return entry[1]
+
+        if len(self.cache_dict) >= self.cache_size:
+            self.cache_dict.clear()
+
+        time_str = value.isoformat()
+        self.cache_dict[id(value)] = (value, time_str)
+
+        return time_str
+
+
+#
+# @Class
+#   JSONLSink
+#
+# @Initialization Prototype
+#   JSONLSink( file_path, parser )
+#   JSONLSink( file_path, None, field_list = [(name, type, getter), ...] )
+#
+# @Purpose
+#   Writes ApacheLog objects as JSON lines, one object per log keyed by the
+#   names of Parser.fieldList(), times in ISO 8601.  The key of every field
+#   is encoded once up front and lines are gathered in a buffer written
+#   out in large blocks.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   out_file    : Open text file
+#   field_list  : Parser.fieldList() of the format, or the given
+#                 (name, type, getter) list
+#   prefix_list : '{"name":' or ',"name":' of each field
+#   time_cache  : TimeCache of the time fields
+#   part_list   : Buffered output
+#   part_size   : Characters in part_list
+#   buffer_size : Characters buffered before writing
+#   row_cnt     : Logs written so far
+#
+# @Class Methods
+#   write(log)          : Add one ApacheLog
+#   writeLogs(log_iter) : Add every ApacheLog of an iterable
+#   writeColumns(column_list) : Add the rows of a columnar batch, one list
+#                               of values per field of fieldList()
+#   flush()             : Write out the buffer
+#   close()             : Flush and close the file
+#
+# @Notes
+#   Usable as a context manager, closing on exit.
+#
+class JSONLSink:
+    def __init__(self, file_path, parser, buffer_size = 1 << 20,
+            field_list = None):
+        self.out_file = openOutput(file_path)
+        self.field_list = field_list or parser.fieldList()
+        self.time_cache = TimeCache()
+        self.part_list = []
+        self.part_size = 0
+        self.buffer_size = buffer_size
+        self.row_cnt = 0
+
+        self.prefix_list = [('{' if j == 0 else ',')
+            + encode_basestring_ascii(entry[0]) + ':'
+            for (j, entry) in enumerate(self.field_list)]
+
+        # Value encoder of each field
+        self.encode_list = [self.encodeTime if entry[1] is datetime
+            else encode_basestring_ascii if entry[1] is str else str
+            for entry in self.field_list]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def encodeTime(self, value):
+        return '"' + self.time_cache.format(value) + '"'
+
+    def write(self, log):
+        line_list = []
+
+        for (prefix_str, entry, encode_func) in zip(self.prefix_list,
+                self.field_list, self.encode_list):
+            value = entry[2](log)
+
+            line_list.append(prefix_str)
+            line_list.append('null' if value is None else encode_func(value))
+
+        line_list.append('}\n')
+        self.append(''.join(line_list))
+        self.row_cnt += 1
+
+    def writeLogs(self, log_iter):
+        for log in log_iter:
+            self.write(log)
+
+    def writeColumns(self, column_list):
+        encoded_list = []
+
+        for (prefix_str, column, encode_func) in zip(self.prefix_list,
+                column_list, self.encode_list):
+            encoded_list.append([prefix_str + ('null' if value is None
+                else encode_func(value)) for value in column])
+
+        for part_tuple in zip(*encoded_list):
+            self.append(''.join(part_tuple) + '}\n')
+
+        if column_list:
+            self.row_cnt += len(column_list[0])
+
+    def append(self, line_str):
+        self.part_list.append(line_str)
+        self.part_size += len(line_str)
+
+        if self.part_size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.out_file.write(''.join(self.part_list))
+        self.part_list = []
+        self.part_size = 0
+
+    def close(self):
+        if self.out_file is None:
+            return
+
+        self.flush()
+
+        if self.out_file is sys.stdout:
+            self.out_file.flush()
+        else:
+            self.out_file.close()
+
+        self.out_file = None
+
+
+#
+# @Class
+#   CSVSink
+#
+# @Initialization Prototype
+#   CSVSink( file_path, parser )
+#   CSVSink( file_path, None, field_list = [(name, type, getter), ...] )
+#
+# @Purpose
+#   Writes ApacheLog objects as CSV rows under a header of the names of
+#   Parser.fieldList(), None as an empty cell and times in ISO 8601.  Rows
+#   are gathered and handed to the csv writer in large batches.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   out_file    : Open text file
+#   writer      : csv writer of out_file
+#   field_list  : Parser.fieldList() of the format, or the given
+#                 (name, type, getter) list
+#   get_list    : Getter of each field
+#   time_index_list : Positions of the time fields
+#   time_cache  : TimeCache of the time fields
+#   row_list    : Buffered rows
+#   batch_size  : Rows buffered before writing
+#   row_cnt     : Logs written so far
+#
+# @Class Methods
+#   write(log)          : Add one ApacheLog
+#   writeLogs(log_iter) : Add every ApacheLog of an iterable
+#   writeColumns(column_list) : Add the rows of a columnar batch, one list
+#                               of values per field of fieldList()
+#   flush()             : Write out the buffered rows
+#   close()             : Flush and close the file
+#
+# @Notes
+#   Usable as a context manager, closing on exit.
+#
+class CSVSink:
+    def __init__(self, file_path, parser, batch_size = 8192,
+            field_list = None):
+        self.out_file = openOutput(file_path, '')
+        self.writer = csv.writer(self.out_file)
+        self.field_list = field_list or parser.fieldList()
+        self.get_list = [entry[2] for entry in self.field_list]
+        self.time_index_list = [j for (j, entry) in enumerate(self.field_list)
+            if entry[1] is datetime]
+        self.time_cache = TimeCache()
+        self.row_list = []
+        self.batch_size = batch_size
+        self.row_cnt = 0
+
+        self.writer.writerow([entry[0] for entry in self.field_list])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, log):
+        # The csv writer itself writes None as an empty cell
+        row = [get_func(log) for get_func in self.get_list]
+
+        for j in self.time_index_list:
+            if row[j] is not None:
+                row[j] = self.time_cache.format(row[j])
+
+        self.row_list.append(row)
+        self.row_cnt += 1
+
+        if len(self.row_list) >= self.batch_size:
+            self.flush()
+
+    def writeLogs(self, log_iter):
+        for log in log_iter:
+            self.write(log)
+
+    def writeColumns(self, column_list):
+        column_list = list(column_list)
+        format_func = self.time_cache.format
+
+        for j in self.time_index_list:
+            column_list[j] = [None if value is None else format_func(value)
+                for value in column_list[j]]
+
+        self.flush()
+        self.writer.writerows(zip(*column_list))
+
+        if column_list:
+            self.row_cnt += len(column_list[0])
+
+    def flush(self):
+        self.writer.writerows(self.row_list)
+        self.row_list = []
+
+    def close(self):
+        if self.out_file is None:
+            return
+
+        self.flush()
+
+        if self.out_file is sys.stdout:
+            self.out_file.flush()
+        else:
+            self.out_file.close()
+
+        self.out_file = None
+
+
+#
+# @Prototype
+#   Function: columnBatch()
+#   Example:  columnBatch( log_list, parser.fieldList() )
+#
+# @Purpose
+#   This function turns a list of ApacheLog objects into a columnar batch,
+#   one list of values per field of field_list
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def columnBatch(log_list, field_list):
+    return [list(map(entry[2], log_list)) for entry in field_list]
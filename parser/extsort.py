@@ -0,0 +1,418 @@
+from datetime import datetime, timezone
+from functools import lru_cache
+from heapq import merge
+from operator import itemgetter
+import os
+import re
+import struct
+import tempfile
+
+from . import atomicPattern, formatPattern, month_bytes_dict, \
+    readLogBatches, time_cache_size, time_pattern
+
+#
+# Apache %t time of a raw log line
+#
+time_key_re = re.compile(rb'\[\d\d/[A-Z][a-z]{2}/\d{4}:\d\d:\d\d:\d\d [+-]\d{4}\]')
+
+#
+# Epoch units of %{sec}t, %{msec}t and %{usec}t, divisor to seconds
+#
+epoch_unit_dict = { 'sec' : 1, 'msec' : 1000, 'usec' : 1000000 }
+
+#
+# Key given to lines without a time, they sort after every other line
+#
+no_time_key = 2 ** 63 - 1
+
+#
+# Each line of a run file is preceded by its key
+#
+key_struct = struct.Struct('>q')
+
+#
+# Estimated bytes of memory per buffered line on top of the line itself
+#
+line_overhead = 120
+
+#
+# @Prototype
+#   Function: epochSeconds()
+#   Example:  epochSeconds( b'[10/Oct/2000:13:55:36 -0700]' )
+#
+# @Purpose
+#   This function returns the epoch seconds of an Apache time string with
+#   integer arithmetic only, no datetime is built
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Uses the days from civil algorithm, valid for any proleptic Gregorian
+#   date.  Indexes follow storeTime.
+#
+@lru_cache(maxsize = time_cache_size)
+def epochSeconds(time_bytes):
+    year = int(time_bytes[8:12])
+    month = month_bytes_dict[time_bytes[4:7]]
+    day = int(time_bytes[1:3])
+
+    year -= month <= 2
+    era = year // 400
+    year_of_era = year - era * 400
+    day_of_year = (153 * (month + (-3 if month > 2 else 9)) + 2) // 5 + day - 1
+    day_of_era = year_of_era * 365 + year_of_era // 4 - year_of_era // 100 \
+        + day_of_year
+    days = era * 146097 + day_of_era - 719468
+
+    offset = int(time_bytes[23:25]) * 3600 + int(time_bytes[25:27]) * 60
+
+    if time_bytes[22:23] == b'-':
+        offset = -offset
+
+    return days * 86400 + int(time_bytes[13:15]) * 3600 \
+        + int(time_bytes[16:18]) * 60 + int(time_bytes[19:21]) - offset
+
+
+#
+# @Prototype
+#   Function: strftimeSeconds()
+#   Example:  strftimeSeconds( b'2000-10-10 13:55:36', '%Y-%m-%d %H:%M:%S',
+#                 'utf-8' )
+#
+# @Purpose
+#   This function returns the epoch seconds of a %{format}t time, a time
+#   without a UTC offset being taken as UTC
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+@lru_cache(maxsize = time_cache_size)
+def strftimeSeconds(time_bytes, format_str, encoding):
+    time = datetime.strptime(time_bytes.decode(encoding), format_str)
+
+    if time.tzinfo is None:
+        time = time.replace(tzinfo = timezone.utc)
+
+    return int(time.timestamp())
+
+
+#
+# @Prototype
+#   Function: lineTimeKey()
+#   Example:  lineTimeKey( line_bytes )
+#
+# @Purpose
+#   This function returns the sort key of a raw log line of unknown
+#   format, the epoch seconds of the first Apache time anywhere in it or
+#   no_time_key when it has none.  Use a TimeKey of the Parser when the
+#   format is known.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def lineTimeKey(line_bytes):
+    match = time_key_re.search(line_bytes)
+
+    if match is None:
+        return no_time_key
+
+    return epochSeconds(match.group())
+
+
+#
+# @Class
+#   TimeKey
+#
+# @Initialization Prototype
+#   TimeKey( parser )
+#
+# @Purpose
+#   Sort key of the raw log lines of a Parser or MultiParser, the epoch
+#   seconds of the %t of the format.  Only the variables up to the %t are
+#   matched, with the patterns of the regex engine, and the time is read
+#   the way storeTime reads it without building a datetime.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   plan_list : (regex, group, unit, format_str, encoding) of each format
+#               with a %t.  unit is None for the Apache time in brackets,
+#               the divisor of an epoch for %{sec}t, %{msec}t and
+#               %{usec}t and 0 for a strftime %{format}t
+#
+# @Class Methods
+#   __call__(line_bytes) : Epoch seconds of the line, no_time_key for a
+#                          line that matches no format or whose time
+#                          can't be read
+#
+# @Notes
+#   begin: and end: prefixes are ignored, the time logged is what is
+#   sorted on.  A strftime %{format}t is matched as its literal text with
+#   a run of text without spaces for each conversion, up to the text
+#   following it in the format.  Raises ValueError for a parser with no %t giving
+#   seconds, %{msec_frac}t and %{usec_frac}t alone don't.
+#
+class TimeKey:
+    def __init__(self, parser):
+        self.plan_list = []
+
+        for format_parser in getattr(parser, 'format_parser_list', [parser]):
+            plan = timePlan(format_parser)
+
+            if plan is not None:
+                self.plan_list.append(plan)
+
+        if not self.plan_list:
+            raise ValueError('The format has no %t to read times from')
+
+    def __call__(self, line_bytes):
+        for (time_re, group, unit, format_str, encoding) in self.plan_list:
+            match = time_re.match(line_bytes)
+
+            if match is None:
+                continue
+
+            time_bytes = match.group(group)
+
+            try:
+                if unit is None:
+                    return epochSeconds(time_bytes)
+
+                if unit:
+                    return int(time_bytes) // unit
+
+                return strftimeSeconds(time_bytes, format_str, encoding)
+            except (IndexError, KeyError, ValueError):
+                continue
+
+        return no_time_key
+
+
+#
+# @Prototype
+#   Function: timePlan()
+#   Example:  timePlan( parser )
+#
+# @Purpose
+#   This function returns the TimeKey plan of the first %t of a Parser,
+#   None when it has none giving seconds
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def timePlan(parser):
+    for (k, entry) in enumerate(parser.parser_list):
+        if entry[2] == 't':
+            break
+    else:
+        return None
+
+    format_str = entry[1]
+
+    for prefix_str in ('begin:', 'end:'):
+        if format_str.startswith(prefix_str):
+            format_str = format_str[len(prefix_str):]
+
+    if format_str.endswith('_frac'):
+        return None
+
+    d = parser.parser_list[k - 1][3] if k else 0
+    pattern_str = formatPattern(parser.delim_list, parser.parser_list[:k])[0] \
+        + re.escape(''.join(parser.delim_list[d:entry[3]]))
+    group = re.compile(pattern_str).groups + 1
+
+    if not format_str:
+        (pattern_str, unit) = (pattern_str + atomicPattern(time_pattern,
+            'g%d' % group), None)
+
+    elif format_str in epoch_unit_dict:
+        (pattern_str, unit) = (pattern_str + r'(\d+)',
+            epoch_unit_dict[format_str])
+    else:
+        next_d = parser.parser_list[k + 1][3] \
+            if k + 1 < len(parser.parser_list) else len(parser.delim_list)
+        follow_str = ''.join(parser.delim_list[entry[3]:next_d])
+
+        # Each conversion is some text without spaces
+        strftime_str = ''.join(r'[^ \n]+?' if len(part_str) == 2
+            and part_str[0] == '%' and part_str != '%%' else re.escape(
+            part_str.replace('%%', '%')) for part_str in
+            re.split(r'(%.)', format_str) if part_str)
+
+        (pattern_str, unit) = (pattern_str + '(%s)(?=%s)' % (strftime_str,
+            re.escape(follow_str) if follow_str else r'\n|\Z'), 0)
+
+    return (re.compile(pattern_str.encode(parser.encoding), re.S), group,
+        unit, format_str, parser.encoding)
+
+
+#
+# @Prototype
+#   Function: writeRun()
+#   Example:  writeRun( run_iter, temp_dir )
+#
+# @Purpose
+#   This function writes (key, line) pairs to a new temporary run file and
+#   returns its path
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def writeRun(run_iter, temp_dir):
+    (fd, run_path) = tempfile.mkstemp(prefix = 'logsort-', suffix = '.run',
+        dir = temp_dir)
+
+    with open(fd, 'wb', 1 << 20) as run_file:
+        for (key, line) in run_iter:
+            run_file.write(key_struct.pack(key))
+            run_file.write(line)
+
+    return run_path
+
+
+#
+# @Prototype
+#   Function: readRun()
+#   Example:  readRun( run_path )
+#
+# @Purpose
+#   This generator yields the (key, line) pairs of a run file
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def readRun(run_path):
+    with open(run_path, 'rb', 1 << 20) as run_file:
+        while True:
+            key_bytes = run_file.read(8)
+
+            if not key_bytes:
+                return
+
+            yield (key_struct.unpack(key_bytes)[0], run_file.readline())
+
+
+#
+# @Prototype
+#   Function: sortLines()
+#   Example:  sortLines( line_iter )
+#             sortLines( line_iter, 1 << 30, '/var/tmp', 32 )
+#
+# @Purpose
+#   This generator yields the raw log lines of line_iter in time order,
+#   whatever their number.  Lines are gathered into runs that fit
+#   memory_budget, each run is sorted on its epoch key and spilled to a
+#   temporary file, and the runs are merged back with a k-way merge.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       line_iter     : Iterable of bytes lines
+#       memory_budget : Approximate bytes of lines held in memory at once
+#       temp_dir      : Directory of the run files, the system default if
+#                       None
+#       fan_in        : Most runs merged at once, more runs are first
+#                       merged into longer runs to bound the open files
+#       key_func      : Sort key of a line, lineTimeKey by default, a
+#                       TimeKey for lines of a known format
+#   Output:
+#       Generator of bytes lines, each ending with a newline
+#
+#   The sort is stable, lines of the same second keep their input order.
+#   Lines without a time come last.  Input that fits in one run is never
+#   written to disk.
+#
+def sortLines(line_iter, memory_budget = 256 << 20, temp_dir = None,
+        fan_in = 64, key_func = lineTimeKey):
+    run_path_list = []
+
+    try:
+        run_list = []
+        run_size = 0
+
+        for line in line_iter:
+            if not line.endswith(b'\n'):
+                line += b'\n'
+
+            run_list.append( (key_func(line), line) )
+            run_size += len(line) + line_overhead
+
+            if run_size >= memory_budget:
+                run_list.sort(key = itemgetter(0))
+                run_path_list.append(writeRun(run_list, temp_dir))
+                run_list = []
+                run_size = 0
+
+        run_list.sort(key = itemgetter(0))
+
+        if not run_path_list:
+            for (key, line) in run_list:
+                yield line
+            return
+
+        if run_list:
+            run_path_list.append(writeRun(run_list, temp_dir))
+            run_list = []
+
+        # Merge the oldest runs first so equal keys keep their input order
+        while len(run_path_list) > fan_in:
+            merge_list = run_path_list[:fan_in]
+            run_path = writeRun(merge(*map(readRun, merge_list),
+                key = itemgetter(0)), temp_dir)
+
+            for merged_path in merge_list:
+                os.remove(merged_path)
+
+            run_path_list[:fan_in] = [run_path]
+
+        for (key, line) in merge(*map(readRun, run_path_list),
+                key = itemgetter(0)):
+            yield line
+    finally:
+        for run_path in run_path_list:
+            if os.path.exists(run_path):
+                os.remove(run_path)
+
+
+#
+# @Prototype
+#   Function: sortFiles()
+#   Example:  sortFiles( ['lb1.log', 'lb2.log'], 'sorted.log' )
+#
+# @Purpose
+#   This function writes the lines of every file of path_list to out_path
+#   in time order and returns the number of lines written.  Lines are
+#   sorted on the %t of parser when one is given, see TimeKey.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def sortFiles(path_list, out_path, memory_budget = 256 << 20, temp_dir = None,
+        fan_in = 64, parser = None):
+    def readLines():
+        for file_path in path_list:
+            for line_list in readLogBatches(file_path, batch_size = 8192):
+                yield from line_list
+
+    line_cnt = 0
+
+    with open(out_path, 'wb', 1 << 20) as out_file:
+        for line in sortLines(readLines(), memory_budget, temp_dir, fan_in,
+                lineTimeKey if parser is None else TimeKey(parser)):
+            out_file.write(line)
+            line_cnt += 1
+
+    return line_cnt
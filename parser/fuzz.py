@@ -0,0 +1,1003 @@
+import argparse
+from datetime import datetime
+import json
+import random
+import string
+import sys
+from time import perf_counter
+
+from . import (FixedOffset, HTTPLine, Parser, directive_field_dict,
+    format_dict, month_dict, parse_func_dict, slot_directive_dict)
+
+#
+# Parsing engines checked against each other, name -> (encoding, ip_mode,
+# type of the line handed to Parser.parse, Parser engine).  The reference
+# is the one the others must match field for field, engines that can't
+# parse a format are skipped for it.
+#
+engine_dict = {
+    'generic'         : ('utf-8', 'str', str, 'generic'),
+    'split'           : ('utf-8', 'str', str, 'split'),
+    'regex'           : ('utf-8', 'str', str, 'regex'),
+    'bytes-generic'   : ('utf-8', 'str', bytes, 'generic'),
+    'bytes-split'     : ('utf-8', 'str', bytes, 'split'),
+    'bytes-regex'     : ('utf-8', 'str', bytes, 'regex'),
+    'latin-1'         : ('latin-1', 'str', bytes, 'auto'),
+    'ip-int-generic'  : ('utf-8', 'int', str, 'generic'),
+    'ip-int'          : ('utf-8', 'int', str, 'auto'),
+    'bytes-ip-int'    : ('utf-8', 'int', bytes, 'auto')
+}
+
+reference_engine = 'generic'
+
+#
+# Formats benchmarked, the stock ones and one the split engine takes
+#
+bench_format_dict = dict(format_dict, unquoted = '%h %l %u %t %>s %b %D')
+
+#
+# Characters of random unquoted values, never a space or a newline since
+# those end an unquoted variable.  The CJK character can't be encoded in
+# latin-1 so lines holding it skip the latin-1 engine.
+#
+token_chr_str = string.ascii_letters + string.digits + \
+    '-._~/?=&%+!*();:@,$[]"\'' + '\xe9\xfc\xdf日'
+
+#
+# Quoted values may hold anything, they are escaped when rendered
+#
+quoted_chr_str = token_chr_str + ' \\\t\n\x01'
+
+#
+# Characters separating the variables of random formats
+#
+sep_chr_str = ' -:|,/@%\\\t\v\f\a\b\r'
+
+#
+# Inverse of getEscDelim for the control characters it knows
+#
+esc_letter_dict = { '\t' : 't', '\v' : 'v', '\a' : 'a', '\b' : 'b',
+    '\f' : 'f', '\r' : 'r' }
+
+#
+# Escapes Apache writes into quoted values, \xhh is used for any other
+# control character
+#
+quoted_esc_dict = { '"' : '\\"', "'" : "\\'", '\\' : '\\\\', '\n' : '\\n',
+    '\t' : '\\t' }
+
+#
+# Format bracket strings of the directives taking one that are not slots
+#
+bracket_dict = {
+    'a' : ['c'],
+    'h' : ['c'],
+    'p' : ['canonical', 'local', 'remote'],
+    'P' : ['pid', 'tid', 'hextid'],
+    'T' : ['s', 'ms', 'us']
+}
+
+slot_name_list = ['Referer', 'User-Agent', 'X-Forwarded-For', 'Host',
+    'UNIQUE_ID', 'sessionid']
+
+method_list = ['GET', 'POST', 'HEAD', 'PUT', 'OPTIONS']
+
+version_list = ['HTTP/1.0', 'HTTP/1.1', 'HTTP/2.0']
+
+month_list = sorted(month_dict, key = month_dict.get)
+
+#
+# @Prototype
+#   Function: randomDirective()
+#   Example:  randomDirective( rng, 'i', used_set )
+#
+# @Purpose
+#   This function returns the format string text of a random variable of
+#   format character fmt_chr with its format bracket string, '' if it has
+#   none
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       rng      : random.Random
+#       fmt_chr  : Key of parse_func_dict
+#       used_set : Names already given to slots of fmt_chr, None for a
+#                  plain variable.  A name is never used twice so every
+#                  field is read back once.
+#   Output:
+#       (directive_str, fb_str)
+#
+def randomDirective(rng, fmt_chr, used_set):
+    if fmt_chr in ('ti', 'to'):
+        fb_str = rng.choice(['Content-Type', 'Accept'])
+        return ('%{' + fb_str + '}^' + fmt_chr, fb_str)
+
+    if fmt_chr in slot_directive_dict:
+        if not used_set and rng.random() < 0.2:
+            used_set.add(None)
+            return ('%' + fmt_chr, '')
+
+        fb_str = rng.choice([name_str for name_str in slot_name_list
+            if name_str not in used_set])
+        used_set.add(fb_str)
+
+        # Status code modifiers are skipped by the format parser
+        modifier_str = rng.choice(['', '', '!200,304', '400,501'])
+
+        return ('%' + modifier_str + '{' + fb_str + '}' + fmt_chr, fb_str)
+
+    if fmt_chr == 's' and rng.random() < 0.5:
+        return ('%>s', '')
+
+    if fmt_chr in bracket_dict and rng.random() < 0.5:
+        fb_str = rng.choice(bracket_dict[fmt_chr])
+        return ('%{' + fb_str + '}' + fmt_chr, fb_str)
+
+    return ('%' + fmt_chr, '')
+
+
+#
+# @Prototype
+#   Function: renderSeparator()
+#   Example:  renderSeparator( rng, chr_list )
+#
+# @Purpose
+#   This function returns the format string text of a run of separator
+#   characters, escaped at random the ways parseFormatString understands
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def renderSeparator(rng, chr_list):
+    text_list = []
+
+    for sep_chr in chr_list:
+        if sep_chr == '%':
+            text_list.append('%%')
+        elif sep_chr == '\\':
+            text_list.append('\\\\')
+        elif sep_chr in esc_letter_dict:
+            text_list.append('\\' + esc_letter_dict[sep_chr]
+                if rng.random() < 0.7 else sep_chr)
+        elif rng.random() < 0.2:
+            text_list.append('\\' + sep_chr)
+        else:
+            text_list.append(sep_chr)
+
+    return ''.join(text_list)
+
+
+#
+# @Prototype
+#   Function: randomFormat()
+#   Example:  randomFormat( rng, 8 )
+#
+# @Purpose
+#   This function returns a random format string together with what a line
+#   of it looks like, the separator runs and the variables in between
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       rng           : random.Random
+#       max_field_cnt : Most variables in the format
+#   Output:
+#       (format_str, sep_list, spec_list) : sep_list holds one more run
+#                                           than spec_list has variables,
+#                                           the line is sep_list[0],
+#                                           value 0, sep_list[1] and so on.
+#                                           spec_list entries are
+#                                           (fmt_chr, fb_str, quote_chr).
+#
+#   A fifth of the formats are unquoted variables separated by single
+#   spaces, the kind the split engine takes.
+#
+#   The formats stay within what the parser can split unambiguously.
+#   Unquoted variables other than %t end at a space so the run after them
+#   starts with one, quote characters only appear wrapping a variable, and
+#   each format character is used once except for slots with different
+#   names.
+#
+def randomFormat(rng, max_field_cnt = 8):
+    fmt_list = sorted(parse_func_dict)
+    field_cnt = rng.randint(1, max_field_cnt)
+    plain = rng.random() < 0.2
+
+    spec_list = []
+    used_dict = {}
+
+    while len(spec_list) < field_cnt:
+        fmt_chr = rng.choice(fmt_list)
+        used_set = used_dict.get(fmt_chr)
+
+        # Only slots repeat, under new names, and never next to a plain
+        # %i since both set header_line_str
+        if used_set is not None and (fmt_chr not in slot_directive_dict
+                or None in used_set or len(used_set) == len(slot_name_list)):
+            continue
+
+        used_set = used_dict.setdefault(fmt_chr, set())
+        (directive_str, fb_str) = randomDirective(rng, fmt_chr, used_set)
+        quote_chr = '' if plain else rng.choice(['', '', '"', "'"])
+        spec_list.append( (directive_str, fmt_chr, fb_str, quote_chr) )
+
+    # Runs between and around the variables
+    run_list = []
+
+    for j in range(len(spec_list) + 1):
+        if plain:
+            chr_list = [' '] if 0 < j < len(spec_list) else []
+        elif 0 < j < len(spec_list):
+            chr_list = [rng.choice(sep_chr_str)
+                for k in range(rng.randint(1, 3))]
+        else:
+            chr_list = [rng.choice(sep_chr_str)
+                for k in range(rng.randint(0, 2))]
+
+        if j > 0:
+            (fmt_chr, quote_chr) = (spec_list[j - 1][1], spec_list[j - 1][3])
+
+            if quote_chr:
+                chr_list.insert(0, quote_chr)
+            elif fmt_chr != 't' and chr_list:
+                chr_list[0] = ' '
+
+        if j < len(spec_list) and spec_list[j][3]:
+            chr_list.append(spec_list[j][3])
+
+        run_list.append(chr_list)
+
+    text_list = []
+
+    for (j, spec) in enumerate(spec_list):
+        text_list.append(renderSeparator(rng, run_list[j]))
+        text_list.append(spec[0])
+
+    text_list.append(renderSeparator(rng, run_list[-1]))
+
+    return (''.join(text_list), [''.join(chr_list) for chr_list in run_list],
+        [spec[1:] for spec in spec_list])
+
+
+#
+# @Prototype
+#   Function: formatSpec()
+#   Example:  formatSpec( Parser( format_str ) )
+#
+# @Purpose
+#   This function returns the (sep_list, spec_list) of randomFormat for
+#   the format of an existing Parser, to render lines of known formats
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def formatSpec(parser):
+    sep_list = []
+    spec_list = []
+    d = 0
+
+    for entry in parser.parser_list:
+        sep_list.append(''.join(parser.delim_list[d:entry[3]]))
+        spec_list.append( (entry[2], entry[1], entry[4]) )
+        d = entry[3]
+
+    sep_list.append(''.join(parser.delim_list[d:]))
+
+    return (sep_list, spec_list)
+
+
+#
+# @Prototype
+#   Function: escapeQuoted()
+#   Example:  escapeQuoted( value_str )
+#
+# @Purpose
+#   This function escapes a value the way Apache writes it into a quoted
+#   variable
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def escapeQuoted(value_str):
+    text_list = []
+
+    for value_chr in value_str:
+        if value_chr in quoted_esc_dict:
+            text_list.append(quoted_esc_dict[value_chr])
+        elif value_chr < ' ':
+            text_list.append('\\x%02x' % ord(value_chr))
+        else:
+            text_list.append(value_chr)
+
+    return ''.join(text_list)
+
+
+def randomToken(rng, max_len = 12):
+    return ''.join(rng.choice(token_chr_str)
+        for k in range(rng.randint(1, max_len)))
+
+def randomQuoted(rng, max_len = 16):
+    return ''.join(rng.choice(quoted_chr_str)
+        for k in range(rng.randint(0, max_len)))
+
+def randomIP(rng):
+    if rng.random() < 0.7:
+        return '.'.join(str(rng.randint(0, 255)) for k in range(4))
+
+    return '2001:db8::%x:%x' % (rng.randint(1, 0xffff), rng.randint(0, 0xffff))
+
+
+#
+# @Prototype
+#   Function: randomValue()
+#   Example:  randomValue( rng, 'r', '"' )
+#
+# @Purpose
+#   This function returns the text of a random value of a variable as
+#   written in a log line, and the list of values parsing it must give in
+#   Parser.fieldList order
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def randomValue(rng, fmt_chr, quote_chr):
+    field_type = directive_field_dict[fmt_chr][1]
+
+    if field_type is datetime:
+        sign_str = rng.choice('+-')
+        offset_str = '%s%02d%s' % (sign_str, rng.randint(0, 14),
+            rng.choice(['00', '30', '45']))
+        (month_str, day) = (rng.choice(month_list), rng.randint(1, 28))
+        (hour, minute, second) = (rng.randint(0, 23), rng.randint(0, 59),
+            rng.randint(0, 59))
+        year = rng.randint(1990, 2037)
+
+        time = datetime(year, month_dict[month_str], day, hour, minute,
+            second, tzinfo = FixedOffset(offset_str))
+        text_str = '[%02d/%s/%04d:%02d:%02d:%02d %s]' % (day, month_str, year,
+            hour, minute, second, offset_str)
+
+        return (text_str, [time])
+
+    if field_type is int:
+        if rng.random() < 0.15:
+            return ('-', [None])
+
+        value = rng.randint(0, 10 ** rng.randint(1, 12))
+
+        if rng.random() < 0.05:
+            value = -value
+
+        return (str(value), [value])
+
+    if field_type is HTTPLine:
+        method_str = rng.choice(method_list)
+        version_str = rng.choice(version_list)
+
+        if not quote_chr:
+            uri_str = randomToken(rng, 24)
+            return (' '.join([method_str, uri_str, version_str]),
+                [method_str, uri_str, version_str])
+
+        if rng.random() < 0.1:
+            return ('-', ['-', '', ''])
+
+        uri_str = randomQuoted(rng, 24)
+        text_str = escapeQuoted(' '.join([method_str, uri_str, version_str]))
+
+        return (text_str, [method_str, uri_str, version_str])
+
+    if fmt_chr in ('a', 'A') or (fmt_chr == 'h' and rng.random() < 0.5):
+        value_str = randomIP(rng) if rng.random() < 0.9 else '-'
+    elif rng.random() < 0.1:
+        value_str = '-'
+    elif quote_chr:
+        value_str = randomQuoted(rng)
+    else:
+        value_str = randomToken(rng)
+
+    if quote_chr:
+        return (escapeQuoted(value_str), [value_str])
+
+    return (value_str, [value_str])
+
+
+#
+# @Prototype
+#   Function: renderLine()
+#   Example:  renderLine( rng, sep_list, spec_list )
+#
+# @Purpose
+#   This function returns a random log line of a format described by
+#   randomFormat or formatSpec and the values parsing it must give in
+#   Parser.fieldList order
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def renderLine(rng, sep_list, spec_list):
+    text_list = [sep_list[0]]
+    expected_list = []
+
+    for (spec, sep_str) in zip(spec_list, sep_list[1:]):
+        (text_str, value_list) = randomValue(rng, spec[0], spec[2])
+        text_list.append(text_str)
+        text_list.append(sep_str)
+        expected_list.extend(value_list)
+
+    return (''.join(text_list), expected_list)
+
+
+#
+# Value compared between engines, datetimes are compared with their offset
+#
+def valueKey(value):
+    if type(value) is datetime:
+        return value.isoformat()
+
+    return value
+
+
+#
+# @Prototype
+#   Function: engineInput()
+#   Example:  engineInput( 'latin-1', line_str )
+#
+# @Purpose
+#   This function returns line_str as the engine takes it, or None when
+#   the line can't be written in the engine's encoding
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def engineInput(engine_str, line_str):
+    (encoding, ip_mode, input_type, engine) = engine_dict[engine_str]
+
+    if input_type is str:
+        return line_str
+
+    try:
+        return line_str.encode(encoding)
+    except UnicodeEncodeError:
+        return None
+
+
+#
+# @Prototype
+#   Function: mutateLine()
+#   Example:  mutateLine( rng, line_str )
+#
+# @Purpose
+#   This function returns line_str with a few characters deleted,
+#   duplicated or replaced by a delimiter, quote, backslash or bracket
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def mutateLine(rng, line_str):
+    chr_list = list(line_str)
+
+    for k in range(rng.randint(1, 3)):
+        if not chr_list:
+            break
+
+        j = rng.randrange(len(chr_list))
+        action = rng.randrange(3)
+
+        if action == 0:
+            del chr_list[j]
+        elif action == 1:
+            chr_list.insert(j, chr_list[j])
+        else:
+            chr_list[j] = rng.choice(' "\\\'[]\n-' + sep_chr_str)
+
+    return ''.join(chr_list)
+
+
+#
+# @Prototype
+#   Function: parseValues()
+#   Example:  parseValues( parser, parser.fieldList(), line )
+#
+# @Purpose
+#   This function returns (name -> valueKey of every field, None) for a
+#   line, or (None, exception) when parsing or reading it fails
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def parseValues(parser, field_list, line):
+    try:
+        log = parser.parse(line)
+
+        return ({ entry[0] : valueKey(entry[2](log))
+            for entry in field_list }, None)
+    except Exception as error:
+        return (None, error)
+
+
+#
+# @Prototype
+#   Function: engineParser()
+#   Example:  engineParser( 'bytes-split', format_str )
+#
+# @Purpose
+#   This function returns the Parser of an engine of engine_dict for a
+#   format, or None when the engine can't parse it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def engineParser(engine_str, format_str, limit_dict = None):
+    (encoding, ip_mode, input_type, engine) = engine_dict[engine_str]
+    limit_dict = limit_dict or {}
+    parser = Parser(format_str, encoding, ip_mode, **limit_dict)
+
+    if engine == 'auto':
+        return parser
+
+    if engine not in parser.engine_list:
+        return None
+
+    return Parser(format_str, encoding, ip_mode, engine, **limit_dict)
+
+
+#
+# @Prototype
+#   Function: randomLimits()
+#   Example:  randomLimits( rng )
+#
+# @Purpose
+#   This function returns Parser keyword arguments for random length
+#   limits short enough for random lines to hit them
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def randomLimits(rng):
+    limit_dict = { 'overflow_mode' : rng.choice(['reject', 'truncate']) }
+
+    if rng.random() < 0.5:
+        limit_dict['max_line_len'] = rng.randint(8, 120)
+
+    if rng.random() < 0.8:
+        limit_dict['max_field_len'] = rng.randint(1, 16)
+
+    return limit_dict
+
+
+#
+# @Prototype
+#   Function: checkFormat()
+#   Example:  checkFormat( rng, format_str, sep_list, spec_list, 20 )
+#
+# @Purpose
+#   This function parses line_cnt random lines of a format with every
+#   engine and returns a list of every disagreement.  The reference engine
+#   must give the rendered values and every other engine must give the
+#   same values as the reference.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Output:
+#       mismatch_list : List of (format_str, line_str, engine_str, name_str,
+#                       expected, got).  name_str is None when an engine
+#                       failed to parse the line or failed differently
+#                       from the reference, expected and got are then the
+#                       exceptions.
+#
+#   mutate_rate of the lines are damaged by mutateLine, the engines only
+#   have to agree with the reference on those, values or exception type.
+#   The same goes for every line when limit_dict sets length limits.
+#
+def checkFormat(rng, format_str, sep_list, spec_list, line_cnt,
+        engine_list = None, mutate_rate = 0.2, limit_dict = None):
+    engine_list = engine_list or list(engine_dict)
+    mismatch_list = []
+    parser_dict = {}
+
+    for engine_str in [reference_engine] + engine_list:
+        parser = engineParser(engine_str, format_str, limit_dict)
+
+        if parser is not None:
+            parser_dict[engine_str] = (parser, parser.fieldList())
+
+    for k in range(line_cnt):
+        (line_str, expected_list) = renderLine(rng, sep_list, spec_list)
+
+        if rng.random() < mutate_rate:
+            line_str = mutateLine(rng, line_str)
+            expected_list = None
+
+        if limit_dict:
+            expected_list = None
+
+        if rng.random() < 0.5:
+            line_str += '\n'
+
+        (parser, field_list) = parser_dict[reference_engine]
+        (value_dict, error) = parseValues(parser, field_list, line_str)
+
+        # Damaged lines only have to fail the same way everywhere
+        if error is not None and expected_list is not None:
+            mismatch_list.append( (format_str, line_str, reference_engine,
+                None, None, error) )
+            continue
+
+        if error is None and expected_list is not None:
+            for (entry, expected) in zip(field_list, expected_list):
+                if value_dict[entry[0]] != valueKey(expected):
+                    mismatch_list.append( (format_str, line_str,
+                        reference_engine, entry[0], valueKey(expected),
+                        value_dict[entry[0]]) )
+
+        # Fields only some engines have, the _int addresses, are compared
+        # with the first engine that has them
+        for engine_str in engine_list:
+            line = engineInput(engine_str, line_str)
+
+            if (line is None or engine_str == reference_engine
+                    or engine_str not in parser_dict):
+                continue
+
+            # Limits count bytes of bytes lines, which only agree with the
+            # reference when each character is one byte
+            if limit_dict and len(line) != len(line_str):
+                continue
+
+            (parser, field_list) = parser_dict[engine_str]
+            (got_dict, got_error) = parseValues(parser, field_list, line)
+
+            if error is not None or got_error is not None:
+                if type(got_error) is not type(error):
+                    mismatch_list.append( (format_str, line_str, engine_str,
+                        None, error, got_error) )
+                continue
+
+            for (name_str, value) in got_dict.items():
+                expected = value_dict.setdefault(name_str, value)
+
+                if value != expected:
+                    mismatch_list.append( (format_str, line_str, engine_str,
+                        name_str, expected, value) )
+
+    return mismatch_list
+
+
+#
+# @Prototype
+#   Function: fuzz()
+#   Example:  fuzz( seed = 1, format_cnt = 500 )
+#
+# @Purpose
+#   This function checks format_cnt random formats with line_cnt random
+#   lines each and returns the list of mismatches of checkFormat.
+#   limit_rate of the formats are checked with randomLimits.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def fuzz(seed = 0, format_cnt = 200, line_cnt = 20, engine_list = None,
+        max_field_cnt = 8, limit_rate = 0.2):
+    rng = random.Random(seed)
+    mismatch_list = []
+
+    for k in range(format_cnt):
+        (format_str, sep_list, spec_list) = randomFormat(rng, max_field_cnt)
+
+        try:
+            Parser(format_str)
+        except Exception as error:
+            mismatch_list.append( (format_str, None, reference_engine, None,
+                None, error) )
+            continue
+
+        limit_dict = randomLimits(rng) if rng.random() < limit_rate else None
+
+        mismatch_list.extend(checkFormat(rng, format_str, sep_list, spec_list,
+            line_cnt, engine_list, limit_dict = limit_dict))
+
+    return mismatch_list
+
+
+#
+# @Prototype
+#   Function: benchmark()
+#   Example:  benchmark( ['str', 'bytes'] )
+#
+# @Purpose
+#   This function returns the throughput of every engine, in lines per
+#   second, on random lines of the formats of bench_format_dict.
+#   Each line is parsed and every field of it read, so engines deferring
+#   work to the first read pay for it here.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Output:
+#       rate_dict : { format name : { engine name : lines per second } },
+#                   the best of repeat_cnt runs
+#
+def benchmark(engine_list = None, line_cnt = 20000, repeat_cnt = 3, seed = 0):
+    engine_list = engine_list or list(engine_dict)
+    rate_dict = {}
+
+    for (format_name, format_str) in bench_format_dict.items():
+        rng = random.Random(seed)
+        (sep_list, spec_list) = formatSpec(Parser(format_str))
+        line_list = [renderLine(rng, sep_list, spec_list)[0] + '\n'
+            for k in range(line_cnt)]
+
+        for engine_str in engine_list:
+            parser = engineParser(engine_str, format_str)
+
+            if parser is None:
+                continue
+
+            get_list = [entry[2] for entry in parser.fieldList()]
+            input_list = [engineInput(engine_str, line_str)
+                for line_str in line_list]
+            input_list = [line for line in input_list if line is not None]
+            best = None
+
+            for k in range(repeat_cnt):
+                start = perf_counter()
+
+                for line in input_list:
+                    log = parser.parse(line)
+
+                    for get_func in get_list:
+                        get_func(log)
+
+                seconds = perf_counter() - start
+
+                if best is None or seconds < best:
+                    best = seconds
+
+            rate_dict.setdefault(format_name, {})[engine_str] = \
+                len(input_list) / best if best else 0.0
+
+    return rate_dict
+
+
+#
+# Hostile lines of the adversarial benchmark, name -> (format name of
+# bench_format_dict, function of the length n returning the line).  Each
+# blows one variable up to n characters or leaves something unclosed.
+#
+request_prefix_str = '203.0.113.7 - - [10/Oct/2000:13:55:36 -0700] "GET /'
+
+adversarial_dict = {
+    'long-uri'       : ('combined', lambda n : request_prefix_str + 'a' * n
+        + ' HTTP/1.1" 200 2326 "-" "-"\n'),
+    'escaped-quotes' : ('combined', lambda n : request_prefix_str
+        + ' HTTP/1.1" 200 2326 "-" "' + '\\"' * (n // 2) + '"\n'),
+    'backslash-runs' : ('combined', lambda n : request_prefix_str
+        + ' HTTP/1.1" 200 2326 "-" "' + '\\\\\\"x' * (n // 5) + '"\n'),
+    'unclosed-quote' : ('combined', lambda n : request_prefix_str + 'a' * n
+        + '\n'),
+    'unclosed-time'  : ('combined', lambda n : '203.0.113.7 - - [' + '1' * n
+        + '\n'),
+    'long-host'      : ('unquoted', lambda n : 'h' * n
+        + ' - - [10/Oct/2000:13:55:36 -0700] 200 2326 1\n'),
+    'spaces'         : ('unquoted', lambda n : ' ' * n + '\n')
+}
+
+
+#
+# @Prototype
+#   Function: adversarialBenchmark()
+#   Example:  adversarialBenchmark( 65536 )
+#
+# @Purpose
+#   This function times every engine on the lines of adversarial_dict at
+#   length n and 4 * n and returns the time per line of both.  Parsing
+#   linear in the length of the line takes about 4 times as long on the
+#   longer line, quadratic parsing 16 times.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Output:
+#       time_dict : { line name : { engine name : (seconds at n, seconds
+#                   at 4 * n) } }, the best of repeat_cnt runs
+#
+#   Lines may parse or fail, either way the time until the engine is done
+#   with them counts.  limit_dict is handed to every Parser.
+#
+def adversarialBenchmark(n = 65536, engine_list = None, repeat_cnt = 3,
+        limit_dict = None):
+    engine_list = engine_list or list(engine_dict)
+    time_dict = {}
+
+    for (line_name, (format_name, lineFunc)) in adversarial_dict.items():
+        for engine_str in engine_list:
+            parser = engineParser(engine_str, bench_format_dict[format_name],
+                limit_dict)
+
+            if parser is None:
+                continue
+
+            get_list = [entry[2] for entry in parser.fieldList()]
+            seconds_list = []
+
+            for line_len in (n, 4 * n):
+                line = engineInput(engine_str, lineFunc(line_len))
+                best = None
+
+                for k in range(repeat_cnt):
+                    start = perf_counter()
+
+                    try:
+                        log = parser.parse(line)
+
+                        for get_func in get_list:
+                            get_func(log)
+                    except (IndexError, KeyError, ValueError):
+                        pass
+
+                    seconds = perf_counter() - start
+
+                    if best is None or seconds < best:
+                        best = seconds
+
+                seconds_list.append(best)
+
+            time_dict.setdefault(line_name, {})[engine_str] = \
+                tuple(seconds_list)
+
+    return time_dict
+
+
+#
+# @Prototype
+#   Function: checkThroughput()
+#   Example:  checkThroughput( rate_dict, baseline_dict, 0.15 )
+#
+# @Purpose
+#   This function returns the (format name, engine name, rate, baseline
+#   rate) of every engine slower than its baseline by more than tolerance
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Baselines are machine specific, record them with --save-baseline on
+#   the machine running the gate.  Engines or formats missing from the
+#   baseline are not checked.
+#
+def checkThroughput(rate_dict, baseline_dict, tolerance = 0.15):
+    slow_list = []
+
+    for (format_name, engine_rate_dict) in rate_dict.items():
+        for (engine_str, rate) in engine_rate_dict.items():
+            baseline = baseline_dict.get(format_name, {}).get(engine_str)
+
+            if baseline is not None and rate < baseline * (1 - tolerance):
+                slow_list.append( (format_name, engine_str, rate, baseline) )
+
+    return slow_list
+
+
+#
+# @Prototype
+#   Function: main()
+#   Example:  python -m parser.fuzz --formats 1000 --bench
+#             python -m parser.fuzz --bench --baseline bench.json
+#             python -m parser.fuzz --formats 0 --adversarial
+#
+# @Purpose
+#   Command line front end, checks random formats with every engine and
+#   optionally benchmarks them against a saved baseline or times hostile
+#   lines.  Exits with 1 on any mismatch, throughput regression or hostile
+#   line taking over --max-growth times as long at 4 times the length.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def main(arg_list = None):
+    arg_parser = argparse.ArgumentParser(prog = 'python -m parser.fuzz')
+    arg_parser.add_argument('--seed', type = int, default = 0)
+    arg_parser.add_argument('--formats', type = int, default = 200)
+    arg_parser.add_argument('--lines', type = int, default = 20)
+    arg_parser.add_argument('--max-fields', type = int, default = 8)
+    arg_parser.add_argument('--engine', action = 'append',
+        choices = list(engine_dict), help = 'Engines to check, all by default')
+    arg_parser.add_argument('--bench', action = 'store_true')
+    arg_parser.add_argument('--bench-lines', type = int, default = 20000)
+    arg_parser.add_argument('--baseline',
+        help = 'JSON file of lines per second to check the benchmark against')
+    arg_parser.add_argument('--save-baseline', action = 'store_true',
+        help = 'Write the benchmark to --baseline instead of checking it')
+    arg_parser.add_argument('--tolerance', type = float, default = 0.15)
+    arg_parser.add_argument('--adversarial', action = 'store_true')
+    arg_parser.add_argument('--adversarial-len', type = int, default = 65536)
+    arg_parser.add_argument('--max-growth', type = float, default = 8.0,
+        help = 'Slowdown allowed on hostile lines 4 times as long, about 4 '
+               'when parsing is linear')
+    arg_parser.add_argument('--max-field-len', type = int,
+        help = 'max_field_len of the Parsers timed by --adversarial')
+
+    args = arg_parser.parse_args(arg_list)
+
+    mismatch_list = fuzz(args.seed, args.formats, args.lines, args.engine,
+        args.max_fields)
+
+    for mismatch in mismatch_list[:20]:
+        print('format %r\n  line %r\n  engine %s field %s: expected %r, got %r'
+            % mismatch)
+
+    print('%d formats, %d mismatches' % (args.formats, len(mismatch_list)),
+        file = sys.stderr)
+
+    failed = bool(mismatch_list)
+
+    if args.bench:
+        rate_dict = benchmark(args.engine, args.bench_lines)
+
+        for (format_name, engine_rate_dict) in rate_dict.items():
+            for (engine_str, rate) in engine_rate_dict.items():
+                print('%-14s %-14s %10.0f lines/s' % (format_name, engine_str,
+                    rate))
+
+        if args.baseline and args.save_baseline:
+            with open(args.baseline, 'w') as baseline_file:
+                json.dump(rate_dict, baseline_file, indent = 2, sort_keys = True)
+
+        elif args.baseline:
+            with open(args.baseline) as baseline_file:
+                slow_list = checkThroughput(rate_dict, json.load(baseline_file),
+                    args.tolerance)
+
+            for slow in slow_list:
+                print('%s %s: %.0f lines/s, baseline %.0f' % slow)
+
+            failed = failed or bool(slow_list)
+
+    if args.adversarial:
+        limit_dict = { 'max_field_len' : args.max_field_len }
+        time_dict = adversarialBenchmark(args.adversarial_len, args.engine,
+            limit_dict = limit_dict)
+
+        for (line_name, engine_time_dict) in time_dict.items():
+            for (engine_str, (seconds, long_seconds)) in \
+                    engine_time_dict.items():
+                growth = long_seconds / seconds if seconds else 0.0
+
+                print('%-14s %-14s %10.1f us %10.1f us  x%.1f%s' % (line_name,
+                    engine_str, seconds * 1e6, long_seconds * 1e6, growth,
+                    '  superlinear' if growth > args.max_growth else ''))
+
+                failed = failed or growth > args.max_growth
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,287 @@
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+
+from . import fieldGetter
+
+#
+# Estimated bytes of memory per group on top of its key, the dict slot
+# and the state list with its numbers
+#
+group_overhead = 300
+
+#
+# Groups written per pickled chunk of a spill file
+#
+spill_chunk_size = 4096
+
+#
+# Deepest level of repartitioning, past it a partition is aggregated in
+# memory whatever its size
+#
+max_level = 8
+
+#
+# @Prototype
+#   Function: newState()
+#   Example:  newState()
+#
+# @Purpose
+#   This function returns an empty aggregate state, a list of count, sum
+#   of bytes, min, max and sum of request_time_int and the number of
+#   request times
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def newState():
+    return [0, 0, None, None, 0, 0]
+
+
+#
+# @Prototype
+#   Function: mergeState()
+#   Example:  mergeState( state, other_state )
+#
+# @Purpose
+#   This function folds other_state into state
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def mergeState(state, other_state):
+    state[0] += other_state[0]
+    state[1] += other_state[1]
+
+    if other_state[5]:
+        if state[5] == 0 or other_state[2] < state[2]:
+            state[2] = other_state[2]
+
+        if state[5] == 0 or other_state[3] > state[3]:
+            state[3] = other_state[3]
+
+        state[4] += other_state[4]
+        state[5] += other_state[5]
+
+
+#
+# @Prototype
+#   Function: stateDict()
+#   Example:  stateDict( state )
+#
+# @Purpose
+#   This function returns the aggregates of a state by name
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def stateDict(state):
+    return {
+        'count'            : state[0],
+        'byte_sum'         : state[1],
+        'min_request_time' : state[2],
+        'max_request_time' : state[3],
+        'avg_request_time' : state[4] / state[5] if state[5] else None
+    }
+
+
+#
+# @Class
+#   GroupBy
+#
+# @Initialization Prototype
+#   GroupBy( 'remote_ip_str' )
+#   GroupBy( 'http_line.request_URI_str', 64 << 20, '/var/tmp' )
+#
+# @Purpose
+#   Hash aggregation of ApacheLog objects by one field, counting requests
+#   and summing bytes and request_time_int per value, within a memory
+#   budget.  When the hash table outgrows the budget its groups are hashed
+#   into partition files on disk and the table starts over.  At the end
+#   each partition is aggregated on its own, partitioning it again with a
+#   different hash if it is still too large, so however many distinct
+#   values there are only about memory_budget of groups is ever held.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   field_str      : ApacheLog field grouped on, optionally dotted
+#   memory_budget  : Approximate bytes of groups held in memory
+#   temp_dir       : Directory of the spill files, the system default if
+#                    None
+#   partition_cnt  : Partitions per spill
+#   level          : Repartitioning depth, salts the partition hash
+#   group_dict     : Value -> state, see newState()
+#   table_size     : Estimated bytes of group_dict
+#   spill_dir      : Directory of this operator's partition files, None
+#                    until the first spill
+#   spill_cnt      : Number of spills so far
+#   get_func       : Cached fieldGetter of field_str
+#
+# @Class Methods
+#   observe(log)       : Aggregate one ApacheLog, for Parser observer_list
+#   update(key, log)   : Aggregate one ApacheLog under key
+#   mergeGroup(key, state) : Fold an aggregate state into a group
+#   results()          : Generator of (value, stateDict) for every group,
+#                        in no particular order
+#   close()            : Remove the spill files
+#
+# @Notes
+#   Counts are weighted by sample_weight.  Response sizes are
+#   byte_count_nhclf_int, or byte_count_nh_int for formats without %b.
+#   results() can only be run once and cleans up after itself.
+#
+class GroupBy:
+    def __init__(self, field_str, memory_budget = 256 << 20, temp_dir = None,
+            partition_cnt = 16, level = 0):
+        self.field_str = field_str
+        self.memory_budget = memory_budget
+        self.temp_dir = temp_dir
+        self.partition_cnt = partition_cnt
+        self.level = level
+        self.group_dict = {}
+        self.table_size = 0
+        self.spill_dir = None
+        self.spill_cnt = 0
+        self.get_func = None
+
+    def observe(self, log):
+        if self.get_func is None:
+            self.get_func = fieldGetter(self.field_str)
+
+        self.update(self.get_func(log), log)
+
+    def update(self, key, log):
+        state = self.group_dict.get(key)
+
+        if state is None:
+            state = newState()
+            self.addGroup(key, state)
+
+        state[0] += log.sample_weight
+
+        byte_cnt = log.byte_count_nhclf_int
+
+        if byte_cnt is None:
+            byte_cnt = log.byte_count_nh_int
+
+        if byte_cnt is not None:
+            state[1] += byte_cnt
+
+        request_time = log.request_time_int
+
+        if request_time is not None:
+            if state[5] == 0 or request_time < state[2]:
+                state[2] = request_time
+
+            if state[5] == 0 or request_time > state[3]:
+                state[3] = request_time
+
+            state[4] += request_time
+            state[5] += 1
+
+    def mergeGroup(self, key, other_state):
+        state = self.group_dict.get(key)
+
+        if state is None:
+            self.addGroup(key, list(other_state))
+        else:
+            mergeState(state, other_state)
+
+    def addGroup(self, key, state):
+        # Spill before adding so the caller's state stays in the table
+        if self.table_size >= self.memory_budget and self.level < max_level:
+            self.spill()
+
+        self.group_dict[key] = state
+        self.table_size += sys.getsizeof(key) + group_overhead
+
+    def partitionPath(self, partition):
+        return os.path.join(self.spill_dir, '%d.part' % partition)
+
+    def spill(self):
+        if self.spill_dir is None:
+            self.spill_dir = tempfile.mkdtemp(prefix = 'groupby-',
+                dir = self.temp_dir)
+
+        chunk_list = [[] for partition in range(self.partition_cnt)]
+
+        for item in self.group_dict.items():
+            partition = hash((self.level, item[0])) % self.partition_cnt
+            chunk_list[partition].append(item)
+
+        for (partition, item_list) in enumerate(chunk_list):
+            if not item_list:
+                continue
+
+            with open(self.partitionPath(partition), 'ab') as spill_file:
+                for j in range(0, len(item_list), spill_chunk_size):
+                    pickle.dump(item_list[j : j + spill_chunk_size], spill_file,
+                        pickle.HIGHEST_PROTOCOL)
+
+        self.group_dict = {}
+        self.table_size = 0
+        self.spill_cnt += 1
+
+    def results(self):
+        try:
+            if self.spill_dir is None:
+                for (key, state) in self.group_dict.items():
+                    yield (key, stateDict(state))
+
+                self.group_dict = {}
+                return
+
+            self.spill()
+
+            for partition in range(self.partition_cnt):
+                part_path = self.partitionPath(partition)
+
+                if not os.path.exists(part_path):
+                    continue
+
+                child = GroupBy(self.field_str, self.memory_budget,
+                    self.temp_dir, self.partition_cnt, self.level + 1)
+
+                for item_list in readSpill(part_path):
+                    for (key, state) in item_list:
+                        child.mergeGroup(key, state)
+
+                os.remove(part_path)
+
+                yield from child.results()
+        finally:
+            self.close()
+
+    def close(self):
+        if self.spill_dir is not None:
+            shutil.rmtree(self.spill_dir, ignore_errors = True)
+            self.spill_dir = None
+
+
+#
+# @Prototype
+#   Function: readSpill()
+#   Example:  readSpill( part_path )
+#
+# @Purpose
+#   This generator yields the chunks of (key, state) pairs of a spill file
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def readSpill(part_path):
+    with open(part_path, 'rb', 1 << 20) as spill_file:
+        while True:
+            try:
+                yield pickle.load(spill_file)
+            except EOFError:
+                return
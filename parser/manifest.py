@@ -0,0 +1,214 @@
+from hashlib import blake2b
+from itertools import islice
+from time import monotonic
+import json
+import os
+
+#
+# Number of bytes hashed for the head and tail fingerprints of a file
+#
+fingerprint_size = 1024
+
+#
+# @Class
+#   Manifest
+#
+# @Initialization Prototype
+#   Manifest( manifest_path )
+#
+# @Purpose
+#   Remembers how far every log file was processed so the next run only
+#   parses new files and newly appended bytes.  Files are recognised by
+#   their device, inode and a hash of their first bytes rather than their
+#   path, so a rotated file that was renamed is still known, and a hash
+#   of the bytes just before the saved offset catches files that were
+#   rewritten in place.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   manifest_path : JSON file holding the state
+#   entry_dict    : 'dev:ino' -> { path, size, mtime, head_len, head,
+#                   offset, tail }
+#
+# @Class Methods
+#   startOffset(file_path) : Offset to resume file_path from, 0 for a new
+#                            or changed file
+#   fileOffset(log_file) : startOffset() of an already open binary file
+#   commit(file_path, offset, log_file) : Durably record file_path as
+#                                         processed up to offset, reading
+#                                         the open log_file when given
+#   parseNew(parser, path_list, batch_size, commit_bytes, commit_seconds) :
+#       Generator of (file_path, log_list, end_offset) for everything not
+#       processed yet, committing every batch by default, or once
+#       commit_bytes were read or commit_seconds passed since the last
+#       commit, and at the end of every file, when the next batch is
+#       asked for
+#   prune(path_list) : Forget every file that is not in path_list, for
+#                      files deleted by log rotation
+#
+# @Notes
+#   The state file is replaced atomically with a fsynced temporary file,
+#   so a job killed at any point leaves the last committed state behind.
+#   A batch is only committed after the consumer has asked for the next
+#   one, so if the consumer makes its own output durable before doing so
+#   a killed job resumes without counting anything twice.  By default
+#   parseNew() commits after every batch, committing rewrites and fsyncs
+#   the whole state file so a larger commit_bytes trades fewer commits for
+#   replaying up to that much, batches the consumer already handled
+#   included, after a kill.  The identity and hashes are taken from the
+#   file being read, not its path, so a file rotated mid run is never
+#   recorded under its successor's inode.
+#
+class Manifest:
+    def __init__(self, manifest_path):
+        self.manifest_path = manifest_path
+        self.entry_dict = {}
+
+        try:
+            with open(manifest_path) as manifest_file:
+                self.entry_dict = json.load(manifest_file)
+        except FileNotFoundError:
+            pass
+
+    def startOffset(self, file_path):
+        with open(file_path, 'rb') as log_file:
+            return self.fileOffset(log_file)
+
+    def fileOffset(self, log_file):
+        stat = os.fstat(log_file.fileno())
+        entry = self.entry_dict.get(identityKey(stat))
+
+        if entry is None or stat.st_size < entry['offset']:
+            return 0
+
+        if hashRange(log_file, 0, entry['head_len']) != entry['head']:
+            return 0
+
+        tail_start = max(0, entry['offset'] - fingerprint_size)
+
+        if hashRange(log_file, tail_start, entry['offset']) != entry['tail']:
+            return 0
+
+        return entry['offset']
+
+    def commit(self, file_path, offset, log_file = None):
+        if log_file is None:
+            with open(file_path, 'rb') as log_file:
+                return self.commit(file_path, offset, log_file)
+
+        stat = os.fstat(log_file.fileno())
+        position = log_file.tell()
+        head_len = min(offset, fingerprint_size)
+        tail_start = max(0, offset - fingerprint_size)
+
+        self.entry_dict[identityKey(stat)] = {
+            'path'     : file_path,
+            'size'     : stat.st_size,
+            'mtime'    : stat.st_mtime,
+            'head_len' : head_len,
+            'head'     : hashRange(log_file, 0, head_len),
+            'offset'   : offset,
+            'tail'     : hashRange(log_file, tail_start, offset)
+        }
+
+        log_file.seek(position)
+        self.save()
+
+    def save(self):
+        tmp_path = self.manifest_path + '.tmp'
+
+        with open(tmp_path, 'w') as tmp_file:
+            json.dump(self.entry_dict, tmp_file)
+            tmp_file.flush()
+            os.fsync(tmp_file.fileno())
+
+        os.replace(tmp_path, self.manifest_path)
+
+        # Make the rename itself durable
+        dir_fd = os.open(os.path.dirname(os.path.abspath(self.manifest_path)),
+            os.O_RDONLY)
+
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def prune(self, path_list):
+        seen_set = set(identityKey(os.stat(file_path)) for file_path in path_list)
+
+        for key in list(self.entry_dict):
+            if key not in seen_set:
+                del self.entry_dict[key]
+
+        self.save()
+
+    def parseNew(self, parser, path_list, batch_size = 1024,
+            commit_bytes = 0, commit_seconds = 5.0):
+        for file_path in path_list:
+            with open(file_path, 'rb') as log_file:
+                start_offset = self.fileOffset(log_file)
+                log_file.seek(start_offset)
+
+                committed_offset = end_offset = start_offset
+                commit_time = monotonic()
+
+                while True:
+                    line_list = list(islice(log_file, batch_size))
+
+                    # A last line without its newline is still being written
+                    if line_list and not line_list[-1].endswith(b'\n'):
+                        line_list.pop()
+
+                    if not line_list:
+                        break
+
+                    end_offset += sum(map(len, line_list))
+                    log_file.seek(end_offset)
+
+                    yield (file_path, parser.parseBatch(line_list), end_offset)
+
+                    if (end_offset - committed_offset >= commit_bytes
+                            or monotonic() - commit_time >= commit_seconds):
+                        self.commit(file_path, end_offset, log_file)
+                        committed_offset = end_offset
+                        commit_time = monotonic()
+
+                if end_offset != committed_offset:
+                    self.commit(file_path, end_offset, log_file)
+
+#
+# @Prototype
+#   Function: identityKey()
+#   Example:  identityKey( os.stat(file_path) )
+#
+# @Purpose
+#   This function returns the manifest key of a file, its device and inode
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def identityKey(stat):
+    return '%d:%d' % (stat.st_dev, stat.st_ino)
+
+
+#
+# @Prototype
+#   Function: hashRange()
+#   Example:  hashRange( log_file, 0, 1024 )
+#
+# @Purpose
+#   This function returns the hex hash of the bytes [start, end) of an open
+#   binary file
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def hashRange(log_file, start, end):
+    log_file.seek(start)
+
+    return blake2b(log_file.read(end - start), digest_size = 16).hexdigest()
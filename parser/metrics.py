@@ -0,0 +1,256 @@
+from bisect import bisect_left
+from threading import Lock, Thread
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+#
+# Default upper bounds, in seconds, for the batch latency histogram
+#
+default_latency_bucket_list = [0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0]
+
+#
+# @Class
+#   Histogram
+#
+# @Initialization Prototype
+#   Histogram( bucket_list )
+#
+# @Purpose
+#   Cumulative histogram matching the Prometheus histogram type.  Values
+#   are counted into the first bucket whose upper bound is greater than or
+#   equal to the value, with one extra bucket for +Inf.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   bucket_list : Sorted list of bucket upper bounds
+#   count_list  : Per bucket counts, the last entry being the +Inf bucket
+#   sum_float   : Sum of every observed value
+#   count_int   : Number of observed values
+#
+# @Class Methods
+#   observe(value) : Count value into its bucket
+#   cumulative()   : List of (upper bound, cumulative count) pairs
+#
+# @Notes
+#   Not synchronised on its own, ParserMetrics holds its lock around
+#   every call.
+#
+class Histogram:
+    def __init__(self, bucket_list = default_latency_bucket_list):
+        self.bucket_list = sorted(bucket_list)
+        self.count_list = [0] * (len(self.bucket_list) + 1)
+        self.sum_float = 0.0
+        self.count_int = 0
+
+    def observe(self, value):
+        self.count_list[bisect_left(self.bucket_list, value)] += 1
+        self.sum_float += value
+        self.count_int += 1
+
+    def cumulative(self):
+        total = 0
+        cumulative_list = []
+
+        for (bound, count) in zip(self.bucket_list + [float('inf')],
+                self.count_list):
+            total += count
+            cumulative_list.append((bound, total))
+
+        return cumulative_list
+
+
+#
+# @Class
+#   ParserMetrics
+#
+# @Initialization Prototype
+#   ParserMetrics( bucket_list )
+#
+# @Purpose
+#   Runtime health counters for long running parser processes such as
+#   Parser.parseFile in follow mode.  The parser hot loop only touches
+#   local variables and hands its totals over once per batch, so the lock
+#   is taken once per batch instead of once per line.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   lines_parsed_int : Lines successfully parsed into ApacheLog objects
+#   bytes_read_int   : Raw bytes read by the file readers
+#   parse_errors_int : Lines that could not be parsed
+#   lag_bytes_int    : Bytes between the reader offset and the file end
+#   queue_depth_int  : Lines read whose logs were not handed on yet
+#   batch_latency    : Histogram of seconds spent parsing each batch
+#
+# @Class Methods
+#   recordBatch(lines, errors, seconds) : Add one parsed batch
+#   recordRead(byte_cnt, lag)           : Add bytes read by a reader
+#   setQueueDepth(depth)                : Set the pending line count
+#   addQueueDepth(delta)                : Add lines read, or take away
+#                                         lines handed on with a negative
+#                                         delta
+#   snapshot()                          : Consistent dict of every value
+#   renderPrometheus()                  : Prometheus text exposition
+#
+# @Notes
+#   Readers add the lines of a batch to the queue depth when they read it
+#   and take them away once its logs were handed on, so several readers
+#   or a pool of workers add up to the real backlog.
+#
+class ParserMetrics:
+    def __init__(self, bucket_list = default_latency_bucket_list):
+        self.lines_parsed_int = 0
+
+        self.bytes_read_int = 0
+
+        self.parse_errors_int = 0
+
+        self.lag_bytes_int = 0
+
+        self.queue_depth_int = 0
+
+        self.batch_latency = Histogram(bucket_list)
+
+        self.__lock = Lock()
+
+    def recordBatch(self, line_cnt, error_cnt, seconds):
+        with self.__lock:
+            self.lines_parsed_int += line_cnt
+            self.parse_errors_int += error_cnt
+            self.batch_latency.observe(seconds)
+
+    def recordRead(self, byte_cnt, lag_int = None):
+        with self.__lock:
+            self.bytes_read_int += byte_cnt
+
+            if lag_int is not None:
+                self.lag_bytes_int = lag_int
+
+    def setQueueDepth(self, depth_int):
+        # A single attribute store needs no lock
+        self.queue_depth_int = depth_int
+
+    def addQueueDepth(self, delta_int):
+        with self.__lock:
+            self.queue_depth_int += delta_int
+
+    def snapshot(self):
+        with self.__lock:
+            return {
+                'lines_parsed'      : self.lines_parsed_int,
+                'bytes_read'        : self.bytes_read_int,
+                'parse_errors'      : self.parse_errors_int,
+                'lag_bytes'         : self.lag_bytes_int,
+                'queue_depth'       : self.queue_depth_int,
+                'batch_latency'     : self.batch_latency.cumulative(),
+                'batch_latency_sum' : self.batch_latency.sum_float,
+                'batch_count'       : self.batch_latency.count_int
+            }
+
+    def renderPrometheus(self, prefix_str = 'apache_log_parser'):
+        snap_dict = self.snapshot()
+        line_list = []
+
+        for (name, kind, help_str, key) in metric_desc_list:
+            line_list.append('# HELP %s_%s %s' % (prefix_str, name, help_str))
+            line_list.append('# TYPE %s_%s %s' % (prefix_str, name, kind))
+            line_list.append('%s_%s %d' % (prefix_str, name, snap_dict[key]))
+
+        name = prefix_str + '_batch_latency_seconds'
+        line_list.append('# HELP %s Seconds spent parsing one batch' % name)
+        line_list.append('# TYPE %s histogram' % name)
+
+        for (bound, count) in snap_dict['batch_latency']:
+            le_str = '+Inf' if bound == float('inf') else repr(bound)
+            line_list.append('%s_bucket{le="%s"} %d' % (name, le_str, count))
+
+        line_list.append('%s_sum %r' % (name, snap_dict['batch_latency_sum']))
+        line_list.append('%s_count %d' % (name, snap_dict['batch_count']))
+
+        return '\n'.join(line_list) + '\n'
+
+
+#
+# Name, Prometheus type, help text and snapshot key of the plain metrics
+#
+metric_desc_list = [
+    ('lines_parsed_total', 'counter', 'Lines parsed into ApacheLog objects',
+        'lines_parsed'),
+    ('bytes_read_total', 'counter', 'Raw log bytes read', 'bytes_read'),
+    ('parse_errors_total', 'counter', 'Lines that failed to parse',
+        'parse_errors'),
+    ('lag_bytes', 'gauge', 'Bytes behind the end of the followed file',
+        'lag_bytes'),
+    ('queue_depth', 'gauge', 'Lines read whose logs were not handed on yet',
+        'queue_depth')
+]
+
+
+#
+# @Class
+#   MetricsHandler : subclass of BaseHTTPRequestHandler
+#
+# @Purpose
+#   Serves the ParserMetrics of its server on /metrics in the Prometheus
+#   text format
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.renderPrometheus().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    # Keep scrapes out of stderr
+    def log_message(self, format, *args):
+        pass
+
+
+#
+# @Prototype
+#   Function: startMetricsServer()
+#   Example:  startMetricsServer( metrics, 9105 )
+#
+# @Purpose
+#   This function starts a local HTTP server in a daemon thread that
+#   exposes the given metrics on /metrics and returns the server so the
+#   caller can shutdown() it.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       metrics  : ParserMetrics object to expose
+#       port     : TCP port to listen on, 0 picks a free port
+#       host_str : Address to bind, local only by default
+#   Output:
+#       server : Running ThreadingHTTPServer, server.server_address holds
+#                the bound address
+#
+def startMetricsServer(metrics, port = 9105, host_str = '127.0.0.1'):
+    server = ThreadingHTTPServer((host_str, port), MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+
+    thread = Thread(target = server.serve_forever, daemon = True)
+    thread.start()
+
+    return server
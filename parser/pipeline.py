@@ -0,0 +1,229 @@
+import sys
+
+from . import readLogBatches
+from .executor import batchLines, mapBatches
+from .export import CSVSink, JSONLSink
+from .sqlite import SQLiteSink
+
+#
+# @Class
+#   StageBatch
+#
+# @Initialization Prototype
+#   StageBatch( parser, stage_list )
+#
+# @Purpose
+#   The work a Pipeline does on one batch of lines, parsing them and
+#   running its stages.  Consecutive filter and enrich stages are fused
+#   into one pass over the batch, so no list is built between them.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   parser     : Parser of the pipeline
+#   group_list : ('batch', func) for batch stages and ('record', [(is_filter,
+#                func), ...]) for each run of fused record stages
+#
+# @Class Methods
+#   __call__(line_list) : (log_list, error_cnt) of a batch of lines
+#
+# @Notes
+#   Picklable as long as the stage functions are, so it can be sent once
+#   to each worker of a process pool.
+#
+class StageBatch:
+    def __init__(self, parser, stage_list):
+        self.parser = parser
+        self.group_list = []
+
+        for (kind_str, func) in stage_list:
+            if kind_str == 'batch':
+                self.group_list.append( ('batch', func) )
+
+            elif self.group_list and self.group_list[-1][0] == 'record':
+                self.group_list[-1][1].append( (kind_str == 'filter', func) )
+
+            else:
+                self.group_list.append( ('record',
+                    [(kind_str == 'filter', func)]) )
+
+    def __call__(self, line_list):
+        log_list = self.parser.parseBatch(line_list)
+        error_cnt = len(line_list) - len(log_list)
+
+        for (kind_str, stage) in self.group_list:
+            if kind_str == 'batch':
+                log_list = stage(log_list)
+                continue
+
+            kept_list = []
+
+            for log in log_list:
+                for (is_filter, func) in stage:
+                    if is_filter:
+                        if not func(log):
+                            break
+                    else:
+                        log = func(log)
+
+                        if log is None:
+                            break
+                else:
+                    kept_list.append(log)
+
+            log_list = kept_list
+
+        return (log_list, error_cnt)
+
+
+#
+# @Class
+#   Pipeline
+#
+# @Initialization Prototype
+#   Pipeline( parser )
+#   Pipeline( parser, 4096, metrics )
+#
+# @Purpose
+#   Chains a line source, the Parser, filter and enrich stages, observers
+#   and a sink, passing batches of logs from one to the next.  The same
+#   pipeline can be run serially, on a thread pool or on a process pool.
+#
+#   Pipeline(parser).fromFile('access.log') \
+#       .filter(lambda log : log.last_request_time_int == 404) \
+#       .toJSONL('404.jsonl').run()
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   parser        : Parser of the log format
+#   batch_size    : Lines per batch
+#   metrics       : Optional ParserMetrics
+#   source_func   : Function returning an iterator of line batches
+#   stage_list    : (kind, func) of each stage, kind being 'filter',
+#                   'enrich' or 'batch'
+#   observer_list : Observers fed every log that gets through the stages
+#   sink_func     : Function returning a new sink
+#
+# @Class Methods
+#   fromFile(file_path, follow, poll_interval) : Read a log file
+#   fromStdin()                 : Read standard input
+#   fromLines(line_iter)        : Read an iterable of lines
+#   filter(func)                : Keep the logs func returns true for
+#   enrich(func)                : Replace each log by func(log), dropping
+#                                 it when that is None
+#   mapBatch(func)              : Replace each list of logs by func(list)
+#   observe(observer)           : Call observer.observe on every log
+#   toJSONL(file_path)          : Write JSON lines
+#   toCSV(file_path)            : Write CSV
+#   toSQLite(db_path, table_str, index_list) : Load into SQLite
+#   to(sink_func)               : Write to sink_func(), any object with
+#                                 write(log) and close()
+#   batches(backend_str, worker_cnt) : Generator of the lists of logs that
+#                                      get through the stages
+#   run(backend_str, worker_cnt): Feed the sink, returns the logs written
+#
+# @Notes
+#   Every method but batches and run returns the pipeline for chaining.
+#   Stages run on the workers so for the process backend they have to be
+#   picklable, module level functions rather than lambdas.  Observers and
+#   the sink always run in the calling thread.
+#
+class Pipeline:
+    def __init__(self, parser, batch_size = 1024, metrics = None):
+        self.parser = parser
+        self.batch_size = batch_size
+        self.metrics = metrics
+        self.source_func = None
+        self.stage_list = []
+        self.observer_list = []
+        self.sink_func = None
+
+    def fromFile(self, file_path, follow = False, poll_interval = 1.0):
+        self.source_func = lambda : readLogBatches(file_path, follow,
+            self.batch_size, poll_interval, self.metrics)
+        return self
+
+    def fromStdin(self):
+        self.source_func = lambda : batchLines(sys.stdin.buffer,
+            self.batch_size)
+        return self
+
+    def fromLines(self, line_iter):
+        self.source_func = lambda : batchLines(line_iter, self.batch_size)
+        return self
+
+    def filter(self, func):
+        self.stage_list.append( ('filter', func) )
+        return self
+
+    def enrich(self, func):
+        self.stage_list.append( ('enrich', func) )
+        return self
+
+    def mapBatch(self, func):
+        self.stage_list.append( ('batch', func) )
+        return self
+
+    def observe(self, observer):
+        self.observer_list.append(observer)
+        return self
+
+    def toJSONL(self, file_path):
+        return self.to(lambda : JSONLSink(file_path, self.parser))
+
+    def toCSV(self, file_path):
+        return self.to(lambda : CSVSink(file_path, self.parser))
+
+    def toSQLite(self, db_path, table_str = 'access_log', index_list = None):
+        return self.to(lambda : SQLiteSink(db_path, self.parser, table_str,
+            index_list = index_list))
+
+    def to(self, sink_func):
+        self.sink_func = sink_func
+        return self
+
+    def batches(self, backend_str = 'serial', worker_cnt = None):
+        if self.source_func is None:
+            raise ValueError('The pipeline has no source')
+
+        stage_batch = StageBatch(self.parser, self.stage_list)
+
+        for (line_list, (log_list, error_cnt), seconds) in mapBatches(
+                stage_batch, self.source_func(), backend_str, worker_cnt,
+                self.metrics):
+            if self.metrics is not None:
+                self.metrics.recordBatch(len(line_list) - error_cnt,
+                    error_cnt, seconds)
+
+            for observer in self.observer_list:
+                for log in log_list:
+                    observer.observe(log)
+
+            yield log_list
+
+    def __iter__(self):
+        for log_list in self.batches():
+            yield from log_list
+
+    def run(self, backend_str = 'serial', worker_cnt = None):
+        if self.sink_func is None:
+            raise ValueError('The pipeline has no sink')
+
+        sink = self.sink_func()
+        write_cnt = 0
+
+        try:
+            for log_list in self.batches(backend_str, worker_cnt):
+                for log in log_list:
+                    sink.write(log)
+
+                write_cnt += len(log_list)
+        finally:
+            sink.close()
+
+        return write_cnt
@@ -0,0 +1,855 @@
+from datetime import datetime, timezone
+from operator import itemgetter
+import argparse
+import operator
+import os
+import re
+import sys
+
+from . import (MultiParser, Parser, engine_reason_dict, fieldGetter,
+    format_dict, readRange)
+from .bloom import BloomIndex
+from .executor import mapBatches
+from .export import CSVSink, JSONLSink
+from .extsort import TimeKey, no_time_key
+from .groupby import GroupBy
+
+#
+# WHERE predicate, a field, an operator and a value
+#
+predicate_re = re.compile(r'^\s*([\w.]+)\s*(==|!=|<=|>=|=|<|>|~)\s*(.*?)\s*$')
+
+op_dict = {
+    '='  : operator.eq,
+    '==' : operator.eq,
+    '!=' : operator.ne,
+    '<'  : operator.lt,
+    '<=' : operator.le,
+    '>'  : operator.gt,
+    '>=' : operator.ge
+}
+
+#
+# Bytes of input past which the planner runs on every CPU
+#
+parallel_threshold = 64 << 20
+
+#
+# Seconds of disorder tolerated when seeking by time in a log file
+#
+seek_slack = 300
+
+#
+# Bisection stops once the time boundary is known to within this many bytes
+#
+seek_block = 64 << 10
+
+#
+# Evenly spaced offsets whose times are checked before a file is bisected
+#
+seek_sample_cnt = 64
+
+#
+# Columns of a GROUP BY result after the group value
+#
+group_column_list = [
+    ('count', int),
+    ('byte_sum', int),
+    ('min_request_time', int),
+    ('max_request_time', int),
+    ('avg_request_time', float)
+]
+
+#
+# Fields computed from the request line or %U that a query can use on top
+# of those of Parser.fieldList(), as (name, field they are computed from,
+# fieldGetter path)
+#
+derived_field_list = [
+    ('path_str', 'request_URI_str', 'http_line.path_str'),
+    ('decoded_path_str', 'request_URI_str', 'http_line.decoded_path_str'),
+    ('decoded_url_path_str', 'url_path_str', 'decoded_url_path_str')
+]
+
+#
+# Prefix of the fields naming one query string parameter, query.page
+# being the first value of the page parameter
+#
+query_prefix_str = 'query.'
+
+#
+# @Prototype
+#   Function: queryFieldDict()
+#   Example:  queryFieldDict( parser )
+#
+# @Purpose
+#   This function returns the fields a query can select, filter and group
+#   on, the fields of parser.fieldList() and the derived_field_list fields
+#   its format can compute, as name -> (type, getter)
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def queryFieldDict(parser):
+    field_dict = dict((entry[0], (entry[1], entry[2]))
+        for entry in parser.fieldList())
+
+    for (name_str, source_str, path_str) in derived_field_list:
+        if source_str in field_dict and name_str not in field_dict:
+            field_dict[name_str] = (str, fieldGetter(path_str))
+
+    return field_dict
+
+
+#
+# @Prototype
+#   Function: fieldEntry()
+#   Example:  fieldEntry( 'query.page', field_dict )
+#
+# @Purpose
+#   This function returns the (type, getter) of a field of queryFieldDict,
+#   or of a query.name parameter field when the format logs the request
+#   line or %q
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Raises ValueError for a field the format doesn't have.
+#
+def fieldEntry(name_str, field_dict):
+    entry = field_dict.get(name_str)
+
+    if entry is not None:
+        return entry
+
+    if name_str.startswith(query_prefix_str):
+        param_str = name_str[len(query_prefix_str):]
+
+        if 'request_URI_str' in field_dict:
+            dict_func = fieldGetter('http_line.query_dict')
+        elif 'query_str' in field_dict:
+            dict_func = fieldGetter('query_dict')
+        else:
+            dict_func = None
+
+        if param_str and dict_func is not None:
+            def getParam(log):
+                value_tuple = (dict_func(log) or {}).get(param_str)
+
+                return value_tuple[0] if value_tuple else None
+
+            return (str, getParam)
+
+    raise ValueError('Unknown field %r, the format has %s' % (name_str,
+        ', '.join(field_dict)))
+
+
+#
+# @Prototype
+#   Function: parseTimeArg()
+#   Example:  parseTimeArg( '2024-05-01T00:00:00+02:00' )
+#             parseTimeArg( '1714514400' )
+#
+# @Purpose
+#   This function returns the epoch seconds of a command line time, epoch
+#   seconds or ISO 8601, naive times being UTC
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def parseTimeArg(time_str):
+    if time_str is None:
+        return None
+
+    if re.match(r'^-?\d+$', time_str):
+        return int(time_str)
+
+    time = datetime.fromisoformat(time_str)
+
+    if time.tzinfo is None:
+        time = time.replace(tzinfo = timezone.utc)
+
+    return int(time.timestamp())
+
+
+#
+# @Prototype
+#   Function: parsePredicate()
+#   Example:  parsePredicate( 'last_request_time_int>=500', field_dict )
+#
+# @Purpose
+#   This function returns (name, operator, value) of a WHERE predicate,
+#   the value converted to the type of the field
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       predicate_str : 'field op value', op being one of = == != < <= > >=
+#                       or ~ for a regular expression search
+#       field_dict    : queryFieldDict() of the format
+#   Output:
+#       (name_str, op_str, value)
+#
+#   Raises ValueError for a malformed predicate or an unknown field.
+#
+def parsePredicate(predicate_str, field_dict):
+    match = predicate_re.match(predicate_str)
+
+    if match is None:
+        raise ValueError('Malformed predicate %r' % predicate_str)
+
+    (name_str, op_str, value_str) = match.groups()
+    field_type = fieldEntry(name_str, field_dict)[0]
+
+    if len(value_str) >= 2 and value_str[0] == value_str[-1] \
+            and value_str[0] in '"\'':
+        value_str = value_str[1:-1]
+
+    if op_str == '~':
+        re.compile(value_str)
+        return (name_str, op_str, value_str)
+
+    if field_type is int:
+        return (name_str, op_str, int(value_str))
+
+    if field_type is datetime:
+        return (name_str, op_str, datetime.fromtimestamp(
+            parseTimeArg(value_str), timezone.utc))
+
+    return (name_str, op_str, value_str)
+
+
+#
+# @Class
+#   QueryBatch
+#
+# @Initialization Prototype
+#   QueryBatch( parser, where_list, name_list, group_str, start_epoch,
+#       end_epoch )
+#
+# @Purpose
+#   The work of a query on one batch of raw lines.  Predicates are pushed
+#   down below the parse: lines outside the time range, found from the raw
+#   time without parsing, and lines missing the literal of an equality
+#   predicate are dropped before Parser.parse is called.  Only the
+#   projected and tested fields of a parsed log are ever decoded.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   parser      : Parser or MultiParser of the formats
+#   where_list  : (name, operator, value) predicates
+#   name_list   : Projected field names
+#   group_str   : GROUP BY field name or None
+#   start_epoch : Start of the time range or None
+#   end_epoch   : End of the time range or None
+#   time_key    : TimeKey of the parser, None without a time range
+#   needle_list : Bytes every matching line must contain
+#   test_list   : (getter, test) of each predicate, built on first use
+#   get_list    : Getters of the projected fields, built on first use
+#   group_get   : Getter of the GROUP BY field, built on first use
+#
+# @Class Methods
+#   __call__(line_list) : (rows or group dict, parsed count, error count)
+#
+# @Notes
+#   The getters are rebuilt after unpickling so the batch can be sent to
+#   process pool workers.
+#
+class QueryBatch:
+    def __init__(self, parser, where_list, name_list, group_str = None,
+            start_epoch = None, end_epoch = None):
+        self.parser = parser
+        self.where_list = where_list
+        self.name_list = name_list
+        self.group_str = group_str
+        self.start_epoch = start_epoch
+        self.end_epoch = end_epoch
+        self.time_key = None if start_epoch is None and end_epoch is None \
+            else TimeKey(parser)
+        self.test_list = None
+        self.get_list = None
+        self.group_get = None
+
+        self.needle_list = []
+        raw_name_set = set(entry[0] for entry in parser.fieldList())
+
+        # Values that would be escaped in the log, or are decoded from it,
+        # can't be matched raw
+        for (name_str, op_str, value) in where_list:
+            if name_str not in raw_name_set:
+                continue
+
+            if op_str in ('=', '==') and isinstance(value, str) and value \
+                    and value.isprintable() and '"' not in value \
+                    and '\\' not in value:
+                try:
+                    self.needle_list.append(value.encode(parser.encoding))
+                except UnicodeEncodeError:
+                    pass
+
+    def __getstate__(self):
+        state_dict = self.__dict__.copy()
+        state_dict['test_list'] = None
+        state_dict['get_list'] = None
+        state_dict['group_get'] = None
+
+        return state_dict
+
+    def prepare(self):
+        field_dict = queryFieldDict(self.parser)
+        getter = lambda name_str : fieldEntry(name_str, field_dict)[1]
+
+        self.test_list = []
+
+        for (name_str, op_str, value) in self.where_list:
+            if op_str == '~':
+                test_func = re.compile(value).search
+            else:
+                test_func = (lambda op_func, value : lambda found :
+                    op_func(found, value))(op_dict[op_str], value)
+
+            self.test_list.append( (getter(name_str), test_func) )
+
+        self.get_list = [getter(name_str) for name_str in self.name_list]
+        self.group_get = getter(self.group_str) if self.group_str else None
+
+    def __call__(self, line_list):
+        if self.test_list is None:
+            self.prepare()
+
+        parse_func = self.parser.parse
+        needle_list = self.needle_list
+        time_key = self.time_key
+        start_epoch = -no_time_key if self.start_epoch is None \
+            else self.start_epoch
+        end_epoch = no_time_key - 1 if self.end_epoch is None \
+            else self.end_epoch
+
+        row_list = []
+        group = GroupBy(self.group_str, float('inf')) if self.group_str \
+            else None
+        parsed_cnt = 0
+        error_cnt = 0
+
+        for line in line_list:
+            if needle_list and not all(needle in line
+                    for needle in needle_list):
+                continue
+
+            if time_key is not None and not start_epoch <= time_key(line) \
+                    <= end_epoch:
+                continue
+
+            try:
+                log = parse_func(line)
+            except (IndexError, KeyError, ValueError):
+                error_cnt += 1
+                continue
+
+            parsed_cnt += 1
+
+            for (get_func, test_func) in self.test_list:
+                found = get_func(log)
+
+                if found is None or not test_func(found):
+                    break
+            else:
+                if group is not None:
+                    group.update(self.group_get(log), log)
+                else:
+                    row_list.append(tuple(get_func(log)
+                        for get_func in self.get_list))
+
+        if group is not None:
+            return (group.group_dict, parsed_cnt, error_cnt)
+
+        return (row_list, parsed_cnt, error_cnt)
+
+
+#
+# @Prototype
+#   Function: lineStart()
+#   Example:  lineStart( log_file, offset )
+#
+# @Purpose
+#   This function returns the offset of the first line starting at or
+#   after offset of an open binary file
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def lineStart(log_file, offset):
+    if offset == 0:
+        return 0
+
+    log_file.seek(offset - 1)
+    log_file.readline()
+
+    return log_file.tell()
+
+
+#
+# @Prototype
+#   Function: timeAt()
+#   Example:  timeAt( log_file, offset, TimeKey(parser) )
+#
+# @Purpose
+#   This function returns the epoch seconds of the first line with a time
+#   at or after offset, or no_time_key at the end of the file
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def timeAt(log_file, offset, key_func):
+    log_file.seek(lineStart(log_file, offset))
+
+    for j in range(16):
+        line = log_file.readline()
+
+        if not line:
+            break
+
+        key = key_func(line)
+
+        if key != no_time_key:
+            return key
+
+    return no_time_key
+
+
+#
+# @Prototype
+#   Function: timeOrdered()
+#   Example:  timeOrdered( 'access.log', TimeKey(parser) )
+#
+# @Purpose
+#   This function returns whether a log file looks time ordered enough to
+#   bisect, no time at seek_sample_cnt evenly spaced offsets being more
+#   than seek_slack seconds older than a time before it
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def timeOrdered(file_path, key_func):
+    with open(file_path, 'rb') as log_file:
+        size = os.fstat(log_file.fileno()).st_size
+        latest = None
+
+        for j in range(seek_sample_cnt):
+            key = timeAt(log_file, size * j // seek_sample_cnt, key_func)
+
+            if key == no_time_key:
+                continue
+
+            if latest is not None and key < latest - seek_slack:
+                return False
+
+            latest = key if latest is None else max(latest, key)
+
+    return True
+
+
+#
+# @Prototype
+#   Function: seekTime()
+#   Example:  seekTime( 'access.log', 1714514400, TimeKey(parser) )
+#
+# @Purpose
+#   This function bisects a time ordered log file and returns the offsets
+#   (lo, hi) of two line starts, every line before lo being older than
+#   epoch and every line from hi on at least as recent, hi - lo being
+#   about seek_block bytes
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def seekTime(file_path, epoch, key_func):
+    with open(file_path, 'rb') as log_file:
+        lo = 0
+        hi = os.path.getsize(file_path)
+
+        while hi - lo > seek_block:
+            mid = (lo + hi) // 2
+
+            if timeAt(log_file, mid, key_func) < epoch:
+                lo = mid
+            else:
+                hi = mid
+
+        return (lineStart(log_file, lo), lineStart(log_file, hi))
+
+
+#
+# @Class
+#   QueryPlan
+#
+# @Initialization Prototype
+#   QueryPlan( parser, path_list, where_list, start_epoch, end_epoch,
+#       index_path, worker_cnt, seek )
+#
+# @Purpose
+#   Picks the byte ranges of each file to read and how to run the query.
+#   A file with a Bloom index is cut down to the chunks whose time range
+#   and, for an equality predicate on an indexed field, whose filter may
+#   match.  Without an index a time range is found by bisecting the file,
+#   logs being written mostly in time order, unless sampling the file
+#   finds it out of order, see timeOrdered(), when it is scanned in full.
+#   Inputs past parallel_threshold run on a process pool.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   range_list  : (file_path, offset, end) to read
+#   step_list   : Description of each decision, for --explain
+#   byte_cnt    : Bytes of the inputs
+#   read_cnt    : Bytes planned to be read
+#   worker_cnt  : Processes to run on
+#   backend_str : mapBatches backend
+#
+class QueryPlan:
+    def __init__(self, parser, path_list, where_list, start_epoch = None,
+            end_epoch = None, index_path = None, worker_cnt = None,
+            seek = True):
+        self.range_list = []
+        self.step_list = []
+        self.byte_cnt = 0
+
+        index = BloomIndex(index_path) if index_path else None
+        time_key = None
+
+        for file_path in path_list:
+            size = os.path.getsize(file_path)
+            self.byte_cnt += size
+
+            if index is not None and file_path in index.file_dict:
+                (field_str, value) = indexPredicate(
+                    index.file_dict[file_path]['field_list'], where_list)
+
+                index.newStats()
+
+                for (offset, end, tested) in index.candidateRanges(
+                        file_path, field_str, value, start_epoch, end_epoch):
+                    self.range_list.append( (file_path, offset, end) )
+
+                self.step_list.append('%s: index on %s, %d of %d chunks, '
+                    '%d of %d bytes skipped' % (file_path, field_str or 'time',
+                    index.stat_dict['candidate_cnt'],
+                    index.stat_dict['chunk_cnt'],
+                    index.stat_dict['skipped_byte_cnt'], size))
+
+            elif seek and (start_epoch is not None or end_epoch is not None):
+                offset = 0
+                end = size
+
+                if time_key is None:
+                    time_key = TimeKey(parser)
+
+                if not timeOrdered(file_path, time_key):
+                    self.range_list.append( (file_path, 0, size) )
+                    self.step_list.append('%s: times out of order, full '
+                        'scan of %d bytes' % (file_path, size))
+                    continue
+
+                if start_epoch is not None:
+                    offset = seekTime(file_path, start_epoch - seek_slack,
+                        time_key)[0]
+
+                if end_epoch is not None:
+                    end = seekTime(file_path, end_epoch + seek_slack + 1,
+                        time_key)[1]
+
+                if end > offset:
+                    self.range_list.append( (file_path, offset, end) )
+
+                self.step_list.append('%s: time seek, bytes %d to %d of %d'
+                    % (file_path, offset, end, size))
+
+            else:
+                self.range_list.append( (file_path, 0, size) )
+                self.step_list.append('%s: full scan of %d bytes'
+                    % (file_path, size))
+
+        self.read_cnt = sum(entry[2] - entry[1] for entry in self.range_list)
+
+        if worker_cnt is None:
+            worker_cnt = (os.cpu_count() or 1) \
+                if self.read_cnt >= parallel_threshold else 1
+
+        self.worker_cnt = worker_cnt
+        self.backend_str = 'process' if worker_cnt > 1 else 'serial'
+
+        self.step_list.append('%d of %d bytes to read on %d %s' % (
+            self.read_cnt, self.byte_cnt, worker_cnt,
+            'workers' if worker_cnt > 1 else 'worker'))
+
+    def batches(self, batch_size):
+        for (file_path, offset, end) in self.range_list:
+            yield from readRange(file_path, offset, end, batch_size)
+
+
+#
+# @Prototype
+#   Function: indexPredicate()
+#   Example:  indexPredicate( ['remote_host_str'], where_list )
+#
+# @Purpose
+#   This function returns (field_str, value) of the first equality
+#   predicate on an indexed field, or (None, None).  Index fields may be
+#   dotted, 'http_line.request_URI_str' matching request_URI_str.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def indexPredicate(index_field_list, where_list):
+    for (name_str, op_str, value) in where_list:
+        if op_str not in ('=', '=='):
+            continue
+
+        for field_str in index_field_list:
+            if field_str.split('.')[-1] == name_str:
+                return (field_str, value)
+
+    return (None, None)
+
+
+#
+# @Prototype
+#   Function: formatCell()
+#   Example:  formatCell( value )
+#
+# @Purpose
+#   This function returns the text of a value in table output
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def formatCell(value):
+    if value is None:
+        return '-'
+
+    if isinstance(value, datetime):
+        return value.isoformat()
+
+    if isinstance(value, float):
+        return '%d' % value if value.is_integer() else '%.2f' % value
+
+    return str(value)
+
+
+#
+# @Prototype
+#   Function: writeTable()
+#   Example:  writeTable( name_list, row_list, sys.stdout )
+#
+# @Purpose
+#   This function writes rows as a table with aligned columns
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def writeTable(name_list, row_list, out_file):
+    cell_list = [[formatCell(value) for value in row] for row in row_list]
+    width_list = [max([len(name_str)] + [len(cells[j]) for cells in cell_list])
+        for (j, name_str) in enumerate(name_list)]
+
+    out_file.write('  '.join(name_str.ljust(width) for (name_str, width)
+        in zip(name_list, width_list)).rstrip() + '\n')
+    out_file.write('  '.join('-' * width for width in width_list) + '\n')
+
+    for cells in cell_list:
+        out_file.write('  '.join(cell.ljust(width) for (cell, width)
+            in zip(cells, width_list)).rstrip() + '\n')
+
+
+#
+# @Prototype
+#   Function: main()
+#   Example:  python -m parser -f combined --where last_request_time_int=404 \
+#                 --group-by request_URI_str access.log
+#
+# @Purpose
+#   This function is the query command line tool
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def main(arg_list = None):
+    arg_parser = argparse.ArgumentParser(prog = 'python -m parser',
+        description = 'Query Apache log files')
+    arg_parser.add_argument('-f', '--format', action = 'append',
+        help = 'LogFormat string or one of %s, combined by default.  '
+               'Repeat for files mixing formats' % ', '.join(format_dict))
+    arg_parser.add_argument('--encoding', default = 'utf-8')
+    arg_parser.add_argument('-s', '--select',
+        help = 'Comma separated fields to output, all by default.  Besides '
+               'the fields of the format, path_str, decoded_path_str, '
+               'decoded_url_path_str and query.NAME, the first value of a '
+               'query parameter, can be selected, filtered and grouped on')
+    arg_parser.add_argument('-w', '--where', action = 'append', default = [],
+        help = "Predicate such as 'last_request_time_int>=500', repeatable")
+    arg_parser.add_argument('--since', help = 'Epoch seconds or ISO 8601')
+    arg_parser.add_argument('--until', help = 'Epoch seconds or ISO 8601')
+    arg_parser.add_argument('-g', '--group-by')
+    arg_parser.add_argument('--limit', type = int)
+    arg_parser.add_argument('-o', '--output', default = 'table',
+        choices = ['table', 'jsonl', 'csv'])
+    arg_parser.add_argument('--index', help = 'Bloom index of the files')
+    arg_parser.add_argument('--workers', type = int)
+    arg_parser.add_argument('--no-seek', action = 'store_true',
+        help = 'Do not bisect files on time, files found out of order are '
+               'scanned in full anyway')
+    arg_parser.add_argument('--memory', type = int, default = 256 << 20,
+        help = 'GROUP BY memory budget in bytes')
+    arg_parser.add_argument('--engine', default = 'auto',
+        choices = ['auto', 'calibrate'] + list(engine_reason_dict),
+        help = 'How lines are split, calibrate times the engines on the '
+               'first lines of the first file')
+    arg_parser.add_argument('--max-line-len', type = int,
+        help = 'Lines longer than this are parse errors')
+    arg_parser.add_argument('--max-field-len', type = int,
+        help = 'Values longer than this are parse errors')
+    arg_parser.add_argument('--truncate', action = 'store_true',
+        help = 'Cut long lines and string values instead')
+    arg_parser.add_argument('--explain', action = 'store_true')
+    arg_parser.add_argument('--stats', action = 'store_true')
+    arg_parser.add_argument('file_path', nargs = '+')
+
+    args = arg_parser.parse_args(arg_list)
+
+    format_list = [format_dict.get(format_str, format_str)
+        for format_str in args.format or ['combined']]
+
+    limit_dict = { 'max_line_len' : args.max_line_len,
+        'max_field_len' : args.max_field_len,
+        'overflow_mode' : 'truncate' if args.truncate else 'reject' }
+
+    try:
+        if len(format_list) > 1:
+            if args.engine != 'auto':
+                raise ValueError('--engine needs a single --format')
+
+            parser = MultiParser(format_list, args.encoding, **limit_dict)
+        else:
+            parser = Parser(format_list[0], args.encoding, engine = 'auto'
+                if args.engine == 'calibrate' else args.engine, **limit_dict)
+    except ValueError as error:
+        arg_parser.error(str(error))
+
+    if args.engine == 'calibrate':
+        parser.calibrateFile(args.file_path[0])
+
+    field_dict = queryFieldDict(parser)
+
+    try:
+        name_list = args.select.split(',') if args.select \
+            else [entry[0] for entry in parser.fieldList()]
+
+        for name_str in name_list + ([args.group_by] if args.group_by else []):
+            fieldEntry(name_str, field_dict)
+
+        where_list = [parsePredicate(predicate_str, field_dict)
+            for predicate_str in args.where]
+        start_epoch = parseTimeArg(args.since)
+        end_epoch = parseTimeArg(args.until)
+
+        # Raises for a format without a %t to range on
+        if start_epoch is not None or end_epoch is not None:
+            TimeKey(parser)
+    except ValueError as error:
+        arg_parser.error(str(error))
+
+    plan = QueryPlan(parser, args.file_path, where_list, start_epoch,
+        end_epoch, args.index, args.workers, not args.no_seek)
+
+    if args.explain:
+        print('%s engine, %s' % (parser.engine, parser.engine_reason))
+
+        for step_str in plan.step_list:
+            print(step_str)
+        return
+
+    query_batch = QueryBatch(parser, where_list, name_list, args.group_by,
+        start_epoch, end_epoch)
+    batch_iter = mapBatches(query_batch, plan.batches(4096), plan.backend_str,
+        plan.worker_cnt)
+
+    parsed_cnt = 0
+    error_cnt = 0
+
+    if args.group_by:
+        group = GroupBy(args.group_by, args.memory)
+
+        for (line_list, (group_dict, batch_parsed, batch_errors), seconds) \
+                in batch_iter:
+            parsed_cnt += batch_parsed
+            error_cnt += batch_errors
+
+            for (key, state) in group_dict.items():
+                group.mergeGroup(key, state)
+
+        row_list = sorted(((key,) + tuple(stat_dict[entry[0]]
+            for entry in group_column_list)
+            for (key, stat_dict) in group.results()),
+            key = lambda row : -row[1])[:args.limit]
+
+        out_list = [(args.group_by, fieldEntry(args.group_by,
+            field_dict)[0])] \
+            + group_column_list
+    else:
+        out_list = [(name_str, fieldEntry(name_str, field_dict)[0])
+            for name_str in name_list]
+
+        def rowIter():
+            nonlocal parsed_cnt, error_cnt
+            row_cnt = 0
+
+            for (line_list, (batch_rows, batch_parsed, batch_errors),
+                    seconds) in batch_iter:
+                parsed_cnt += batch_parsed
+                error_cnt += batch_errors
+
+                for row in batch_rows:
+                    if args.limit is not None and row_cnt >= args.limit:
+                        batch_iter.close()
+                        return
+
+                    row_cnt += 1
+                    yield row
+
+        row_list = rowIter()
+
+    if args.output == 'table':
+        writeTable([entry[0] for entry in out_list], list(row_list),
+            sys.stdout)
+    else:
+        sink_class = JSONLSink if args.output == 'jsonl' else CSVSink
+
+        with sink_class('-', None, field_list = [(name_str, field_type,
+                itemgetter(j)) for (j, (name_str, field_type))
+                in enumerate(out_list)]) as sink:
+            sink.writeLogs(row_list)
+
+    if args.stats:
+        print('%d logs parsed, %d parse errors, %d of %d bytes read'
+            % (parsed_cnt, error_cnt, plan.read_cnt, plan.byte_cnt),
+            file = sys.stderr)
@@ -0,0 +1,112 @@
+from random import Random
+from zlib import crc32
+
+#
+# @Prototype
+#   Function: sampleThreshold()
+#   Example:  sampleThreshold( 0.02 )
+#
+# @Purpose
+#   This function turns a sample rate into the crc32 value below which a
+#   raw line is kept by hashSample
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       sample_rate : Fraction of lines to keep, 0 < sample_rate <= 1
+#   Output:
+#       threshold : Integer threshold for the 32 bit line hash
+#
+def sampleThreshold(sample_rate):
+    if not 0 < sample_rate <= 1:
+        raise ValueError('sample_rate must be in (0, 1], got %r' % sample_rate)
+
+    return int(sample_rate * 0x100000000)
+
+
+#
+# @Prototype
+#   Function: hashSample()
+#   Example:  hashSample( line_list, threshold )
+#
+# @Purpose
+#   This function returns the raw lines whose crc32 is below threshold.
+#   The decision only looks at the raw line so it is made before any
+#   parsing, and the same line is sampled the same way in every process.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       line_list : List of str or bytes lines
+#       threshold : Value from sampleThreshold
+#   Output:
+#       List of the sampled lines
+#
+def hashSample(line_list, threshold):
+    sample_list = []
+
+    for line in line_list:
+        if type(line) is str:
+            line_hash = crc32(line.encode('utf-8', 'surrogateescape'))
+        else:
+            line_hash = crc32(line)
+
+        if line_hash < threshold:
+            sample_list.append(line)
+
+    return sample_list
+
+
+#
+# @Prototype
+#   Function: reservoirSample()
+#   Example:  reservoirSample( line_iter, 1000 )
+#             reservoirSample( line_iter, 1000, 42 )
+#
+# @Purpose
+#   This function keeps a uniform random sample of sample_size raw lines
+#   out of line_iter, reservoir sampling algorithm R, and returns it with
+#   the weight each sampled line stands for
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       line_iter   : Iterable of raw lines, consumed completely
+#       sample_size : Number of lines to keep
+#       seed        : Optional seed for a repeatable sample
+#   Output:
+#       (sample_list, weight) : The sampled lines and the number of lines
+#                               seen divided by the number kept
+#
+def reservoirSample(line_iter, sample_size, seed = None):
+    if sample_size < 1:
+        raise ValueError('sample_size must be at least 1, got %r' % sample_size)
+
+    rand = Random(seed)
+    sample_list = []
+    seen_cnt = 0
+
+    for line in line_iter:
+        seen_cnt += 1
+
+        if seen_cnt <= sample_size:
+            sample_list.append(line)
+        else:
+            j = rand.randrange(seen_cnt)
+
+            if j < sample_size:
+                sample_list[j] = line
+
+    if not sample_list:
+        return (sample_list, 1.0)
+
+    return (sample_list, seen_cnt / len(sample_list))
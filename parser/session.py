@@ -0,0 +1,196 @@
+from heapq import heapify, heappop, heappush
+
+#
+# @Class
+#   Session
+#
+# @Initialization Prototype
+#   Session( key, epoch, keep_logs )
+#
+# @Purpose
+#   One client session built by Sessionizer
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   key         : Session key, (remote host, User-Agent) by default
+#   start_epoch : Epoch seconds of the first request
+#   end_epoch   : Epoch seconds of the last request
+#   hit_cnt     : Number of requests, weighted by sample_weight
+#   byte_cnt    : Sum of the response sizes that were logged
+#   log_list    : The ApacheLog objects when Sessionizer keeps them,
+#                 otherwise None
+#   evicted     : True when the session was closed early to stay under
+#                 Sessionizer.max_open
+#
+# @Class Methods
+#   add(log, epoch) : Count one request of the session
+#   duration()      : Seconds between the first and last request
+#
+class Session:
+    def __init__(self, key, epoch, keep_logs):
+        self.key = key
+        self.start_epoch = epoch
+        self.end_epoch = epoch
+        self.hit_cnt = 0
+        self.byte_cnt = 0
+        self.log_list = [] if keep_logs else None
+        self.evicted = False
+
+    def add(self, log, epoch):
+        if epoch > self.end_epoch:
+            self.end_epoch = epoch
+
+        self.hit_cnt += log.sample_weight
+
+        byte_cnt = log.byte_count_nhclf_int
+
+        if byte_cnt is None:
+            byte_cnt = log.byte_count_nh_int
+
+        if byte_cnt is not None:
+            self.byte_cnt += byte_cnt
+
+        if self.log_list is not None:
+            self.log_list.append(log)
+
+    def duration(self):
+        return self.end_epoch - self.start_epoch
+
+
+#
+# @Prototype
+#   Function: defaultSessionKey()
+#   Example:  defaultSessionKey( log )
+#
+# @Purpose
+#   This function returns the default session key of a log, its remote
+#   host and its User-Agent header when the format logs one
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def defaultSessionKey(log):
+    return (log.remote_host_str, log.headers.get('User-Agent'))
+
+
+#
+# @Class
+#   Sessionizer
+#
+# @Initialization Prototype
+#   Sessionizer()
+#   Sessionizer( gap_seconds, max_open, key_func, keep_logs )
+#
+# @Purpose
+#   Groups ApacheLog objects arriving in time order into sessions, a new
+#   session starting whenever a key was idle for more than gap_seconds.
+#   Open sessions are kept in a min heap on their last request time so
+#   expired ones are found without scanning, and closed sessions are handed
+#   back as soon as they are known to be over.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   gap_seconds : Idle time that ends a session
+#   max_open    : Largest number of open sessions, the least recently
+#                 active ones are closed early past it
+#   key_func    : Function of an ApacheLog returning its session key
+#   keep_logs   : Keep the ApacheLog objects in Session.log_list
+#   open_dict   : Session key -> open Session
+#   heap_list   : Min heap of (end epoch, sequence, key), entries whose
+#                 epoch is older than their session's are stale
+#
+# @Class Methods
+#   feed(log)          : Add a log, returns the list of sessions it closed
+#   flush()            : Close and return every open session
+#   sessionize(log_iter) : Generator of closed sessions for a log stream,
+#                          flushing at its end
+#
+# @Notes
+#   Logs without a time are skipped.  Logs arriving slightly out of order
+#   are added to their session without moving it backwards.
+#
+class Sessionizer:
+    def __init__(self, gap_seconds = 1800, max_open = 100000,
+            key_func = defaultSessionKey, keep_logs = False):
+        self.gap_seconds = gap_seconds
+        self.max_open = max_open
+        self.key_func = key_func
+        self.keep_logs = keep_logs
+        self.open_dict = {}
+        self.heap_list = []
+        self.seq_int = 0
+
+    def feed(self, log):
+        if log.time is None:
+            return []
+
+        epoch = log.time.timestamp()
+        closed_list = self.expire(epoch)
+
+        key = self.key_func(log)
+        session = self.open_dict.get(key)
+
+        if session is None:
+            session = Session(key, epoch, self.keep_logs)
+            self.open_dict[key] = session
+
+        session.add(log, epoch)
+
+        self.seq_int += 1
+        heappush(self.heap_list, (session.end_epoch, self.seq_int, key))
+
+        if len(self.open_dict) > self.max_open:
+            session = self.popOldest()
+            session.evicted = True
+            closed_list.append(session)
+
+        # Drop stale heap entries once they outnumber the open sessions
+        if len(self.heap_list) > 2 * len(self.open_dict) + 1024:
+            self.heap_list = [(session.end_epoch, seq, key)
+                for (seq, (key, session)) in enumerate(self.open_dict.items())]
+            heapify(self.heap_list)
+
+        return closed_list
+
+    def expire(self, epoch):
+        closed_list = []
+
+        while self.heap_list and self.heap_list[0][0] + self.gap_seconds < epoch:
+            (end_epoch, seq, key) = heappop(self.heap_list)
+            session = self.open_dict.get(key)
+
+            if session is not None and session.end_epoch == end_epoch:
+                del self.open_dict[key]
+                closed_list.append(session)
+
+        return closed_list
+
+    def popOldest(self):
+        while True:
+            (end_epoch, seq, key) = heappop(self.heap_list)
+            session = self.open_dict.get(key)
+
+            if session is not None and session.end_epoch == end_epoch:
+                del self.open_dict[key]
+                return session
+
+    def flush(self):
+        closed_list = sorted(self.open_dict.values(), key = lambda x : x.end_epoch)
+
+        self.open_dict = {}
+        self.heap_list = []
+
+        return closed_list
+
+    def sessionize(self, log_iter):
+        for log in log_iter:
+            yield from self.feed(log)
+
+        yield from self.flush()
@@ -0,0 +1,394 @@
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+from queue import Empty
+import os
+import re
+import struct
+
+from . import fieldGetter
+
+#
+# Values written in a result record for a field that is None
+#
+no_status = 0xFFFF
+no_byte_cnt = -1
+no_time = -2 ** 63
+no_code = 0xFFFFFFFF
+
+#
+# Shortest line a block is sized for, a block never holds more than
+# block_size // min_line_size lines so its result slot can't overflow
+#
+min_line_size = 16
+
+newline_re = re.compile(b'\n')
+
+#
+# @Prototype
+#   Function: recordStruct()
+#   Example:  recordStruct( 2 )
+#
+# @Purpose
+#   This function returns the Struct of one result record, a parsed flag,
+#   the status, the response size, the epoch time and one string table
+#   code per string field
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def recordStruct(string_cnt):
+    return struct.Struct('<BHqq%dI' % string_cnt)
+
+
+#
+# @Prototype
+#   Function: blockEnd()
+#   Example:  blockEnd( chunk, at_eof, 262144 )
+#
+# @Purpose
+#   This function returns how many bytes of chunk go in the next block,
+#   whole lines only unless at_eof, and at most line_cap lines.  Returns 0
+#   when chunk holds no complete line.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def blockEnd(chunk, at_eof, line_cap):
+    end = len(chunk) if at_eof else chunk.rfind(b'\n') + 1
+
+    if chunk.count(b'\n', 0, end) + (0 if chunk.endswith(b'\n', 0, end) else 1) \
+            <= line_cap:
+        return end
+
+    end = 0
+
+    for j in range(line_cap):
+        end = chunk.index(b'\n', end) + 1
+
+    return end
+
+
+#
+# @Prototype
+#   Function: readBlocks()
+#   Example:  Run as the reader process by parseShared()
+#
+# @Purpose
+#   This function fills free blocks of the ring with whole lines of
+#   file_path and hands their (sequence, block, length) to the workers
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   A line longer than a block is replaced by an empty line so it is
+#   counted as a parse error without throwing off the lines after it.
+#
+def readBlocks(file_path, shm_name, block_size, line_cap, worker_cnt,
+        free_queue, task_queue):
+    shm = SharedMemory(shm_name)
+    seq = 0
+
+    try:
+        with open(file_path, 'rb') as log_file:
+            chunk = b''
+
+            while True:
+                data = log_file.read(block_size - len(chunk))
+                chunk += data
+
+                if not chunk:
+                    break
+
+                end = blockEnd(chunk, not data, line_cap)
+
+                if end == 0:
+                    # Skip the rest of the oversized line
+                    while b'\n' not in chunk:
+                        chunk = log_file.read(block_size)
+
+                        if not chunk:
+                            break
+
+                    chunk = chunk[chunk.find(b'\n') + 1:] if chunk else b''
+                    (block, end) = (b'\n', 1)
+                else:
+                    (block, chunk) = (chunk[:end], chunk[end:])
+
+                idx = free_queue.get()
+                shm.buf[idx * block_size : idx * block_size + end] = block
+                task_queue.put( (seq, idx, end) )
+                seq += 1
+    finally:
+        for j in range(worker_cnt):
+            task_queue.put(None)
+
+        shm.close()
+
+
+#
+# @Prototype
+#   Function: parseBlocks()
+#   Example:  Run as a worker process by parseShared()
+#
+# @Purpose
+#   This function parses the blocks handed out by readBlocks and writes
+#   one record per line in the result slot of the block.  Line ends are
+#   found on the shared block itself, so the only copy of a line is the
+#   one the parser makes of it.  Strings are interned in a table of the
+#   block, which is sent back with it, so memory stays bounded however
+#   many distinct values the file holds.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def parseBlocks(parser_class, parser_args, string_field_list, shm_name,
+        block_size, block_cnt, line_cap, task_queue, done_queue):
+    parser = parser_class(*parser_args)
+    shm = SharedMemory(shm_name)
+    buf = shm.buf
+
+    record_struct = recordStruct(len(string_field_list))
+    pack_into = record_struct.pack_into
+    error_tuple = (0, no_status, no_byte_cnt, no_time) + \
+        (no_code,) * len(string_field_list)
+
+    get_list = [fieldGetter(field_str) for field_str in string_field_list]
+
+    try:
+        while True:
+            task = task_queue.get()
+
+            if task is None:
+                break
+
+            (seq, idx, length) = task
+
+            pos = block_cnt * block_size + idx * line_cap * record_struct.size
+            code_dict = {}
+
+            with buf[idx * block_size : idx * block_size + length] as block:
+                end_list = [match.start() for match in
+                    newline_re.finditer(block)]
+
+                # The last line of the file may lack its newline
+                if not end_list or end_list[-1] != length - 1:
+                    end_list.append(length)
+
+                start = 0
+
+                for end in end_list:
+                    try:
+                        log = parser.parseBytes(block[start:end])
+                    except (IndexError, KeyError, ValueError):
+                        log = None
+
+                    start = end + 1
+
+                    packRecord(pack_into, buf, pos, log, get_list, code_dict,
+                        error_tuple)
+                    pos += record_struct.size
+
+            done_queue.put( (seq, idx, len(end_list), list(code_dict)) )
+    finally:
+        del buf
+        shm.close()
+        done_queue.put(None)
+
+
+#
+# @Prototype
+#   Function: packRecord()
+#   Example:  packRecord( pack_into, buf, pos, log, get_list, code_dict,
+#                         error_tuple )
+#
+# @Purpose
+#   This function writes the result record of one line at pos of buf,
+#   adding its strings to code_dict, and the failed record error_tuple
+#   when log is None or holds a value the record can't
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def packRecord(pack_into, buf, pos, log, get_list, code_dict, error_tuple):
+    if log is None:
+        pack_into(buf, pos, *error_tuple)
+        return
+
+    byte_cnt = log.byte_count_nhclf_int
+
+    if byte_cnt is None:
+        byte_cnt = log.byte_count_nh_int
+
+    status = log.last_request_time_int
+
+    # A value the record can't hold, such as a status of no_status or
+    # more, fails the line rather than the worker
+    if status is None:
+        status = no_status
+    elif status >= no_status:
+        pack_into(buf, pos, *error_tuple)
+        return
+
+    code_list = []
+
+    for get_func in get_list:
+        value = get_func(log)
+
+        if value is None:
+            code_list.append(no_code)
+            continue
+
+        code = code_dict.get(value)
+
+        if code is None:
+            code = len(code_dict)
+            code_dict[value] = code
+
+        code_list.append(code)
+
+    try:
+        pack_into(buf, pos, 1, status,
+            no_byte_cnt if byte_cnt is None else byte_cnt,
+            no_time if log.time is None else int(log.time.timestamp()),
+            *code_list)
+    except struct.error:
+        pack_into(buf, pos, *error_tuple)
+
+
+#
+# @Prototype
+#   Function: parseShared()
+#   Example:  parseShared( parser, 'access.log' )
+#             parseShared( parser, 'access.log', 8, ['remote_host_str'] )
+#
+# @Purpose
+#   This generator parses a log file on worker processes that share one
+#   block of memory with a reader process and the caller.  The reader
+#   fills a ring of large raw byte blocks, the workers parse their lines
+#   straight out of the shared blocks and write fixed layout records into
+#   the result slot of each block, so neither lines nor results are
+#   pickled, only the distinct strings of each block.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Notes:
+#   Input:
+#       parser            : Parser or MultiParser of the log format,
+#                               rebuilt in each worker from its
+#                               constructorArgs()
+#       file_path         : Log file to parse
+#       worker_cnt        : Number of workers, the number of CPUs by default
+#       string_field_list : Fields returned as strings, optionally dotted
+#       block_size        : Bytes per ring block
+#       block_cnt         : Blocks in the ring, two per worker by default
+#       poll_interval     : Seconds between checks that no process died
+#   Output:
+#       Generator of (parsed, status, byte_cnt, epoch, strings...) tuples in
+#       file order, one per line.  parsed is False for a line that failed
+#       to parse, values the line did not have are None.
+#
+#   A block is only handed back to the reader once its records were
+#   yielded, so the ring also bounds the memory spent on reordering.
+#
+#   A line whose values don't fit its record, such as a status of 65535 or
+#   more or a size over 2 ** 63 - 1, gives a failed record.  The processes are
+#   checked every poll_interval seconds while waiting on them and a
+#   RuntimeError is raised as soon as one of them has died, so a killed
+#   worker never leaves the caller waiting forever.
+#
+def parseShared(parser, file_path, worker_cnt = None,
+        string_field_list = ('remote_host_str', 'http_line.request_URI_str'),
+        block_size = 1 << 22, block_cnt = None, poll_interval = 1.0):
+    worker_cnt = worker_cnt or os.cpu_count() or 1
+    block_cnt = block_cnt or 2 * worker_cnt
+
+    string_cnt = len(string_field_list)
+    record_struct = recordStruct(string_cnt)
+    line_cap = block_size // min_line_size
+    slot_size = line_cap * record_struct.size
+
+    context = get_context()
+    free_queue = context.Queue()
+    task_queue = context.Queue()
+    done_queue = context.Queue()
+
+    for idx in range(block_cnt):
+        free_queue.put(idx)
+
+    shm = SharedMemory(create = True, size = block_cnt * (block_size + slot_size))
+
+    process_list = [context.Process(target = readBlocks, args = (file_path,
+        shm.name, block_size, line_cap, worker_cnt, free_queue, task_queue))]
+
+    for j in range(worker_cnt):
+        process_list.append(context.Process(target = parseBlocks,
+            args = (type(parser), parser.constructorArgs(),
+                tuple(string_field_list), shm.name, block_size, block_cnt,
+                line_cap, task_queue, done_queue)))
+
+    for process in process_list:
+        process.daemon = True
+        process.start()
+
+    pending_dict = {}
+    next_seq = 0
+    running_cnt = worker_cnt
+
+    try:
+        while running_cnt or pending_dict:
+            if next_seq not in pending_dict:
+                if not running_cnt:
+                    raise RuntimeError('A parser worker exited without '
+                        'finishing block %d' % next_seq)
+
+                try:
+                    message = done_queue.get(timeout = poll_interval)
+                except Empty:
+                    for process in process_list:
+                        if process.exitcode:
+                            raise RuntimeError('%s process %s exited with '
+                                'code %d' % (process.name, process.pid,
+                                process.exitcode))
+                    continue
+
+                if message is None:
+                    running_cnt -= 1
+                else:
+                    (seq, idx, line_cnt, table) = message
+                    pending_dict[seq] = (idx, line_cnt, table)
+
+                continue
+
+            (idx, line_cnt, table) = pending_dict.pop(next_seq)
+            next_seq += 1
+
+            start = block_cnt * block_size + idx * slot_size
+            record_bytes = bytes(shm.buf[start : start + line_cnt
+                * record_struct.size])
+
+            free_queue.put(idx)
+
+            for record in record_struct.iter_unpack(record_bytes):
+                yield (record[0] == 1,
+                    None if record[1] == no_status else record[1],
+                    None if record[2] == no_byte_cnt else record[2],
+                    None if record[3] == no_time else record[3]) + \
+                    tuple(None if code == no_code else table[code]
+                        for code in record[4:])
+    finally:
+        for process in process_list:
+            if process.is_alive():
+                process.terminate()
+
+            process.join()
+
+        shm.close()
+        shm.unlink()
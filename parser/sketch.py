@@ -0,0 +1,393 @@
+from hashlib import blake2b
+from heapq import heapify, heappop, heappush, heapreplace
+from struct import pack, unpack_from
+from zlib import compress, decompress
+import json
+import math
+
+from . import fieldGetter, fieldBytesGetter
+
+#
+# @Class
+#   SpaceSaving
+#
+# @Initialization Prototype
+#   SpaceSaving( capacity )
+#   SpaceSaving( capacity, 'http_line.request_URI_str' )
+#
+# @Purpose
+#   Streaming heavy hitter (top-K) summary using the Space-Saving
+#   algorithm.  At most capacity values are tracked no matter how many
+#   distinct values the stream holds.  Every tracked count overestimates
+#   the true count by at most its error, and any value whose true count is
+#   above total_weight / capacity is guaranteed to be tracked.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   capacity     : Largest number of tracked values
+#   field_str    : ApacheLog field counted by observe, optionally dotted
+#   total_weight : Sum of every weight counted so far
+#   count_dict   : Tracked value -> [count, error]
+#   heap_list    : Min heap of [count, value] over the tracked values,
+#                  counts in it may lag behind count_dict
+#   get_func     : Cached fieldGetter of field_str
+#
+# @Class Methods
+#   update(value, weight) : Count one occurence of value
+#   observe(log)          : Count the field of an ApacheLog, weighted by
+#                           its sample_weight, for Parser observer_list
+#   merge(other)          : Fold another SpaceSaving of the same field and
+#                           capacity into this one
+#   topK(k)               : List of (value, count, error) tuples
+#   errorBound()          : Largest possible overestimate of any count
+#
+# @Notes
+#   Objects pickle, so summaries built by separate workers can be sent
+#   back and merged.
+#
+class SpaceSaving:
+    def __init__(self, capacity, field_str = None):
+        if capacity < 1:
+            raise ValueError('capacity must be at least 1, got %r' % capacity)
+
+        self.capacity = capacity
+        self.field_str = field_str
+        self.total_weight = 0
+        self.count_dict = {}
+        self.heap_list = []
+        self.get_func = None
+
+    def update(self, value, weight = 1):
+        self.total_weight += weight
+        entry = self.count_dict.get(value)
+
+        if entry is not None:
+            entry[0] += weight
+
+        elif len(self.count_dict) < self.capacity:
+            self.count_dict[value] = [weight, 0]
+            heappush(self.heap_list, [weight, value])
+
+        else:
+            (min_count, min_value) = self.popMin()
+
+            del self.count_dict[min_value]
+            self.count_dict[value] = [min_count + weight, min_count]
+            heappush(self.heap_list, [min_count + weight, value])
+
+    def observe(self, log):
+        if self.get_func is None:
+            if self.field_str is None:
+                raise ValueError('SpaceSaving needs a field_str to observe logs')
+
+            self.get_func = fieldGetter(self.field_str)
+
+        value = self.get_func(log)
+
+        if value is not None:
+            self.update(value, log.sample_weight)
+
+    # The field getter may be a closure, rebuild it after unpickling
+    def __getstate__(self):
+        state_dict = self.__dict__.copy()
+        state_dict['get_func'] = None
+
+        return state_dict
+
+    def popMin(self):
+        # Heap counts only ever lag behind, refresh until the top is current
+        while True:
+            (count, value) = self.heap_list[0]
+            current = self.count_dict[value][0]
+
+            if count == current:
+                return heappop(self.heap_list)
+
+            heapreplace(self.heap_list, [current, value])
+
+    def minCount(self):
+        if len(self.count_dict) < self.capacity:
+            return 0
+
+        return min(entry[0] for entry in self.count_dict.values())
+
+    def merge(self, other):
+        # Counts of another field don't add up, and the error bounds only
+        # hold between summaries of the same capacity
+        for attr_str in ('field_str', 'capacity'):
+            if getattr(other, attr_str) != getattr(self, attr_str):
+                raise ValueError('Cannot merge SpaceSaving of %s %r into %r'
+                    % (attr_str, getattr(other, attr_str),
+                    getattr(self, attr_str)))
+
+        # Values missing from a full summary may have had up to its minimum
+        self_min = self.minCount()
+        other_min = other.minCount()
+
+        merged_dict = {}
+
+        for value in self.count_dict.keys() | other.count_dict.keys():
+            (self_count, self_error) = self.count_dict.get(value,
+                (self_min, self_min))
+            (other_count, other_error) = other.count_dict.get(value,
+                (other_min, other_min))
+
+            merged_dict[value] = [self_count + other_count,
+                self_error + other_error]
+
+        keep_list = sorted(merged_dict.items(), key = lambda x : -x[1][0])
+        keep_list = keep_list[:self.capacity]
+
+        self.count_dict = dict(keep_list)
+        self.heap_list = [[entry[0], value] for (value, entry) in keep_list]
+        heapify(self.heap_list)
+        self.total_weight += other.total_weight
+
+        return self
+
+    def topK(self, k = None):
+        item_list = sorted(self.count_dict.items(), key = lambda x : -x[1][0])
+
+        return [(value, count, error)
+            for (value, (count, error)) in item_list[:k]]
+
+    def errorBound(self):
+        return self.total_weight / self.capacity
+
+
+#
+# @Class
+#   HyperLogLog
+#
+# @Initialization Prototype
+#   HyperLogLog( precision )
+#
+# @Purpose
+#   Distinct count estimator using 2 ** precision one byte registers.  The
+#   standard error of count() is about 1.04 / sqrt(2 ** precision), 0.81%
+#   at the default precision of 14 for 16 KB of registers.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   precision    : Number of hash bits picking the register
+#   register_arr : bytearray of registers
+#
+# @Class Methods
+#   add(value_bytes) : Count a value given as bytes
+#   addHash(hash)    : Count a value given as its 64 bit hash
+#   count()          : Estimated number of distinct values
+#   merge(other)     : Fold another HyperLogLog of the same precision in
+#   toBytes()        : Compact serialized form
+#   fromBytes(data)  : Static method rebuilding a HyperLogLog from toBytes
+#
+# @Notes
+#
+class HyperLogLog:
+    def __init__(self, precision = 14):
+        if not 4 <= precision <= 18:
+            raise ValueError('precision must be in [4, 18], got %r' % precision)
+
+        self.precision = precision
+        self.register_arr = bytearray(1 << precision)
+
+    def add(self, value_bytes):
+        self.addHash(hashBytes(value_bytes))
+
+    def addHash(self, value_hash):
+        index = value_hash >> (64 - self.precision)
+        rest_bits = 64 - self.precision
+        rank = rest_bits - (value_hash & ((1 << rest_bits) - 1)).bit_length() + 1
+
+        if rank > self.register_arr[index]:
+            self.register_arr[index] = rank
+
+    def count(self):
+        m = len(self.register_arr)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.register_arr)
+
+        # Linear counting is more accurate while many registers are empty
+        zero_cnt = self.register_arr.count(0)
+
+        if estimate <= 2.5 * m and zero_cnt:
+            return m * math.log(m / zero_cnt)
+
+        return estimate
+
+    def merge(self, other):
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge HyperLogLog of precision %d into %d'
+                % (other.precision, self.precision))
+
+        self.register_arr = bytearray(map(max, self.register_arr,
+            other.register_arr))
+
+        return self
+
+    def toBytes(self):
+        return bytes([self.precision]) + compress(self.register_arr)
+
+    @staticmethod
+    def fromBytes(data):
+        hll = HyperLogLog(data[0])
+        hll.register_arr = bytearray(decompress(data[1:]))
+
+        return hll
+
+
+#
+# @Prototype
+#   Function: hashBytes()
+#   Example:  hashBytes( b'203.0.113.7' )
+#
+# @Purpose
+#   This function returns the 64 bit hash HyperLogLog uses for a value.
+#   It is stable across processes so sketches built anywhere merge.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def hashBytes(value_bytes):
+    return int.from_bytes(blake2b(value_bytes, digest_size = 8).digest(),
+        'little')
+
+
+#
+# @Class
+#   DistinctCounter
+#
+# @Initialization Prototype
+#   DistinctCounter( field_str )
+#   DistinctCounter( field_str, group_str, bucket_seconds, precision )
+#
+# @Purpose
+#   Streaming distinct count of an ApacheLog field per group and time
+#   bucket, for reports like unique visitors per hour or distinct URLs per
+#   vhost.  Field values are hashed from their raw bytes so no str is built
+#   for them on bytes log lines.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   field_str      : ApacheLog field to count distinct values of
+#   group_str      : ApacheLog field to group by, None for one group
+#   bucket_seconds : Width of the time buckets, None for no time buckets
+#   precision      : Precision of every HyperLogLog
+#   sketch_dict    : (group, bucket start epoch) -> HyperLogLog
+#
+# @Class Methods
+#   observe(log)     : Count the field of an ApacheLog, for Parser
+#                      observer_list
+#   merge(other)     : Fold another DistinctCounter in, from another file,
+#                      process or day.  Both must count the same field
+#                      with the same group, buckets and precision.
+#   estimates()      : Dict of (group, bucket) -> estimated distinct count
+#   toBytes()        : Compact serialized form
+#   fromBytes(data)  : Static method rebuilding a DistinctCounter
+#
+# @Notes
+#   Logs without a time fall in bucket None.
+#
+class DistinctCounter:
+    def __init__(self, field_str, group_str = None, bucket_seconds = 3600,
+            precision = 14):
+        self.field_str = field_str
+        self.group_str = group_str
+        self.bucket_seconds = bucket_seconds
+        self.precision = precision
+        self.sketch_dict = {}
+        self.getter_pair = None
+
+    def observe(self, log):
+        if self.getter_pair is None:
+            self.getter_pair = (fieldBytesGetter(self.field_str),
+                None if self.group_str is None else fieldGetter(self.group_str))
+
+        value_bytes = self.getter_pair[0](log)
+
+        if value_bytes is None:
+            return
+
+        group = None if self.getter_pair[1] is None else self.getter_pair[1](log)
+        bucket = None
+
+        if self.bucket_seconds is not None and log.time is not None:
+            epoch = int(log.time.timestamp())
+            bucket = epoch - epoch % self.bucket_seconds
+
+        sketch = self.sketch_dict.get((group, bucket))
+
+        if sketch is None:
+            sketch = HyperLogLog(self.precision)
+            self.sketch_dict[(group, bucket)] = sketch
+
+        sketch.add(value_bytes)
+
+    def __getstate__(self):
+        state_dict = self.__dict__.copy()
+        state_dict['getter_pair'] = None
+
+        return state_dict
+
+    def merge(self, other):
+        # Counts of another field, grouping or bucketing don't add up
+        for attr_str in ('field_str', 'group_str', 'bucket_seconds',
+                'precision'):
+            if getattr(other, attr_str) != getattr(self, attr_str):
+                raise ValueError('Cannot merge DistinctCounter of %s %r into '
+                    '%r' % (attr_str, getattr(other, attr_str),
+                    getattr(self, attr_str)))
+
+        for (key, sketch) in other.sketch_dict.items():
+            if key in self.sketch_dict:
+                self.sketch_dict[key].merge(sketch)
+            else:
+                self.sketch_dict[key] = HyperLogLog.fromBytes(sketch.toBytes())
+
+        return self
+
+    def estimates(self):
+        return { key : sketch.count() for (key, sketch) in self.sketch_dict.items() }
+
+    def toBytes(self):
+        header_dict = { 'field' : self.field_str, 'group' : self.group_str,
+            'bucket_seconds' : self.bucket_seconds,
+            'precision' : self.precision,
+            'keys' : [list(key) for key in self.sketch_dict] }
+        header = json.dumps(header_dict).encode('utf-8')
+
+        part_list = [pack('<I', len(header)), header]
+
+        for sketch in self.sketch_dict.values():
+            part_list.append(sketch.register_arr)
+
+        return compress(b''.join(part_list))
+
+    @staticmethod
+    def fromBytes(data):
+        data = decompress(data)
+        header_len = unpack_from('<I', data)[0]
+        header_dict = json.loads(data[4:4 + header_len])
+
+        counter = DistinctCounter(header_dict['field'], header_dict['group'],
+            header_dict['bucket_seconds'], header_dict['precision'])
+
+        m = 1 << counter.precision
+        offset = 4 + header_len
+
+        for (group, bucket) in header_dict['keys']:
+            sketch = HyperLogLog(counter.precision)
+            sketch.register_arr = bytearray(data[offset:offset + m])
+            counter.sketch_dict[(group, bucket)] = sketch
+            offset += m
+
+        return counter
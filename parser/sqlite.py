@@ -0,0 +1,196 @@
+from datetime import datetime
+import re
+import sqlite3
+
+#
+# SQLite column type of each fieldList type, times are stored as epoch
+# seconds so they sort and compare as numbers
+#
+sql_type_dict = {
+    str      : 'TEXT',
+    int      : 'INTEGER',
+    datetime : 'INTEGER'
+}
+
+#
+# Packed addresses of ip_mode 'int' go past SQLite's 64 bit integers for
+# IPv6, they are stored as 16 byte big endian BLOBs that sort and compare
+# in address order
+#
+ip_column_type_str = 'BLOB'
+
+#
+# Pragmas for bulk loading.  With synchronous OFF nothing is fsynced, a
+# committed batch survives the loading process crashing but may be lost
+# or the database damaged if the machine crashes or loses power before
+# the OS writes it out.  Load into a new file and rerun the load after
+# such a crash.
+#
+load_pragma_list = [
+    'PRAGMA journal_mode = WAL',
+    'PRAGMA synchronous = OFF',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA cache_size = -262144'
+]
+
+#
+# @Class
+#   SQLiteSink
+#
+# @Initialization Prototype
+#   SQLiteSink( db_path, parser )
+#   SQLiteSink( db_path, parser, 'access_log', 50000, ['time'] )
+#
+# @Purpose
+#   Bulk loader of ApacheLog objects into a SQLite table whose columns
+#   follow the Parser format, one typed column per value of
+#   Parser.fieldList().  Rows are inserted with executemany, one
+#   transaction per batch, and the requested indexes are only built once
+#   the load is over.
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+# @Internal variables
+#   connection  : sqlite3 connection
+#   table_str   : Name of the table
+#   batch_size  : Rows per executemany and transaction
+#   index_list  : Columns to index in close()
+#   field_list  : Parser.fieldList() of the format
+#   insert_str  : INSERT statement of the table
+#   row_list    : Rows waiting for the next batch
+#   row_cnt     : Rows written so far
+#   time_index_list : Columns holding a datetime
+#   ip_index_list   : Columns holding a packed address
+#
+# @Class Methods
+#   write(log)           : Add one ApacheLog
+#   writeLogs(log_iter)  : Add every ApacheLog of an iterable
+#   flush()              : Insert the pending rows
+#   close()              : Flush, build the indexes and close
+#
+# @Notes
+#   Usable as a context manager, closing on exit.
+#
+#   A batch failing to insert is rolled back and dropped, and the error
+#   is raised, later batches go in as usual.
+#
+class SQLiteSink:
+    def __init__(self, db_path, parser, table_str = 'access_log',
+            batch_size = 50000, index_list = None):
+        if not re.match(r'^[A-Za-z_]\w*$', table_str):
+            raise ValueError('Invalid table name %r' % table_str)
+
+        self.connection = sqlite3.connect(db_path, isolation_level = None)
+        self.table_str = table_str
+        self.batch_size = batch_size
+        self.index_list = index_list or []
+        self.field_list = parser.fieldList()
+        self.row_list = []
+        self.row_cnt = 0
+
+        for pragma_str in load_pragma_list:
+            self.connection.execute(pragma_str)
+
+        name_set = set(entry[0] for entry in self.field_list)
+
+        for column_str in self.index_list:
+            if column_str not in name_set:
+                raise ValueError('Cannot index %r, the format has no such '
+                    'column' % column_str)
+
+        column_str = ', '.join('%s %s' % (name_str, ip_column_type_str
+            if isIPColumn(name_str) else sql_type_dict[field_type])
+            for (name_str, field_type, get_func) in self.field_list)
+
+        self.connection.execute('CREATE TABLE IF NOT EXISTS %s (%s)'
+            % (table_str, column_str))
+
+        self.insert_str = 'INSERT INTO %s VALUES (%s)' % (table_str,
+            ', '.join('?' * len(self.field_list)))
+
+        # Time columns need converting, everything else goes in as read
+        self.time_index_list = [j for (j, entry) in enumerate(self.field_list)
+            if entry[1] is datetime]
+        self.ip_index_list = [j for (j, entry) in enumerate(self.field_list)
+            if isIPColumn(entry[0])]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, log):
+        row = [get_func(log) for (name_str, field_type, get_func)
+            in self.field_list]
+
+        for j in self.time_index_list:
+            if row[j] is not None:
+                row[j] = int(row[j].timestamp())
+
+        for j in self.ip_index_list:
+            if row[j] is not None:
+                row[j] = row[j].to_bytes(16, 'big')
+
+        self.row_list.append(row)
+
+        if len(self.row_list) >= self.batch_size:
+            self.flush()
+
+    def writeLogs(self, log_iter):
+        for log in log_iter:
+            self.write(log)
+
+        self.flush()
+
+    def flush(self):
+        if not self.row_list:
+            return
+
+        (row_list, self.row_list) = (self.row_list, [])
+
+        # Never leave a transaction open, every later BEGIN would fail
+        self.connection.execute('BEGIN')
+
+        try:
+            self.connection.executemany(self.insert_str, row_list)
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+
+        self.connection.execute('COMMIT')
+
+        self.row_cnt += len(row_list)
+
+    def close(self):
+        if self.connection is None:
+            return
+
+        self.flush()
+
+        for column_str in self.index_list:
+            self.connection.execute('CREATE INDEX IF NOT EXISTS %s_%s ON %s (%s)'
+                % (self.table_str, column_str, self.table_str, column_str))
+
+        self.connection.execute('PRAGMA optimize')
+        self.connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        self.connection.close()
+        self.connection = None
+
+
+#
+# @Prototype
+#   Function: isIPColumn()
+#   Example:  isIPColumn( 'remote_ip_int' )
+#
+# @Purpose
+#   This function tells whether a fieldList column holds packIP integers
+#
+# @Revision
+#   Author: Christopher L. Ranc
+#   Modified:
+#
+def isIPColumn(name_str):
+    return name_str.endswith('_ip_int')
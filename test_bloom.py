@@ -0,0 +1,92 @@
+import os
+
+from parser import Parser
+from parser.bloom import BloomIndex
+
+
+parser = Parser('%h %>s')
+
+
+def writeLog(log_path, host_list):
+    with open(log_path, 'wb') as log_file:
+        for host_str in host_list:
+            log_file.write(b'%s 200\n' % host_str.encode())
+
+
+def indexLog(tmp_path, host_list, chunk_size = 64 << 20):
+    log_path = str(tmp_path / 'access.log')
+    index = BloomIndex(str(tmp_path / 'index.json'))
+    writeLog(log_path, host_list)
+
+    for log in index.indexFile(parser, log_path, chunk_size = chunk_size):
+        pass
+
+    return (index, log_path)
+
+
+def searchHosts(index, host_str):
+    return [log.remote_host_str for log in index.search(parser,
+        'remote_host_str', host_str)]
+
+
+def test_chunks_honour_chunk_size(tmp_path):
+    (index, log_path) = indexLog(tmp_path, ['10.0.0.%d' % (j % 250)
+        for j in range(1000)], chunk_size = 1000)
+
+    chunk_list = index.file_dict[log_path]['chunk_list']
+
+    assert len(chunk_list) > 10
+    assert all(chunk['end'] - chunk['offset'] < 1000 + 16
+        for chunk in chunk_list)
+    assert searchHosts(index, '10.0.0.7') == ['10.0.0.7'] * 4
+
+
+def test_stale_index_is_ignored(tmp_path):
+    (index, log_path) = indexLog(tmp_path, ['10.0.0.1'] * 100)
+
+    # A new file at the same path, as large as the indexed one
+    writeLog(log_path + '.new', ['10.0.0.2'] * 100)
+    os.replace(log_path + '.new', log_path)
+
+    assert searchHosts(index, '10.0.0.2') == ['10.0.0.2'] * 100
+
+    # The same file rewritten in place
+    writeLog(log_path, ['10.0.0.3'] * 100)
+
+    assert searchHosts(index, '10.0.0.3') == ['10.0.0.3'] * 100
+
+
+def test_time_filtered_chunk_is_no_false_positive(tmp_path):
+    time_parser = Parser('%h %t')
+    log_path = str(tmp_path / 'access.log')
+    index = BloomIndex(str(tmp_path / 'index.json'))
+
+    with open(log_path, 'wb') as log_file:
+        for j in range(200):
+            log_file.write(b'10.0.0.%d [10/Jul/2020:13:%02d:%02d +0000]\n'
+                % (j % 20, j // 60, j % 60))
+
+    for log in index.indexFile(time_parser, log_path, chunk_size = 1000,
+            fp_rate = 0.3):
+        pass
+
+    assert len(list(index.search(time_parser, 'remote_host_str',
+        '10.0.0.1'))) == 10
+    false_positive_cnt = index.searchSummary()['false_positive_cnt']
+
+    # The window starts inside the first chunk, after its 10.0.0.1 lines,
+    # which doesn't make the chunk a false positive
+    chunk = index.file_dict[log_path]['chunk_list'][0]
+    assert chunk['min_epoch'] + 21 < chunk['max_epoch']
+
+    assert len(list(index.search(time_parser, 'remote_host_str', '10.0.0.1',
+        chunk['min_epoch'] + 22))) == 8
+    assert index.searchSummary()['false_positive_cnt'] == false_positive_cnt
+
+    # Every chunk let through for an absent value is a false positive
+    for j in range(30):
+        assert list(index.search(time_parser, 'remote_host_str',
+            '10.9.9.%d' % j)) == []
+
+        stat_dict = index.searchSummary()
+        assert stat_dict['false_positive_cnt'] == stat_dict['candidate_cnt']
@@ -0,0 +1,52 @@
+import pytest
+
+from parser import Parser
+
+format_str = '%h %l %u %t "%r" %>s %b "%{User-Agent}i"'
+
+line_bytes = (b'10.0.0.1 - bob [10/Jul/2020:13:55:36 -0700] '
+    b'"GET /caf\xc3\xa9?a=1 HTTP/1.1" 200 512 "agent \\"x\\" \xff"')
+
+
+def fieldValues(parser, line):
+    log = parser.parse(line)
+
+    return [(name, get_func(log)) for (name, field_type, get_func)
+        in parser.fieldList()]
+
+
+@pytest.mark.parametrize('engine_str', ['regex', 'generic'])
+def test_bytes_input_matches_str_input(engine_str):
+    parser = Parser(format_str, engine = engine_str)
+    expected_list = fieldValues(parser, line_bytes.decode('utf-8',
+        'surrogateescape'))
+
+    for line in (line_bytes, bytearray(line_bytes), memoryview(line_bytes),
+            memoryview(b'junk' + line_bytes + b'junk')[4:-4]):
+        assert fieldValues(parser, line) == expected_list
+
+
+def test_latin1_encoding():
+    log = Parser('%h %u', encoding = 'latin-1').parse(b'10.0.0.1 caf\xc3\xa9')
+
+    assert log.remote_user_str == 'caf\xc3\xa9'
+
+
+def test_string_fields_decode_on_first_read():
+    log = Parser(format_str).parse(line_bytes)
+
+    assert log.raw_dict['remote_user_str'][0] == b'bob'
+    assert 'remote_user_str' not in log.__dict__
+    assert log.slot_list == [b'agent \\"x\\" \xff']
+
+    # Numbers and times are stored as they are parsed
+    assert log.__dict__['last_request_time_int'] == 200
+
+    assert log.remote_user_str == 'bob'
+    assert 'remote_user_str' not in log.raw_dict
+    assert log.__dict__['remote_user_str'] == 'bob'
+
+    http_line = log.http_line
+    assert http_line.raw_dict['request_URI_str'][0] == b'/caf\xc3\xa9?a=1'
+    assert http_line.request_URI_str == '/caf\xe9?a=1'
+    assert log.headers['User-Agent'] == 'agent "x" \udcff'
@@ -0,0 +1,24 @@
+from parser import packIP, unpackIP
+from parser.cidr import CIDRIndex
+
+
+def test_pack_ip_keeps_ipv4_and_ipv6_apart():
+    assert unpackIP(packIP('::1')) == '::1'
+    assert unpackIP(packIP('203.0.113.7')) == '203.0.113.7'
+    assert packIP('::1') != packIP('0.0.0.1')
+    assert packIP('::ffff:203.0.113.7') == packIP('203.0.113.7')
+    assert packIP(b'10.0.0.1') < 2 ** 63
+    assert packIP('-') is None
+
+
+def test_cidr_lookup_by_version():
+    index = CIDRIndex([('0.0.0.0/0', 'ipv4'), ('10.0.0.0/8', 'internal'),
+        ('::/0', 'ipv6'), ('2001:db8::/32', 'documentation')])
+
+    assert index.lookup('::1') == 'ipv6'
+    assert index.lookup('0.0.0.1') == 'ipv4'
+    assert index.lookup('10.1.2.3') == 'internal'
+    assert index.lookup(packIP('10.1.2.3')) == 'internal'
+    assert index.lookup('2001:db8::5') == 'documentation'
+    assert index.lookupMany(['10.0.0.1', None, '::2']) == ['internal', None,
+        'ipv6']
@@ -0,0 +1,28 @@
+from parser import Parser, packIP
+from parser.codec import RecordWriter, decodeZigzag, encodeZigzag, \
+    readRecords
+
+
+def test_zigzag_round_trip():
+    for value in (0, -1, 1, 63, -64, 64, 2 ** 63, -2 ** 63 - 1, 2 ** 128):
+        buf = b'\xff' + encodeZigzag(value) + b'\xff'
+
+        assert decodeZigzag(buf, 1) == (value, len(buf) - 1)
+
+
+def test_large_ints_round_trip(tmp_path):
+    parser = Parser('%a %>s %b', ip_mode = 'int')
+    record_path = str(tmp_path / 'logs.rec')
+    line_list = ['2001:db8::7 200 %d\n' % 10 ** 30, '203.0.113.7 404 -\n']
+
+    with RecordWriter(record_path, parser) as writer:
+        writer.writeLogs(parser.parse(line) for line in line_list)
+
+    assert list(readRecords(record_path, ['remote_ip_int',
+        'byte_count_nhclf_int', 'last_request_time_int'])) == [
+        (packIP('2001:db8::7'), 10 ** 30, 200),
+        (packIP('203.0.113.7'), None, 404)]
+
+    # Skipped ints still leave the fields after them readable
+    assert list(readRecords(record_path, ['byte_count_nhclf_int'])) == [
+        (10 ** 30,), (None,)]
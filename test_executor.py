@@ -0,0 +1,105 @@
+import pytest
+
+from parser import Parser
+from parser.executor import mapBatches, parseParallel, pickBackend
+from parser.metrics import ParserMetrics
+
+executor_format_str = '%h %l %u %t "%r" %>s %b "%{User-Agent}i"'
+
+
+def makeLines():
+    line_list = []
+
+    for i in range(500):
+        line_list.append(('10.0.%d.%d - - [10/Jul/2020:13:%02d:%02d +0000] '
+            '"GET /p%d?q=%d HTTP/1.1" 200 %d "agent \\"%d\\""' % (i // 250,
+            i % 250, i // 60 % 60, i % 60, i, i, i * 3, i)).encode())
+
+        if i % 97 == 0:
+            line_list.append(b'not a log line')
+
+    return line_list
+
+
+def fieldRows(parser, log_iter):
+    field_list = parser.fieldList()
+
+    return [tuple(get_func(log) for (name, field_type, get_func)
+        in field_list) for log in log_iter]
+
+
+@pytest.mark.parametrize('backend_str', ['thread', 'process'])
+def test_backends_match_serial(backend_str):
+    parser = Parser(executor_format_str)
+    line_list = makeLines()
+
+    serial_metrics = ParserMetrics()
+    expected_list = fieldRows(parser, parseParallel(parser, line_list,
+        'serial', batch_size = 64, metrics = serial_metrics))
+
+    assert len(expected_list) == 500
+    assert serial_metrics.parse_errors_int == 6
+
+    for lines in (line_list, [line.decode() for line in line_list]):
+        metrics = ParserMetrics()
+        row_list = fieldRows(parser, parseParallel(parser, lines,
+            backend_str, 2, 64, metrics))
+
+        assert row_list == expected_list
+        assert metrics.lines_parsed_int == 500
+        assert metrics.parse_errors_int == 6
+
+
+@pytest.mark.parametrize('backend_str', ['serial', 'thread'])
+def test_map_batches_keeps_order(backend_str):
+    batch_list = [[i] * (i % 5 + 1) for i in range(50)]
+    result_list = list(mapBatches(sum, iter(batch_list), backend_str, 3))
+
+    assert [batch for (batch, result, seconds) in result_list] == batch_list
+    assert [result for (batch, result, seconds) in result_list] == \
+        [sum(batch) for batch in batch_list]
+
+
+def test_pick_backend():
+    assert pickBackend('serial') == 'serial'
+    assert pickBackend('auto') in ('thread', 'process')
+
+    with pytest.raises(ValueError):
+        pickBackend('gpu')
+
+
+@pytest.mark.parametrize('backend_str', ['serial', 'thread'])
+def test_queue_depth_counts_lines_in_flight(backend_str):
+    metrics = ParserMetrics()
+    batch_list = [[1] * 3 for i in range(20)]
+    depth_list = []
+
+    for entry in mapBatches(sum, iter(batch_list), backend_str, 2, metrics):
+        depth_list.append(metrics.queue_depth_int)
+
+    assert metrics.queue_depth_int == 0
+
+    if backend_str == 'serial':
+        assert depth_list == [3] * 20
+    else:
+        # Up to two batches per worker are submitted ahead
+        assert max(depth_list) == 12
+        assert depth_list[-1] == 3
+
+    # Closing early takes the batches still in flight off again
+    batch_iter = mapBatches(sum, iter(batch_list), backend_str, 2, metrics)
+    next(batch_iter)
+    batch_iter.close()
+    assert metrics.queue_depth_int == 0
+
+
+def test_parse_parallel_reports_queue_depth():
+    metrics = ParserMetrics()
+    parser = Parser(executor_format_str)
+    depth_set = set()
+
+    for log in parseParallel(parser, makeLines(), 'thread', 2, 50, metrics):
+        depth_set.add(metrics.queue_depth_int)
+
+    assert max(depth_set) > 50
+    assert metrics.queue_depth_int == 0
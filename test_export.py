@@ -0,0 +1,73 @@
+import json
+
+from parser import Parser
+from parser.export import CSVSink, JSONLSink, columnBatch
+
+export_parser = Parser('%h %t "%r" %>s %b "%{User-Agent}i"')
+
+export_line_list = [b'10.0.0.1 [10/Jul/2020:13:55:36 -0700] '
+    b'"GET /a?b=1 HTTP/1.1" 200 512 "say \\"hi\\", caf\xc3\xa9"',
+    b'10.0.0.2 [10/Jul/2020:13:55:37 +0000] "POST /x HTTP/1.0" 404 - '
+    b'"bad \xff"']
+
+expected_jsonl_bytes = (b'{"remote_host_str":"10.0.0.1",'
+    b'"time":"2020-07-10T13:55:36-07:00","method_str":"GET",'
+    b'"request_URI_str":"/a?b=1","http_version_str":"HTTP/1.1",'
+    b'"last_request_time_int":200,"byte_count_nhclf_int":512,'
+    b'"headers_user_agent":"say \\"hi\\", caf\\u00e9"}\n'
+    b'{"remote_host_str":"10.0.0.2",'
+    b'"time":"2020-07-10T13:55:37+00:00","method_str":"POST",'
+    b'"request_URI_str":"/x","http_version_str":"HTTP/1.0",'
+    b'"last_request_time_int":404,"byte_count_nhclf_int":null,'
+    b'"headers_user_agent":"bad \\udcff"}\n')
+
+expected_csv_bytes = (b'remote_host_str,time,method_str,request_URI_str,'
+    b'http_version_str,last_request_time_int,byte_count_nhclf_int,'
+    b'headers_user_agent\r\n'
+    b'10.0.0.1,2020-07-10T13:55:36-07:00,GET,/a?b=1,HTTP/1.1,200,512,'
+    b'"say ""hi"", caf\xc3\xa9"\r\n'
+    b'10.0.0.2,2020-07-10T13:55:37+00:00,POST,/x,HTTP/1.0,404,,bad \xff\r\n')
+
+
+def writeBoth(sink_class, out_path):
+    log_list = [export_parser.parse(line) for line in export_line_list]
+
+    with sink_class(out_path, export_parser) as sink:
+        sink.writeLogs(log_list)
+
+        assert sink.row_cnt == 2
+
+    with open(out_path, 'rb') as out_file:
+        row_bytes = out_file.read()
+
+    # Columnar batches write the same text as logs one at a time
+    with sink_class(out_path, export_parser) as sink:
+        sink.writeColumns(columnBatch(log_list, export_parser.fieldList()))
+
+    with open(out_path, 'rb') as out_file:
+        assert out_file.read() == row_bytes
+
+    return row_bytes
+
+
+def test_jsonl_output(tmp_path):
+    out_bytes = writeBoth(JSONLSink, str(tmp_path / 'out.jsonl'))
+
+    assert out_bytes == expected_jsonl_bytes
+    assert [json.loads(line)['last_request_time_int']
+        for line in out_bytes.splitlines()] == [200, 404]
+
+
+def test_csv_output(tmp_path):
+    assert writeBoth(CSVSink, str(tmp_path / 'out.csv')) == \
+        expected_csv_bytes
+
+
+def test_jsonl_small_buffer(tmp_path):
+    out_path = str(tmp_path / 'out.jsonl')
+
+    with JSONLSink(out_path, export_parser, buffer_size = 1) as sink:
+        sink.writeLogs(export_parser.parse(line) for line in export_line_list)
+
+    with open(out_path, 'rb') as out_file:
+        assert out_file.read() == expected_jsonl_bytes
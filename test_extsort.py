@@ -0,0 +1,43 @@
+from parser import MultiParser, Parser
+from parser.extsort import TimeKey, no_time_key, sortFiles
+
+
+def test_key_is_the_format_time():
+    time_key = TimeKey(Parser('%h \\"%{Referer}i\\" %t'))
+
+    # The bracketed date inside the referer is not the time of the line
+    assert time_key(b'10.0.0.1 "/?d=[01/Jan/1990:00:00:00 +0000]" '
+        b'[10/Oct/2000:13:55:36 -0700]\n') == 971211336
+    assert time_key(b'10.0.0.1 "-" -\n') == no_time_key
+
+
+def test_key_of_format_times():
+    for (format_str, line) in (
+            ('%h %{sec}t %>s', b'10.0.0.1 971211336 200\n'),
+            ('%h %{begin:msec}t', b'10.0.0.1 971211336123\n'),
+            ('%h %{%Y-%m-%d %H:%M:%S %z}t %>s',
+                b'10.0.0.1 2000-10-10 13:55:36 -0700 200\n'),
+            ('%h %{%d/%b/%Y:%H:%M:%S}t', b'10.0.0.1 10/Oct/2000:20:55:36\n')):
+        assert TimeKey(Parser(format_str))(line) == 971211336
+
+    time_key = TimeKey(MultiParser(['%h %>s %{sec}t', '%h %t']))
+
+    assert time_key(b'10.0.0.1 200 971211336\n') == 971211336
+    assert time_key(b'10.0.0.1 [10/Oct/2000:13:55:36 -0700]\n') == 971211336
+
+
+def test_sort_files_on_format_time(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    out_path = str(tmp_path / 'sorted.log')
+    line_list = [b'10.0.0.1 "[01/Jan/1990:00:00:00 +0000]" '
+        b'2000-10-10T13:55:38\n', b'10.0.0.2 "-" 2000-10-10T13:55:36\n',
+        b'10.0.0.3 "-" 2000-10-10T13:55:37\n']
+
+    with open(log_path, 'wb') as log_file:
+        log_file.write(b''.join(line_list))
+
+    assert sortFiles([log_path], out_path,
+        parser = Parser('%h \\"%{Referer}i\\" %{%Y-%m-%dT%H:%M:%S}t')) == 3
+
+    with open(out_path, 'rb') as out_file:
+        assert out_file.readlines() == line_list[1:] + line_list[:1]
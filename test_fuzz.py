@@ -0,0 +1,42 @@
+import json
+
+from parser.fuzz import benchmark, checkThroughput, fuzz, main
+
+
+def test_engines_agree_on_random_formats():
+    assert fuzz(seed = 3, format_cnt = 150) == []
+
+
+def test_check_throughput():
+    baseline_dict = {'combined': {'regex': 1000.0, 'generic': 500.0}}
+
+    assert checkThroughput({'combined': {'regex': 900.0, 'generic': 480.0,
+        'split': 1.0}}, baseline_dict) == []
+    assert checkThroughput({'combined': {'regex': 800.0, 'generic': 500.0},
+        'common': {'regex': 1.0}}, baseline_dict) == [('combined', 'regex',
+        800.0, 1000.0)]
+
+
+def test_throughput_gate(tmp_path):
+    baseline_path = str(tmp_path / 'baseline.json')
+    arg_list = ['--formats', '20', '--bench', '--bench-lines', '500',
+        '--baseline', baseline_path]
+
+    assert main(arg_list + ['--save-baseline']) == 0
+
+    with open(baseline_path) as baseline_file:
+        baseline_dict = json.load(baseline_file)
+
+    assert set(baseline_dict) == set(benchmark(line_cnt = 10,
+        repeat_cnt = 1))
+
+    # The same machine is well within a loose tolerance of itself
+    assert main(arg_list + ['--tolerance', '0.9']) == 0
+
+    with open(baseline_path, 'w') as baseline_file:
+        json.dump(dict((format_name, dict((engine_str, rate * 100)
+            for (engine_str, rate) in engine_rate_dict.items()))
+            for (format_name, engine_rate_dict) in baseline_dict.items()),
+            baseline_file)
+
+    assert main(arg_list) == 1
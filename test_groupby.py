@@ -0,0 +1,57 @@
+import os
+from random import Random
+
+from parser import Parser
+from parser.groupby import GroupBy
+
+
+def makeLogs():
+    rand = Random(3)
+    parser = Parser('%h %b %D')
+
+    return [parser.parse('10.%d.%d.%d %s %d' % (i % 7, i % 211, i % 5,
+        '-' if i % 13 == 0 else str(rand.randrange(1000)),
+        rand.randrange(10 ** 6))) for i in range(6000)]
+
+
+def groupResults(log_list, **option_dict):
+    group_by = GroupBy('remote_host_str', **option_dict)
+
+    for log in log_list:
+        group_by.observe(log)
+
+    result_dict = dict(group_by.results())
+
+    return (group_by, result_dict)
+
+
+def test_spilled_results_match_in_memory(tmp_path):
+    log_list = makeLogs()
+    (memory_group, expected_dict) = groupResults(log_list)
+
+    assert memory_group.spill_cnt == 0
+    assert sum(state['count'] for state in expected_dict.values()) == 6000
+
+    for (memory_budget, partition_cnt) in ((20000, 16), (2000, 2)):
+        (group_by, result_dict) = groupResults(log_list,
+            memory_budget = memory_budget, temp_dir = str(tmp_path),
+            partition_cnt = partition_cnt)
+
+        assert group_by.spill_cnt > 1
+        assert result_dict == expected_dict
+
+        # Spill files are gone once the results were read
+        assert os.listdir(str(tmp_path)) == []
+
+
+def test_state_values():
+    parser = Parser('%h %b %D')
+    (group_by, result_dict) = groupResults([parser.parse(line) for line in
+        ('10.0.0.1 100 30', '10.0.0.1 - 10', '10.0.0.2 5 -')])
+
+    assert result_dict == {
+        '10.0.0.1' : {'count': 2, 'byte_sum': 100, 'min_request_time': 10,
+            'max_request_time': 30, 'avg_request_time': 20.0},
+        '10.0.0.2' : {'count': 1, 'byte_sum': 5, 'min_request_time': None,
+            'max_request_time': None, 'avg_request_time': None}
+    }
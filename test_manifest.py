@@ -0,0 +1,104 @@
+import json
+import os
+import subprocess
+import sys
+
+from parser import Parser
+from parser.manifest import Manifest, identityKey
+
+
+def writeLines(log_path, line_cnt, mode = 'wb'):
+    with open(log_path, mode) as log_file:
+        for i in range(line_cnt):
+            log_file.write(b'10.0.0.%d 200\n' % (i % 250))
+
+
+def test_commit_keys_the_open_file(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    manifest = Manifest(str(tmp_path / 'manifest.json'))
+    writeLines(log_path, 10)
+
+    with open(log_path, 'rb') as log_file:
+        old_key = identityKey(os.fstat(log_file.fileno()))
+
+        # Rotate the file away while it is being read
+        os.rename(log_path, log_path + '.1')
+        writeLines(log_path, 3)
+
+        manifest.commit(log_path, 42, log_file)
+
+    assert list(manifest.entry_dict) == [old_key]
+    assert manifest.startOffset(log_path) == 0
+    assert manifest.startOffset(log_path + '.1') == 42
+
+
+def test_parse_new_commits_on_interval(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    manifest_path = str(tmp_path / 'manifest.json')
+    manifest = Manifest(manifest_path)
+    parser = Parser('%h %>s')
+    writeLines(log_path, 100)
+
+    log_cnt = 0
+
+    for (file_path, log_list, end_offset) in manifest.parseNew(parser,
+            [log_path], batch_size = 10, commit_bytes = 1 << 24,
+            commit_seconds = float('inf')):
+        log_cnt += len(log_list)
+
+        # Nothing is written until the file is done
+        assert not os.path.exists(manifest_path)
+
+    assert log_cnt == 100
+
+    with open(manifest_path) as manifest_file:
+        entry_dict = json.load(manifest_file)
+
+    assert [entry['offset'] for entry in entry_dict.values()] == [
+        os.path.getsize(log_path)]
+
+    writeLines(log_path, 5, 'ab')
+
+    assert sum(len(log_list) for (_, log_list, _) in
+        Manifest(manifest_path).parseNew(parser, [log_path])) == 5
+
+
+# Writes every handled line to out_path and dies with os._exit when it is
+# handed batch kill_at, before handling it
+consumer_script_str = """
+import os, sys
+from parser import Parser
+from parser.manifest import Manifest
+
+(manifest_path, log_path, out_path, kill_at) = sys.argv[1:]
+
+with open(out_path, 'a') as out_file:
+    for (i, (_, log_list, _)) in enumerate(Manifest(manifest_path).parseNew(
+            Parser('%h %>s'), [log_path], batch_size = 7)):
+        if i == int(kill_at):
+            os._exit(1)
+
+        for log in log_list:
+            out_file.write(log.remote_host_str + '\\n')
+
+        out_file.flush()
+        os.fsync(out_file.fileno())
+"""
+
+
+def test_killed_job_delivers_no_line_twice(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    manifest_path = str(tmp_path / 'manifest.json')
+    out_path = str(tmp_path / 'out.txt')
+    writeLines(log_path, 100)
+
+    for (kill_at, returncode) in (('3', 1), ('9', 1), ('-1', 0)):
+        result = subprocess.run([sys.executable, '-c', consumer_script_str,
+            manifest_path, log_path, out_path, kill_at],
+            cwd = os.path.dirname(os.path.abspath(__file__)))
+        assert result.returncode == returncode
+
+    with open(out_path) as out_file:
+        host_list = out_file.read().splitlines()
+
+    assert host_list == ['10.0.0.%d' % (i % 250) for i in range(100)]
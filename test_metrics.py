@@ -0,0 +1,87 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from parser import Parser
+from parser.metrics import ParserMetrics, startMetricsServer
+
+
+def test_counters_and_histogram():
+    metrics = ParserMetrics([0.01, 0.1])
+    metrics.recordBatch(10, 1, 0.005)
+    metrics.recordBatch(5, 0, 0.05)
+    metrics.recordRead(300, 20)
+    metrics.recordRead(100)
+
+    snap_dict = metrics.snapshot()
+    assert snap_dict['lines_parsed'] == 15
+    assert snap_dict['parse_errors'] == 1
+    assert snap_dict['bytes_read'] == 400
+    assert snap_dict['lag_bytes'] == 20
+    assert snap_dict['batch_count'] == 2
+    assert snap_dict['batch_latency'] == [(0.01, 1), (0.1, 2),
+        (float('inf'), 2)]
+
+
+def test_render_prometheus():
+    metrics = ParserMetrics([0.01])
+    metrics.recordBatch(3, 1, 0.5)
+    metrics.addQueueDepth(7)
+
+    text_list = metrics.renderPrometheus('alp').splitlines()
+    assert '# TYPE alp_lines_parsed_total counter' in text_list
+    assert 'alp_lines_parsed_total 3' in text_list
+    assert 'alp_parse_errors_total 1' in text_list
+    assert '# TYPE alp_queue_depth gauge' in text_list
+    assert 'alp_queue_depth 7' in text_list
+    assert 'alp_batch_latency_seconds_bucket{le="0.01"} 0' in text_list
+    assert 'alp_batch_latency_seconds_bucket{le="+Inf"} 1' in text_list
+    assert 'alp_batch_latency_seconds_sum 0.5' in text_list
+    assert 'alp_batch_latency_seconds_count 1' in text_list
+
+
+def test_http_endpoint():
+    metrics = ParserMetrics()
+    metrics.recordBatch(4, 0, 0.001)
+    server = startMetricsServer(metrics, 0)
+
+    try:
+        url_str = 'http://%s:%d' % server.server_address
+
+        with urlopen(url_str + '/metrics') as response:
+            assert response.status == 200
+            assert response.headers['Content-Type'].startswith('text/plain')
+            body_str = response.read().decode('utf-8')
+
+        assert body_str == metrics.renderPrometheus()
+
+        with pytest.raises(HTTPError) as error_info:
+            urlopen(url_str + '/other')
+
+        assert error_info.value.code == 404
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_queue_depth_tracks_unconsumed_batch(tmp_path):
+    log_path = tmp_path / 'access.log'
+    log_path.write_bytes(b''.join(b'10.0.0.%d 200\n' % i for i in range(10)))
+    metrics = ParserMetrics()
+    depth_list = []
+
+    for log in Parser('%h %>s').parseFile(str(log_path), metrics = metrics,
+            batch_size = 4):
+        depth_list.append(metrics.queue_depth_int)
+
+    assert depth_list == [4] * 8 + [2] * 2
+    assert metrics.queue_depth_int == 0
+
+    # A consumer that stops early still hands the batch back
+    log_iter = Parser('%h %>s').parseFile(str(log_path), metrics = metrics,
+        batch_size = 4)
+    next(log_iter)
+    assert metrics.queue_depth_int == 4
+    log_iter.close()
+    assert metrics.queue_depth_int == 0
@@ -0,0 +1,77 @@
+import pytest
+
+from parser import MultiParser, Parser, format_dict
+
+multi_format_list = [format_dict['common'], format_dict['combined'],
+    '%h %>s %b']
+
+common_line_str = ('10.0.0.1 - - [10/Jul/2020:13:55:36 +0000] '
+    '"GET /a HTTP/1.1" 200 5')
+combined_line_str = common_line_str + ' "http://example.com/" "curl/8.0"'
+short_line_str = '10.0.0.2 404 -'
+
+
+def fieldValues(parser, log):
+    return [(name, get_func(log)) for (name, field_type, get_func)
+        in parser.fieldList()]
+
+
+@pytest.mark.parametrize('encode', [False, True])
+def test_lines_go_to_their_format(encode):
+    multi = MultiParser(multi_format_list)
+
+    for (k, line_str) in ((0, common_line_str), (1, combined_line_str),
+            (2, short_line_str), (1, combined_line_str)):
+        single = Parser(multi_format_list[k])
+        line = line_str.encode() if encode else line_str
+
+        assert fieldValues(single, multi.parse(line)) == \
+            fieldValues(single, single.parse(line))
+        assert multi.last_index == k
+
+    with pytest.raises(ValueError):
+        multi.parse(b'garbage' if encode else 'garbage')
+
+    # A failed line leaves the last format in place
+    assert multi.last_index == 1
+
+
+def test_last_format_is_tried_first(monkeypatch):
+    multi = MultiParser(multi_format_list)
+    multi.parse(combined_line_str)
+
+    def failDispatch(*arg_list):
+        raise AssertionError('dispatched a line of the last format')
+
+    monkeypatch.setattr(multi, 'dispatch', failDispatch)
+
+    for j in range(3):
+        assert multi.parse(combined_line_str).headers['User-Agent'] == \
+            'curl/8.0'
+        assert multi.parseBytes(memoryview(combined_line_str.encode())) \
+            .remote_host_str == '10.0.0.1'
+
+    with pytest.raises(AssertionError):
+        multi.parse(short_line_str)
+
+
+def test_layout_match_with_bad_value_tries_next_format():
+    multi = MultiParser(['%h %t %>s', '%h %u %>s'])
+
+    log = multi.parse('10.0.0.1 bob 200')
+    assert (log.remote_user_str, multi.last_index) == ('bob', 1)
+
+    log = multi.parse('10.0.0.1 [10/Jul/2020:13:55:36 +0000] 200')
+    assert (log.time.year, multi.last_index) == (2020, 0)
+
+
+def test_field_list_and_constructor_args():
+    multi = MultiParser(multi_format_list, max_line_len = 4096)
+    name_list = [entry[0] for entry in multi.fieldList()]
+
+    assert name_list[:len(Parser(format_dict['common']).fieldList())] == \
+        [entry[0] for entry in Parser(format_dict['common']).fieldList()]
+    assert 'headers_user_agent' in name_list
+    assert len(name_list) == len(set(name_list))
+    assert MultiParser(*multi.constructorArgs()).constructorArgs() == \
+        multi.constructorArgs()
@@ -0,0 +1,34 @@
+import re
+
+import pytest
+
+import parser
+from parser.fuzz import fuzz
+
+
+def test_engines_agree_without_atomic_groups(monkeypatch):
+    # What Python before 3.11 runs, lookaheads and backreferences
+    monkeypatch.setattr(parser, 'atomic_groups', False)
+
+    quote_end_re_dict = {}
+
+    for quote_chr in parser.quote_set:
+        pattern_str = parser.quoteEndPattern(quote_chr)
+        quote_end_re_dict[quote_chr] = re.compile(pattern_str, re.S)
+        quote_end_re_dict[quote_chr.encode()] = re.compile(
+            pattern_str.encode(), re.S)
+
+    monkeypatch.setattr(parser, 'quote_end_re_dict', quote_end_re_dict)
+
+    assert '*+' not in parser.Parser('%h "%r" %t').format_re.pattern
+    assert fuzz(seed = 1, format_cnt = 200) == []
+
+
+@pytest.mark.parametrize('atomic_groups', [True, False])
+def test_atomic_pattern_gives_nothing_back(monkeypatch, atomic_groups):
+    monkeypatch.setattr(parser, 'atomic_groups', atomic_groups)
+    body_str = parser.atomicPattern(r'[^ \n]*+', 'g1')
+
+    # A greedy group would give back -c to let the - match
+    assert re.match(body_str + '-', 'a-b-c') is None
+    assert re.match(body_str + ' ', 'a-b c').group(1) == 'a-b'
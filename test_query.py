@@ -0,0 +1,98 @@
+import json
+from random import Random
+
+from parser import Parser
+from parser.query import QueryBatch, QueryPlan, main
+
+
+def queryRows(parser, log_path, start_epoch, end_epoch, seek):
+    plan = QueryPlan(parser, [log_path], [], start_epoch, end_epoch,
+        worker_cnt = 1, seek = seek)
+    query_batch = QueryBatch(parser, [], ['remote_host_str'],
+        start_epoch = start_epoch, end_epoch = end_epoch)
+
+    return (plan, sum(len(query_batch(line_list)[0])
+        for line_list in plan.batches(4096)))
+
+
+def test_unordered_file_is_scanned_in_full(tmp_path):
+    parser = Parser('%h %t %>s')
+    log_path = str(tmp_path / 'access.log')
+
+    # 20000 lines a minute apart from 10/Oct/2000:00:00:00 +0000, shuffled
+    line_list = [b'10.0.0.1 [%02d/Oct/2000:%02d:%02d:00 +0000] 200\n' % (
+        10 + j // 1440, j // 60 % 24, j % 60) for j in range(20000)]
+    Random(1).shuffle(line_list)
+
+    with open(log_path, 'wb') as log_file:
+        log_file.write(b''.join(line_list))
+
+    start_epoch = 971136000 + 5000 * 60
+    end_epoch = start_epoch + 1000 * 60 - 1
+
+    (plan, row_cnt) = queryRows(parser, log_path, start_epoch, end_epoch,
+        True)
+
+    assert row_cnt == queryRows(parser, log_path, start_epoch, end_epoch,
+        False)[1] == 1000
+    assert 'out of order' in plan.step_list[0]
+
+
+def test_ordered_file_is_bisected(tmp_path):
+    parser = Parser('%h %t %>s')
+    log_path = str(tmp_path / 'access.log')
+
+    with open(log_path, 'wb') as log_file:
+        for j in range(20000):
+            log_file.write(b'10.0.0.1 [%02d/Oct/2000:%02d:%02d:00 +0000] '
+                b'200\n' % (10 + j // 1440, j // 60 % 24, j % 60))
+
+    (plan, row_cnt) = queryRows(parser, log_path, 971136000 + 5000 * 60,
+        971136000 + 6000 * 60 - 1, True)
+
+    assert row_cnt == 1000
+    assert 'time seek' in plan.step_list[0]
+    assert plan.read_cnt < plan.byte_cnt // 2
+
+
+def writeRequests(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+
+    with open(log_path, 'wb') as log_file:
+        for (j, uri) in enumerate((b'/a%20b?page=2', b'/a%20b?page=3&page=2',
+                b'/c?page=2', b'/a%20b')):
+            log_file.write(b'10.0.0.%d "GET %s HTTP/1.1" 200\n' % (j % 2, uri))
+
+    return log_path
+
+
+def test_group_counts_are_integers(tmp_path, capsys):
+    main(['-f', '%h "%r" %>s', '-g', 'remote_host_str', '-o', 'jsonl',
+        writeRequests(tmp_path)])
+
+    out_str = capsys.readouterr().out
+    row_list = [json.loads(line) for line in out_str.splitlines()]
+
+    assert [(row['remote_host_str'], row['count']) for row in row_list] == \
+        [('10.0.0.0', 2), ('10.0.0.1', 2)]
+    assert '"count":2,' in out_str
+
+
+def test_derived_fields(tmp_path, capsys):
+    log_path = writeRequests(tmp_path)
+
+    main(['-f', '%h "%r" %>s', '-o', 'csv', '-s',
+        'remote_host_str,path_str,query.page', '-w', 'decoded_path_str=/a b',
+        log_path])
+    assert capsys.readouterr().out.splitlines() == [
+        'remote_host_str,path_str,query.page', '10.0.0.0,/a%20b,2',
+        '10.0.0.1,/a%20b,3', '10.0.0.1,/a%20b,']
+
+    main(['-f', '%h "%r" %>s', '-o', 'csv', '-s', 'path_str', '-w',
+        'query.page=2', log_path])
+    assert capsys.readouterr().out.splitlines() == ['path_str', '/a%20b',
+        '/c']
+
+    main(['-f', '%h "%r" %>s', '-o', 'csv', '-g', 'decoded_path_str',
+        log_path])
+    assert capsys.readouterr().out.splitlines()[1] == '/a b,3,0,,,'
@@ -0,0 +1,51 @@
+import pytest
+
+from parser import Parser
+from parser.sampling import hashSample, reservoirSample, sampleThreshold
+
+line_list = [b'10.0.%d.%d 200' % (i // 250, i % 250) for i in range(2000)]
+
+
+def test_hash_sample_is_deterministic():
+    threshold = sampleThreshold(0.1)
+    sample_list = hashSample(line_list, threshold)
+
+    assert sample_list == hashSample(line_list, threshold)
+    assert 100 < len(sample_list) < 300
+
+    # The decision is per line, so str lines sample the same as bytes
+    assert hashSample([line.decode() for line in line_list], threshold) == \
+        [line.decode() for line in sample_list]
+
+    # A line is kept at every rate above the one that kept it
+    assert set(sample_list) <= set(hashSample(line_list, sampleThreshold(0.5)))
+    assert hashSample(line_list, sampleThreshold(1)) == line_list
+
+
+def test_sample_rate_weights():
+    parser = Parser('%h %>s')
+    log_list = list(parser.parseLines(line_list, sample_rate = 0.25))
+
+    assert [log.remote_host_str.encode() + b' 200' for log in log_list] == \
+        hashSample(line_list, sampleThreshold(0.25))
+    assert all(log.sample_weight == 4.0 for log in log_list)
+
+    with pytest.raises(ValueError):
+        sampleThreshold(0)
+
+
+def test_reservoir_size_and_weight():
+    (sample_list, weight) = reservoirSample(iter(line_list), 50, seed = 7)
+
+    assert len(sample_list) == 50
+    assert len(set(sample_list)) == 50
+    assert set(sample_list) <= set(line_list)
+    assert weight == 40.0
+    assert reservoirSample(iter(line_list), 50, seed = 7)[0] == sample_list
+
+    assert reservoirSample(iter(line_list[:10]), 50) == (line_list[:10], 1.0)
+
+    log_list = list(Parser('%h %>s').parseLines(line_list, sample_size = 50,
+        seed = 7))
+    assert len(log_list) == 50
+    assert all(log.sample_weight == 40.0 for log in log_list)
@@ -0,0 +1,57 @@
+from parser import Parser
+from parser.session import Sessionizer
+
+session_parser = Parser('%h %t %b')
+
+
+def makeLog(host_str, second_int):
+    return session_parser.parse('%s [10/Jul/2020:13:%02d:%02d +0000] 100'
+        % (host_str, second_int // 60, second_int % 60))
+
+
+def test_session_closes_on_gap():
+    sessionizer = Sessionizer(gap_seconds = 30)
+
+    assert sessionizer.feed(makeLog('10.0.0.1', 0)) == []
+    assert sessionizer.feed(makeLog('10.0.0.1', 20)) == []
+    assert sessionizer.feed(makeLog('10.0.0.2', 45)) == []
+
+    # 10.0.0.1 was idle for 31 seconds
+    closed_list = sessionizer.feed(makeLog('10.0.0.1', 51))
+    assert len(closed_list) == 1
+
+    session = closed_list[0]
+    assert session.key == ('10.0.0.1', None)
+    assert (session.hit_cnt, session.byte_cnt, session.duration()) == \
+        (2, 200, 20)
+    assert not session.evicted
+
+    flush_list = sessionizer.flush()
+    assert [session.key[0] for session in flush_list] == ['10.0.0.2',
+        '10.0.0.1']
+    assert flush_list[1].hit_cnt == 1
+    assert sessionizer.open_dict == {}
+
+
+def test_max_open_evicts_least_recent():
+    sessionizer = Sessionizer(gap_seconds = 3600, max_open = 2,
+        keep_logs = True)
+
+    sessionizer.feed(makeLog('10.0.0.1', 0))
+    sessionizer.feed(makeLog('10.0.0.2', 1))
+    sessionizer.feed(makeLog('10.0.0.1', 2))
+
+    closed_list = sessionizer.feed(makeLog('10.0.0.3', 3))
+    assert [session.key[0] for session in closed_list] == ['10.0.0.2']
+    assert closed_list[0].evicted
+    assert len(closed_list[0].log_list) == 1
+    assert len(sessionizer.open_dict) == 2
+
+
+def test_sessionize_stream():
+    log_list = [makeLog('10.0.0.%d' % (i % 3), i * 10) for i in range(30)]
+    session_list = list(Sessionizer(gap_seconds = 35).sessionize(log_list))
+
+    assert len(session_list) == 3
+    assert sum(session.hit_cnt for session in session_list) == 30
+    assert all(session.duration() == 270 for session in session_list)
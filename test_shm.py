@@ -0,0 +1,79 @@
+import multiprocessing
+import os
+import signal
+
+import pytest
+
+from parser import Parser
+from parser.shm import parseShared
+
+
+def writeLog(log_path, line_list):
+    with open(log_path, 'wb') as log_file:
+        log_file.write(b''.join(line_list))
+
+
+def test_unpackable_line_is_a_failed_record(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    writeLog(log_path, [b'10.0.0.1 200 10\n', b'10.0.0.2 70000 10\n',
+        b'10.0.0.3 404 -\n'])
+
+    record_list = list(parseShared(Parser('%h %>s %b'), log_path, 2,
+        ['remote_host_str'], block_size = 4096))
+
+    assert record_list == [(True, 200, 10, None, '10.0.0.1'),
+        (False, None, None, None, None), (True, 404, None, None, '10.0.0.3')]
+
+
+def test_dead_worker_raises(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    writeLog(log_path, [b'10.0.0.%d 200 10\n' % (j % 250)
+        for j in range(20000)])
+
+    record_iter = parseShared(Parser('%h %>s %b'), log_path, 2,
+        ['remote_host_str'], block_size = 4096, poll_interval = 0.1)
+    next(record_iter)
+
+    os.kill(multiprocessing.active_children()[0].pid, signal.SIGKILL)
+
+    with pytest.raises(RuntimeError, match = 'exited with code'):
+        for record in record_iter:
+            pass
+
+
+def test_workers_keep_parser_limits(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    writeLog(log_path, [b'10.0.0.1 200 10\n', b'10.0.0.2 200 %s\n' % (
+        b'1' * 64), b'10.0.0.3 404 -\n'])
+
+    parser = Parser('%h %>s %b', engine = 'generic', max_line_len = 32)
+
+    assert Parser(*parser.constructorArgs()).constructorArgs() == \
+        parser.constructorArgs()
+    assert [record[0] for record in parseShared(parser, log_path, 2,
+        ['remote_host_str'], block_size = 4096)] == [True, False, True]
+
+
+def test_status_zero_and_sentinel(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    writeLog(log_path, [b'10.0.0.1 0 10\n', b'10.0.0.2 65535 10\n',
+        b'10.0.0.3 65534 10'])
+
+    record_list = list(parseShared(Parser('%h %>s %b'), log_path, 2,
+        ['remote_host_str'], block_size = 4096))
+
+    assert record_list == [(True, 0, 10, None, '10.0.0.1'),
+        (False, None, None, None, None), (True, 65534, 10, None, '10.0.0.3')]
+
+
+def test_string_tables_per_block(tmp_path):
+    log_path = str(tmp_path / 'access.log')
+    line_list = [b'10.%d.%d.%d 200 %d\n' % (j >> 16, j >> 8 & 255, j & 255, j)
+        for j in range(5000)]
+    writeLog(log_path, line_list)
+
+    record_list = list(parseShared(Parser('%h %>s %b'), log_path, 3,
+        ['remote_host_str'], block_size = 4096, block_cnt = 4))
+
+    assert [(record[2], record[4]) for record in record_list] == \
+        [(j, line.split()[0].decode()) for (j, line) in enumerate(line_list)]
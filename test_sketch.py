@@ -0,0 +1,61 @@
+import pytest
+
+from parser.sketch import DistinctCounter, SpaceSaving
+
+
+def test_distinct_counter_merge_rejects_mismatch():
+    counter = DistinctCounter('remote_host_str', bucket_seconds = 3600,
+        precision = 10)
+
+    for other in (DistinctCounter('request_URI_str', precision = 10),
+            DistinctCounter('remote_host_str', bucket_seconds = 60,
+                precision = 10),
+            DistinctCounter('remote_host_str', precision = 12),
+            DistinctCounter('remote_host_str', 'server_name_str',
+                precision = 10)):
+        with pytest.raises(ValueError):
+            counter.merge(other)
+
+    counter.merge(DistinctCounter('remote_host_str', precision = 10))
+
+
+def test_space_saving_top_k():
+    summary = SpaceSaving(5)
+
+    for (value, count) in (('/a', 50), ('/b', 30), ('/c', 10)):
+        for i in range(count):
+            summary.update(value)
+
+    # Counts above total_weight / capacity survive a long tail of hits
+    for i in range(40):
+        summary.update('/tail%d' % i)
+
+    top_list = summary.topK(2)
+    assert [value for (value, count, error) in top_list] == ['/a', '/b']
+
+    for (value, count, error) in summary.topK():
+        assert count - error <= {'/a': 50, '/b': 30}.get(value, 10) <= count
+
+    assert summary.total_weight == 130
+    assert summary.errorBound() == 26
+
+
+def test_space_saving_merge():
+    left = SpaceSaving(4, 'remote_host_str')
+    right = SpaceSaving(4, 'remote_host_str')
+
+    for i in range(20):
+        left.update('10.0.0.1')
+        right.update('10.0.0.2', 2)
+
+    left.update('10.0.0.3')
+    right.update('10.0.0.1', 5)
+
+    left.merge(right)
+    assert left.topK(2) == [('10.0.0.2', 40, 0), ('10.0.0.1', 25, 0)]
+    assert left.total_weight == 66
+
+    for other in (SpaceSaving(4, 'request_URI_str'), SpaceSaving(8,
+            'remote_host_str')):
+        with pytest.raises(ValueError):
+            left.merge(other)
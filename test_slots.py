@@ -0,0 +1,53 @@
+import pytest
+
+from parser import Parser
+
+slot_format_str = ('%h "%{Referer}i" "%{User-Agent}i" %{sid}C %{SID}C '
+    '%{HOME}e "%{Content-Type}o"')
+
+slot_line_str = ('10.0.0.1 "http://example.com/" "curl/8.0" s1 s2 /root '
+    '"text/html"')
+
+
+@pytest.mark.parametrize('line', [slot_line_str, slot_line_str.encode()])
+def test_each_variable_keeps_its_value(line):
+    log = Parser(slot_format_str).parse(line)
+
+    assert dict(log.headers) == {'Referer': 'http://example.com/',
+        'User-Agent': 'curl/8.0'}
+    assert dict(log.cookies) == {'sid': 's1', 'SID': 's2'}
+    assert dict(log.environ) == {'HOME': '/root'}
+    assert dict(log.reply_headers) == {'Content-Type': 'text/html'}
+
+    # The legacy attributes still hold the last variable of their kind
+    assert log.header_line_str == 'curl/8.0'
+    assert log.cookie_str == 's2'
+
+
+def test_header_names_ignore_case():
+    log = Parser(slot_format_str).parse(slot_line_str)
+
+    assert log.headers['user-agent'] == 'curl/8.0'
+    assert log.headers.get('REFERER') == 'http://example.com/'
+    assert log.cookies.get('Sid') is None
+
+    with pytest.raises(KeyError):
+        log.headers['Accept']
+
+    assert Parser('%h').parse('10.0.0.1').headers == {}
+
+
+def test_repeated_header_keeps_both_slots():
+    log = Parser('%h "%{X-Forwarded-For}i" "%{X-Forwarded-For}i"').parse(
+        '10.0.0.1 "10.9.9.9, 10.8.8.8" "10.7.7.7"')
+
+    assert log.slot_list == ['10.9.9.9, 10.8.8.8', '10.7.7.7']
+    assert log.headers['X-Forwarded-For'] == '10.7.7.7'
+
+
+def test_values_read_like_other_fields():
+    log = Parser('%h %{Referer}i').parse('10.0.0.1 -')
+
+    assert log.headers['Referer'] == '-'
+    assert Parser('%h "%{Referer}i"').parse(
+        '10.0.0.1 "a\\"b"').headers['Referer'] == 'a"b'
@@ -0,0 +1,43 @@
+import sqlite3
+
+import pytest
+
+from parser import Parser, packIP
+from parser.sqlite import SQLiteSink
+
+
+line_list = ['2001:db8::7 - - [10/Oct/2000:13:55:36 -0700] "GET / HTTP/1.0" '
+    '200 10\n', '203.0.113.7 - - [10/Oct/2000:13:55:37 -0700] "GET / '
+    'HTTP/1.0" 200 20\n']
+
+
+def test_ipv6_ints_load(tmp_path):
+    parser = Parser('%a %l %u %t \\"%r\\" %>s %b', ip_mode = 'int')
+    db_path = str(tmp_path / 'log.db')
+
+    with SQLiteSink(db_path, parser, batch_size = 1) as sink:
+        sink.writeLogs(parser.parse(line) for line in line_list)
+
+    row_list = sqlite3.connect(db_path).execute('SELECT remote_ip_int FROM '
+        'access_log ORDER BY remote_ip_int').fetchall()
+
+    assert [int.from_bytes(row[0], 'big') for row in row_list] == sorted(
+        [packIP('2001:db8::7'), packIP('203.0.113.7')])
+
+
+def test_failed_batch_rolls_back(tmp_path):
+    parser = Parser('%h %>s')
+    db_path = str(tmp_path / 'log.db')
+
+    with SQLiteSink(db_path, parser) as sink:
+        sink.write(parser.parse('a 200'))
+        sink.row_list[0][1] = 1 << 70
+
+        with pytest.raises(OverflowError):
+            sink.flush()
+
+        sink.write(parser.parse('b 404'))
+        sink.flush()
+
+    assert sqlite3.connect(db_path).execute('SELECT * FROM access_log'
+        ).fetchall() == [('b', 404)]
@@ -0,0 +1,45 @@
+import pytest
+
+from parser import Parser
+
+combined_format_str = ('%h %l %u %t "%r" %>s %b "%{Referer}i" '
+    '"%{User-Agent}i"')
+
+escaped_line_str = ('10.1.2.3 - - [10/Jul/2020:13:55:36 -0700] '
+    '"GET /a b?q=\\"x\\" HTTP/1.1" 200 512 '
+    '"http://example.com/say \\"hi\\" there" '
+    '"Mozilla/5.0 (X11; Linux) \\\\ \\x41"')
+
+
+@pytest.mark.parametrize('engine_str', ['regex', 'generic'])
+def test_quoted_fields_keep_spaces_and_escapes(engine_str):
+    parser = Parser(combined_format_str, engine = engine_str)
+
+    for line in (escaped_line_str, escaped_line_str.encode('utf-8')):
+        log = parser.parse(line)
+
+        assert log.http_line.method_str == 'GET'
+        assert log.http_line.request_URI_str == '/a b?q="x"'
+        assert log.http_line.http_version_str == 'HTTP/1.1'
+        assert log.headers['Referer'] == 'http://example.com/say "hi" there'
+        assert log.headers['User-Agent'] == 'Mozilla/5.0 (X11; Linux) \\ A'
+        assert log.last_request_time_int == 200
+        assert log.byte_count_nhclf_int == 512
+
+
+def test_escaped_value_is_unescaped_on_first_read():
+    log = Parser('%h "%{User-Agent}i"').parse('10.0.0.1 "a \\"b\\" c"')
+
+    assert log.slot_list == ['a \\"b\\" c']
+    assert log.header_line_str == 'a "b" c'
+    assert log.headers['User-Agent'] == 'a "b" c'
+
+
+def test_unterminated_quote_is_rejected():
+    parser = Parser('%h "%{User-Agent}i" %>s')
+
+    with pytest.raises(ValueError):
+        parser.parse('10.0.0.1 "no closing quote 200')
+
+    with pytest.raises(ValueError):
+        parser.parse('10.0.0.1 "escaped closing quote\\" 200')
@@ -0,0 +1,46 @@
+from types import MappingProxyType
+
+import pytest
+
+from parser import HTTPLine, Parser, parseQuery
+
+
+def test_request_line_path_and_query():
+    log = Parser('%h "%r"').parse('10.0.0.1 '
+        '"GET /a%20b/c%2Fd?x=1&x=2&y=a+b&z#frag HTTP/1.1"')
+    http_line = log.http_line
+
+    assert http_line.path_str == '/a%20b/c%2Fd'
+    assert http_line.decoded_path_str == '/a b/c/d'
+    assert http_line.query_str == 'x=1&x=2&y=a+b&z'
+    assert dict(http_line.query_dict) == {'x': ('1', '2'), 'y': ('a b',),
+        'z': ('',)}
+
+    # Computed once per object
+    assert http_line.query_dict is http_line.query_dict
+
+
+def test_missing_query_and_undecodable_path():
+    http_line = HTTPLine('GET', '/plain', 'HTTP/1.0')
+
+    assert http_line.query_str is None
+    assert dict(http_line.query_dict) == {}
+    assert http_line.decoded_path_str == '/plain'
+    assert HTTPLine('GET', '/%ff', 'HTTP/1.0').decoded_path_str == '/\udcff'
+
+
+def test_url_path_and_query_variables():
+    log = Parser('%h %U %q').parse('10.0.0.1 /caf%C3%A9 ?k=v&k=w')
+
+    assert log.decoded_url_path_str == '/caf\xe9'
+    assert dict(log.query_dict) == {'k': ('v', 'w')}
+    assert Parser('%h').parse('10.0.0.1').query_dict == {}
+
+
+def test_query_mapping_is_read_only():
+    query_dict = parseQuery('?a=1')
+
+    assert isinstance(query_dict, MappingProxyType)
+
+    with pytest.raises(TypeError):
+        query_dict['a'] = ('2',)